@@ -0,0 +1,57 @@
+"""Throughput of the checksum engine for many small files and for few large files
+
+Usage: python3 benchmarks/bench_checksum.py [--small N] [--large N] [--large-mb MB] [--workdir DIR]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from etp.checksum import ChecksumEngine
+
+
+def make_files(base: str, count: int, size: int) -> list:
+    paths = []
+    for i in range(count):
+        folder = os.path.join(base, f"dir{i % 100}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"file{i}.bin")
+        with open(path, "wb") as fo:
+            fo.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+def run_case(name: str, paths: list, total: int):
+    print(f"\n{name}: {len(paths)} files, {total / (1024*1024):.0f}MB")
+    print(f"{'pool':<10}{'workers':>8}{'seconds':>10}{'MB/s':>10}{'files/s':>10}")
+    for use_processes in (False, True):
+        for workers in (1, 2, 4, 8):
+            engine = ChecksumEngine(workers, use_processes)
+            start = time.perf_counter()
+            for _ in engine.map(paths):
+                pass
+            elapsed = time.perf_counter() - start
+            pool = "process" if use_processes else "thread"
+            print(f"{pool:<10}{workers:>8}{elapsed:>10.2f}{total / elapsed / (1024*1024):>10.1f}{len(paths) / elapsed:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--small", type=int, default=20000, help="Number of 4KB files")
+    parser.add_argument("--large", type=int, default=8, help="Number of large files")
+    parser.add_argument("--large-mb", type=int, default=128)
+    parser.add_argument("--workdir", default=None, help="Directory on the file system to benchmark")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as base:
+        small = make_files(os.path.join(base, "small"), args.small, 4096)
+        large = make_files(os.path.join(base, "large"), args.large, args.large_mb * 1024 * 1024)
+        run_case("Many small files", small, args.small * 4096)
+        run_case("Few large files", large, args.large * args.large_mb * 1024 * 1024)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Wall time and size of the SIP archive per output format and compression level
+
+Usage: python3 benchmarks/bench_codecs.py [--size-mb MB] [--content DIR] [--workdir DIR] [--variants tar,tar.zst:3,...]
+
+Without --content a synthetic extract is generated that resembles the usual
+deposits: NOARK-5 style XML, CSV and text dumps, plus some already compressed
+attachments. Point --content at a real extract for representative numbers.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from etp.archive import SipArchiveWriter
+from etp.compression import FORMATS, implementation
+
+DEFAULT_VARIANTS = "tar,tar.zst:1,tar.zst:3,tar.zst:9,tar.zst:19,tar.gz:1,tar.gz:6,tar.gz:9"
+WORDS = ("arkiv", "journalpost", "saksmappe", "dokument", "kommune", "vedtak", "klage", "søknad", "møte",
+         "utvalg", "referanse", "status", "beskrivelse", "tittel", "dato", "Trondheim", "Steinkjer", "Ørland")
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_extract(base: str, size_mb: int):
+    """Write about size_mb of XML, CSV and text, with a tenth incompressible attachments"""
+    rng = random.Random(42)
+    target = size_mb * 1024 * 1024
+    written = 0
+    index = 0
+    while written < target:
+        kind = index % 10
+        folder = os.path.join(base, ("xml", "csv", "txt", "xml", "csv", "txt", "xml", "csv", "txt", "dokumenter")[kind])
+        os.makedirs(folder, exist_ok=True)
+        if kind == 9:
+            path = os.path.join(folder, f"vedlegg{index}.pdf")
+            data = b"%PDF-1.7\n" + os.urandom(256 * 1024)
+        elif kind % 3 == 0:
+            path = os.path.join(folder, f"arkivstruktur{index}.xml")
+            rows = [f'  <journalpost systemID="{rng.getrandbits(64):x}">\n    <tittel>{sentence(rng, 8)}</tittel>\n'
+                    f'    <journaldato>20{rng.randint(10, 24)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}</journaldato>\n'
+                    f'  </journalpost>\n' for _ in range(2000)]
+            data = ("<arkiv>\n" + "".join(rows) + "</arkiv>\n").encode()
+        elif kind % 3 == 1:
+            path = os.path.join(folder, f"tabell{index}.csv")
+            rows = [f"{rng.randint(1, 10**6)};{sentence(rng, 4)};{rng.random():.4f};20{rng.randint(10, 24)}\n"
+                    for _ in range(5000)]
+            data = "".join(rows).encode()
+        else:
+            path = os.path.join(folder, f"dump{index}.txt")
+            data = "\n".join(sentence(rng, 12) for _ in range(3000)).encode()
+        with open(path, "wb") as fo:
+            fo.write(data)
+        written += len(data)
+        index += 1
+    return written
+
+
+def tree_size(base: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(base) for name in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=256, help="Size of the synthetic extract")
+    parser.add_argument("--content", default=None, help="Existing extract to archive instead of a synthetic one")
+    parser.add_argument("--workdir", default=None, help="Directory the extract and the archives are written to")
+    parser.add_argument("--variants", default=DEFAULT_VARIANTS, help="Comma separated format[:level] list")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        content = args.content
+        if content is None:
+            content = os.path.join(workdir, "extract")
+            make_extract(content, args.size_mb)
+        source_bytes = tree_size(content)
+        print(f"{source_bytes / (1024*1024):.1f}MB in {content}")
+        print(f"{'format':<10}{'level':>6}{'compressor':>18}{'seconds':>10}{'MB':>10}{'ratio':>8}{'MB/s in':>10}")
+
+        for variant in args.variants.split(","):
+            name, _, level = variant.partition(":")
+            level = int(level) if level else FORMATS[name].default_level
+            try:
+                used = implementation(name)
+            except ValueError as e:
+                print(f"{name:<10}{'':>6}  skipped: {e}")
+                continue
+            path = os.path.join(workdir, f"out{FORMATS[name].extension}")
+            start = time.perf_counter()
+            with SipArchiveWriter(path, output_format=name, level=level) as archive:
+                archive.add_tree(content, "sip/content")
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(path)
+            os.remove(path)
+            print(f"{name:<10}{level if level is not None else '-':>6}{used:>18}{elapsed:>10.2f}"
+                  f"{size / (1024*1024):>10.1f}{source_bytes / size:>8.2f}{source_bytes / (1024*1024) / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Generate premis.xml and mets.xml for many synthetic file records
+
+Usage: python3 benchmarks/bench_metadata.py [--records N] [--legacy-records N] [--workdir DIR]
+
+Records are produced by a generator, so the peak RSS reported is what the
+writers themselves need on top of the interpreter. The legacy table times only
+the old id_list drain with pop(0) that the structMap used to be written from.
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+from uuid import uuid1
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from etp.job import FIELDS
+from etp.metadata import configure_sip_premis, configure_sip_mets
+from etp.records import FileRecord
+
+SIP_ID = "00000000-0000-0000-0000-000000000000"
+MIME_TYPES = ("application/pdf", "text/plain", "image/tiff", "application/xml")
+
+
+def make_records(count: int):
+    for i in range(count):
+        yield FileRecord(f"{SIP_ID}/content/dir{i % 1000}/file{i}.{('pdf', 'txt', 'tif', 'xml')[i % 4]}",
+                         i.to_bytes(32, "big"), MIME_TYPES[i % 4], i * 37 % 10000000, 1704106800)
+
+
+def peak_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def legacy_drain(count: int):
+    id_list = [f'ID{uuid1()}' for _ in range(count)]
+    while id_list:
+        id_list.pop(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=1000000)
+    parser.add_argument("--legacy-records", type=int, default=200000,
+                        help="Largest record count for the legacy structMap drain, it grows quadratically")
+    parser.add_argument("--workdir", default=None, help="Directory on the file system to benchmark")
+    args = parser.parse_args()
+
+    fields = {name: f"Benchmark {name} & <co>" for name in FIELDS}
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        premis_path = os.path.join(workdir, "premis.xml")
+        mets_path = os.path.join(workdir, "mets.xml")
+        print(f"{'file':<12}{'records':>10}{'seconds':>10}{'records/s':>12}{'MB':>10}{'peak RSS MB':>13}")
+        for name, path, func, call_args in (
+            ("premis.xml", premis_path, configure_sip_premis, 
+             (premis_path, SIP_ID, make_records(args.records))),
+            ("mets.xml", mets_path, configure_sip_mets, 
+             (mets_path, SIP_ID, "2024-01-01T12:00:00+02:00", premis_path, make_records(args.records), fields)),
+        ):
+            elapsed = measure(func, *call_args)
+            size = os.path.getsize(path)
+            print(f"{name:<12}{args.records:>10}{elapsed:>10.2f}{args.records / elapsed:>12.0f}"
+                  f"{size / (1024*1024):>10.1f}{peak_rss() / (1024*1024):>13.1f}")
+
+    print(f"\n{'legacy drain':<12}{'records':>10}{'seconds':>10}")
+    count = 25000
+    while count <= args.legacy_records:
+        elapsed = measure(legacy_drain, count)
+        print(f"{'id_list':<12}{count:>10}{elapsed:>10.2f}")
+        count *= 2
+
+
+if __name__ == "__main__":
+    main()
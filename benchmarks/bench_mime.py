@@ -0,0 +1,68 @@
+"""MIME detection throughput: shared magic.from_buffer versus MimeDetector
+
+Usage: python3 benchmarks/bench_mime.py [--files N] [--head-kb KB] [--workers N]
+
+Heads are generated in memory, a mix of PDF, TIFF, JPEG, text and random data,
+so only detection is timed. Every variant detects the same list on a thread pool.
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import magic
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from etp.mime import MimeDetector
+
+
+def make_heads(count: int, head_size: int) -> list:
+    kinds = (
+        (".pdf", b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"),
+        (".tif", b"II*\x00"),
+        (".jpg", b"\xff\xd8\xff\xe0\x00\x10JFIF\x00"),
+        (".txt", None),
+        (".bin", b""),
+    )
+    heads = []
+    for i in range(count):
+        extension, signature = kinds[i % len(kinds)]
+        if signature is None:
+            data = (b"Lorem ipsum dolor sit amet %d\n" % i) * (head_size // 30 + 1)
+        else:
+            data = signature + os.urandom(head_size - len(signature))
+        heads.append((f"file{i}{extension}", data[:head_size]))
+    return heads
+
+
+def run(name: str, detect, heads: list, workers: int):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        types = list(executor.map(lambda item: detect(item[1], item[0]), heads))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28}{elapsed:>10.2f}{len(heads) / elapsed:>12.0f}")
+    return types
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--head-kb", type=int, default=1024, help="Bytes read before detection, the old code passed 4MB")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    heads = make_heads(args.files, args.head_kb * 1024)
+    print(f"{'variant':<28}{'seconds':>10}{'files/s':>12}")
+    baseline = run("magic.from_buffer", lambda head, path: magic.from_buffer(head, mime=True), heads, args.workers)
+    uncached = MimeDetector(use_cache=False)
+    run("MimeDetector, no cache", uncached.detect, heads, args.workers)
+    cached = MimeDetector()
+    types = run("MimeDetector, cache", cached.detect, heads, args.workers)
+    print(f"\n{cached.summary()}")
+    differing = sum(1 for old, new in zip(baseline, types) if old != new)
+    print(f"{differing} of {len(heads)} types differ from magic.from_buffer on the full head")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Compare the old create/append/extract/re-tar cycle with the streaming SIP packer
+
+Usage: python3 benchmarks/bench_pack_sip.py [--files N] [--size-mb MB] [--workdir DIR]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from subprocess import run, DEVNULL
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from etp.archive import SipArchiveWriter
+
+
+def tree_size(path: str) -> int:
+    """Allocated bytes below path"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.lstat(os.path.join(root, file)).st_blocks * 512
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class DiskSampler(threading.Thread):
+    """Sample the disk usage of a directory until stopped and keep the peak"""
+
+    def __init__(self, path: str, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, tree_size(self.path))
+            self._done.wait(self.interval)
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        self.peak = max(self.peak, tree_size(self.path))
+        return self.peak
+
+
+def make_deposit(base: str, files: int, size_mb: int) -> tuple:
+    """Create a SIP skeleton and a content folder under base"""
+    sip = os.path.join(base, "out", "sip", "content", "SIPID")
+    for sub in ("administrative_metadata", "descriptive_metadata", "content"):
+        os.makedirs(os.path.join(sip, sub))
+    for name in ("mets.xml", "log.xml", "administrative_metadata/premis.xml"):
+        with open(os.path.join(sip, name), "wb") as fo:
+            fo.write(os.urandom(64 * 1024))
+    content = os.path.join(base, "deposit")
+    per_file = max(1, size_mb * 1024 * 1024 // files)
+    for i in range(files):
+        folder = os.path.join(content, f"dir{i % 10}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"file{i}.bin"), "wb") as fo:
+            fo.write(os.urandom(per_file))
+    return sip, content
+
+
+def legacy_pack(sip: str, content: str):
+    """The tar -cf / tar -rf / extract / tar -cf cycle pack_sip used to run"""
+    tar_file = f"{sip}.tar"
+    sip_dir = os.path.dirname(sip)
+    sip_basename = os.path.basename(sip)
+    run(['tar', '-cf', tar_file, '-C', sip_dir, sip_basename], stdout=DEVNULL, stderr=DEVNULL, check=True)
+    run(['tar', '-rf', tar_file, '-C', os.path.dirname(content), os.path.basename(content)], stdout=DEVNULL, stderr=DEVNULL, check=True)
+    temp_extract = f"{sip_dir}/temp_extract"
+    os.makedirs(temp_extract)
+    run(['tar', '-xf', tar_file, '-C', temp_extract], stdout=DEVNULL, stderr=DEVNULL, check=True)
+    shutil.move(os.path.join(temp_extract, os.path.basename(content)), os.path.join(temp_extract, sip_basename, 'content'))
+    os.remove(tar_file)
+    run(['tar', '-cf', tar_file, '-C', temp_extract, sip_basename], stdout=DEVNULL, stderr=DEVNULL, check=True)
+    shutil.rmtree(sip)
+    shutil.rmtree(temp_extract)
+
+
+def streaming_pack(sip: str, content: str):
+    """What pack_sip does now"""
+    sip_basename = os.path.basename(sip)
+    with SipArchiveWriter(f"{sip}.tar") as archive:
+        archive.add_tree(sip, sip_basename, exclude=("content",))
+        archive.add_tree(content, f"{sip_basename}/content")
+    shutil.rmtree(sip)
+
+
+def measure(name: str, func, args) -> tuple:
+    with tempfile.TemporaryDirectory(dir=args.workdir) as base:
+        sip, content = make_deposit(base, args.files, args.size_mb)
+        out = os.path.join(base, "out")
+        baseline = tree_size(out)
+        sampler = DiskSampler(out)
+        sampler.start()
+        start = time.perf_counter()
+        func(sip, content)
+        elapsed = time.perf_counter() - start
+        peak = sampler.stop() - baseline
+    print(f"{name:<10} {elapsed:8.2f}s  peak extra disk {peak / (1024*1024):10.1f}MB")
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--workdir", default=None, help="Directory on the file system to benchmark")
+    args = parser.parse_args()
+
+    print(f"Deposit: {args.files} files, {args.size_mb}MB")
+    old_time, old_peak = measure("legacy", legacy_pack, args)
+    new_time, new_peak = measure("streaming", streaming_pack, args)
+    print(f"Wall time: {old_time / new_time:.1f}x faster, peak disk: {old_peak / max(new_peak, 1):.1f}x lower")
+
+
+if __name__ == "__main__":
+    main()
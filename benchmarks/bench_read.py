@@ -0,0 +1,132 @@
+"""Hash throughput of the fixed 4MB read loop against the read engine's readinto, drop-behind and mmap paths
+
+Usage: python3 benchmarks/bench_read.py [--source DIR ...] [--size-mb MB] [--workdir DIR] [--chunks 64K,1M,...] [--warm]
+
+Every --source is benchmarked separately, so a local folder and an NFS mount
+can be compared in one run; the detected file system type is printed with
+each, and for a network file system the readinto rows at each --chunks size
+show which network_chunk a job should use there. Without --source a set of
+large and small files is generated in --workdir. Before every method the files are evicted from the page cache with
+POSIX_FADV_DONTNEED, which makes the reads cold without root rights, unless
+--warm is given. The page cache column is the change of Cached in
+/proc/meminfo over the run: drop-behind should keep it near zero.
+"""
+import os
+import sys
+import time
+import hashlib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from etp import reader
+from etp.job import parse_size
+
+
+def legacy_hash(path: str, max_chunk: int = None):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(4000000)
+            if not data:
+                break
+            sha.update(data)
+    return sha.hexdigest()
+
+
+METHODS = {
+    "read(4000000)": legacy_hash,
+    # On a network mount max_chunk only caps network_chunk, so both are set to the size measured
+    "readinto": lambda path, max_chunk=None: reader.hash_file(path, max_chunk=max_chunk, drop_behind=False, 
+                                                              network_chunk=max_chunk or reader.NETWORK_CHUNK),
+    "readinto+drop": lambda path, max_chunk=None: reader.hash_file(path, max_chunk=max_chunk),
+    "mmap": lambda path, max_chunk=None: reader.hash_file(path, max_chunk=max_chunk, drop_behind=False, use_mmap=True),
+}
+
+
+def page_cache() -> int:
+    """Cached bytes from /proc/meminfo, 0 where it is missing"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("Cached:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def evict(paths: list):
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def make_files(base: str, size_mb: int) -> list:
+    """Two large files taking most of size_mb, and 2000 files of 16KB"""
+    os.makedirs(base, exist_ok=True)
+    paths = []
+    block = os.urandom(1024 * 1024)
+    for index in range(2):
+        path = os.path.join(base, f"large{index}.bin")
+        with open(path, "wb") as fo:
+            for _ in range(max(1, size_mb // 2 - 16)):
+                fo.write(block)
+        paths.append(path)
+    for index in range(2000):
+        path = os.path.join(base, f"small{index}.bin")
+        with open(path, "wb") as fo:
+            fo.write(block[index:index + 16 * 1024])
+        paths.append(path)
+    return paths
+
+
+def list_files(base: str) -> list:
+    return [os.path.join(root, name) for root, _, names in os.walk(base) for name in sorted(names)]
+
+
+def run(name: str, method, paths: list, total: int, max_chunk: int, warm: bool):
+    if not warm:
+        evict(paths)
+    cached = page_cache()
+    cpu = time.process_time()
+    start = time.perf_counter()
+    for path in paths:
+        method(path, max_chunk)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    label = f"{name} {max_chunk // 1024}K" if max_chunk else name
+    print(f"  {label:<22}{elapsed:>9.2f}{cpu:>9.2f}{total / (1024*1024) / elapsed:>10.1f}"
+          f"{(page_cache() - cached) / (1024*1024):>+14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", action="append", default=[], help="Folder of files to hash, may be repeated")
+    parser.add_argument("--size-mb", type=int, default=1024, help="Size of the generated files without --source")
+    parser.add_argument("--workdir", default=None, help="Directory the files are generated in")
+    parser.add_argument("--chunks", default="64K,1M,4M,8M", help="Chunk limits tried with readinto")
+    parser.add_argument("--warm", action="store_true", help="Leave the page cache alone between methods")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        sources = args.source or [os.path.join(workdir, "files")]
+        for source in sources:
+            paths = list_files(source) if args.source else make_files(source, args.size_mb)
+            total = sum(os.path.getsize(path) for path in paths)
+            fstype = reader.filesystem_type(os.stat(source).st_dev) or "unknown"
+            if fstype in reader.NETWORK_FILESYSTEMS:
+                fstype = f"{fstype}, network_chunk default {reader.NETWORK_CHUNK // 1024}K"
+            print(f"{source} ({fstype}): {len(paths)} files, {total / (1024*1024):.1f}MB")
+            print(f"  {'method':<22}{'seconds':>9}{'cpu s':>9}{'MB/s':>10}{'page cache MB':>14}")
+            for name, method in METHODS.items():
+                run(name, method, paths, total, None, args.warm)
+            for chunk in args.chunks.split(","):
+                run("readinto", METHODS["readinto"], paths, total, parse_size(chunk), args.warm)
+
+
+if __name__ == "__main__":
+    main()
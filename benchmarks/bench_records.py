@@ -0,0 +1,74 @@
+"""Memory of the old info_dict of lists compared with the compact record store
+
+Usage: python3 benchmarks/bench_records.py [--records N] [--max-memory-mb MB] [--workdir DIR]
+
+Each variant runs in a fresh child process so its peak RSS is measured alone.
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+from datetime import datetime
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from etp.records import RecordStore
+
+SIP_ID = "00000000-0000-0000-0000-000000000000"
+MIME_TYPES = ("application/pdf", "text/plain", "image/tiff", "application/xml")
+
+
+def make_path(i: int) -> str:
+    return f"{SIP_ID}/content/dir{i % 1000}/sub{i % 37}/file{i}.bin"
+
+
+def fill_dict(count: int, workdir: str, max_memory: int):
+    info_dict = {}
+    for i in range(count):
+        # MIME types come back from libmagic as fresh strings, so copy them the same way
+        info_dict[make_path(i)] = [
+            f"{i:064x}",
+            "".join(MIME_TYPES[i % 4]),
+            i * 37 % 10000000,
+            datetime.fromtimestamp(1704106800 + i).strftime("%Y-%m-%dT%H:%M:%S+02:00"),
+        ]
+    return sum(1 for _ in info_dict.items())
+
+
+def fill_store(count: int, workdir: str, max_memory: int):
+    with RecordStore(workdir, max_memory) as store:
+        for i in range(count):
+            store.add(make_path(i), i.to_bytes(32, "big"), "".join(MIME_TYPES[i % 4]), i * 37 % 10000000, 1704106800 + i)
+        return sum(1 for _ in store)
+
+
+def run(func, count: int, workdir: str, max_memory: int, results):
+    start = time.perf_counter()
+    seen = func(count, workdir, max_memory)
+    results.put((time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, seen))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=2000000)
+    parser.add_argument("--max-memory-mb", type=int, default=256)
+    parser.add_argument("--workdir", default=None, help="Directory spilled runs are written to")
+    args = parser.parse_args()
+
+    context = get_context("spawn")
+    print(f"{'variant':<14}{'records':>10}{'seconds':>10}{'peak RSS MB':>13}")
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        for name, func in (("info_dict", fill_dict), ("RecordStore", fill_store)):
+            results = context.Queue()
+            child = context.Process(target=run, args=(func, args.records, workdir, args.max_memory_mb * 1024 * 1024, results))
+            child.start()
+            elapsed, peak, seen = results.get()
+            child.join()
+            assert seen == args.records
+            print(f"{name:<14}{args.records:>10}{elapsed:>10.2f}{peak / (1024*1024):>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Stage a metadata tree with shutil.copytree and with the Stager strategies
+
+Usage: python3 benchmarks/bench_staging.py [--files N] [--size-mb MB] [--workdir DIR] [--target DIR]
+
+--target may point at another file system to see the cross-device fallbacks.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from etp.staging import Stager, STRATEGIES
+
+
+def make_tree(base: str, files: int, size_mb: int):
+    size = size_mb * 1024 * 1024 // files
+    for i in range(files):
+        folder = os.path.join(base, f"dir{i % 20}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"file{i}.bin"), "wb") as fo:
+            fo.write(os.urandom(size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--workdir", default=None, help="Directory the source tree is created in")
+    parser.add_argument("--target", default=None, help="Directory the tree is staged into (default: workdir)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir, \
+         tempfile.TemporaryDirectory(dir=args.target or args.workdir) as target:
+        source = os.path.join(workdir, "source")
+        make_tree(source, args.files, args.size_mb)
+        print(f"{args.files} files, {args.size_mb}MB")
+        print(f"{'variant':<28}{'seconds':>10}  result")
+
+        start = time.perf_counter()
+        shutil.copytree(source, os.path.join(target, "copytree"), copy_function=shutil.copy)
+        print(f"{'shutil.copytree':<28}{time.perf_counter() - start:>10.2f}  {args.size_mb}MB copied")
+
+        for first in range(len(STRATEGIES)):
+            strategies = STRATEGIES[first:]
+            stager = Stager(strategies)
+            start = time.perf_counter()
+            stager.copy_tree(source, os.path.join(target, strategies[0]))
+            print(f"{'Stager from ' + strategies[0]:<28}{time.perf_counter() - start:>10.2f}  {stager.summary()}")
+
+
+if __name__ == "__main__":
+    main()
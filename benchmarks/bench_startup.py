@@ -0,0 +1,82 @@
+"""Startup import time of the GUI module and the headless CLI, cold and warm
+
+Usage: python3 benchmarks/bench_startup.py [--runs N] [--top N] [--max-ms MS] [--drop-caches]
+
+Cold runs use an empty -X pycache_prefix so every module is compiled again,
+--drop-caches also empties the page cache first (needs root). Warm runs reuse
+the cache and the median is reported. Importing ET_Producer does not open a
+window, so no display is needed. Exits with status 1 when a warm median is
+above --max-ms, so the script can guard against startup regressions.
+"""
+import os
+import sys
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+MODULES = ("ET_Producer", "etp.cli")
+
+
+def drop_caches() -> bool:
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as fo:
+            fo.write("3\n")
+        return True
+    except OSError:
+        return False
+
+
+def import_times(module: str, pycache_prefix: str = None) -> dict:
+    """Cumulative import time in microseconds of every module imported by module"""
+    command = [sys.executable, "-X", "importtime"]
+    if pycache_prefix:
+        command += ["-X", f"pycache_prefix={pycache_prefix}"]
+    command += ["-c", f"import {module}"]
+    result = subprocess.run(command, cwd=SRC, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7, help="Warm runs per module")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports listed per module")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail when a warm median is above this")
+    parser.add_argument("--drop-caches", action="store_true")
+    args = parser.parse_args()
+
+    too_slow = []
+    print(f"{'module':<14}{'cold ms':>10}{'warm ms':>10}")
+    for module in MODULES:
+        if args.drop_caches and not drop_caches():
+            print("could not drop the page cache, cold runs only recompile")
+        with tempfile.TemporaryDirectory() as prefix:
+            cold = import_times(module, prefix)[module] / 1000
+        import_times(module)
+        runs = [import_times(module) for _ in range(args.runs)]
+        warm = statistics.median(run[module] for run in runs) / 1000
+        print(f"{module:<14}{cold:>10.1f}{warm:>10.1f}")
+
+        medians = {name: statistics.median(run.get(name, 0) for run in runs) for name in runs[0]}
+        for name, micros in sorted(medians.items(), key=lambda item: -item[1])[1:args.top + 1]:
+            print(f"    {name:<40}{micros / 1000:>8.1f}")
+        if args.max_ms is not None and warm > args.max_ms:
+            too_slow.append(f"{module} {warm:.1f}ms")
+
+    if too_slow:
+        print(f"above {args.max_ms}ms: {', '.join(too_slow)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
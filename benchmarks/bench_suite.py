@@ -0,0 +1,250 @@
+"""Time every packaging stage and whole builds on synthetic deposits, and compare runs with saved baselines
+
+Usage: python3 benchmarks/bench_suite.py [--profiles tiny,huge,deep,mixed] [--scale X] [--repeat N]
+                                         [--deposits DIR] [--workdir DIR] [--save NAME] [--compare NAME]
+                                         [--threshold PERCENT] [--report FILE]
+
+Deposits come from benchmarks/deposit.py and are kept in --deposits between
+runs. Per profile gather_file_info, configure_sip_premis, configure_sip_mets,
+pack_sip and configure_sip_info run one after the other, followed by
+build_package end to end in single and two pass mode. Every repetition runs
+in a forked process, so peak RSS and the read/write syscall counts from
+/proc/self/io belong to that run alone. Peak RSS is the high-water mark up to
+the end of a stage. The page cache is warm after the first repetition; the
+median of the repetitions is reported.
+
+--save stores the results as a baseline, --compare prints the change against
+one and exits with status 1 when a stage got slower than --threshold percent.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import resource
+import tempfile
+import statistics
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from etp.job import Job, FIELDS
+from etp.records import RecordStore
+from etp.metadata import configure_sip_premis, configure_sip_mets
+from etp.pipeline import gather_file_info, pack_sip, configure_sip_info, build_package
+from deposit import PROFILES, ensure_deposit
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+SIP_ID = "00000000-0000-0000-0000-000000000000"
+CREATED = "2024-01-01T12:00:00+02:00"
+# Slowdowns below this many seconds are noise, whatever the percentage
+NOISE_SECONDS = 0.05
+FIELDS_VALUES = {name: f"Benchmark {name}" for name in FIELDS}
+
+
+def proc_io() -> dict:
+    """Read and write syscalls and bytes of this process so far, empty where /proc is missing"""
+    try:
+        with open("/proc/self/io") as f:
+            return {key: int(value) for key, value in (line.split(": ") for line in f)}
+    except OSError:
+        return {}
+
+
+class Meter:
+    """Wall and CPU time, syscalls and peak RSS of the stage run inside the with block"""
+
+    def __init__(self, results: dict, name: str, units: int, unit: str):
+        self.results = results
+        self.name = name
+        self.units = units
+        self.unit = unit
+
+    def __enter__(self):
+        self.io = proc_io()
+        self.cpu = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu
+        io = proc_io()
+        self.results[self.name] = {
+            "seconds": seconds,
+            "cpu_seconds": cpu,
+            "rate": self.units / seconds if seconds else 0.0,
+            "unit": self.unit,
+            "read_syscalls": io.get("syscr", 0) - self.io.get("syscr", 0),
+            "write_syscalls": io.get("syscw", 0) - self.io.get("syscw", 0),
+            "read_mb": (io.get("rchar", 0) - self.io.get("rchar", 0)) / (1024*1024),
+            "write_mb": (io.get("wchar", 0) - self.io.get("wchar", 0)) / (1024*1024),
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+
+
+def run_stages(workdir: str, content: str, files: int, size: int) -> dict:
+    """The packaging stages one by one, in the order build_package runs them in two-pass mode"""
+    results = {}
+    sip = os.path.join(workdir, SIP_ID)
+    os.makedirs(os.path.join(sip, "administrative_metadata"))
+    premis_path = os.path.join(sip, "administrative_metadata", "premis.xml")
+    mb = size / (1024*1024)
+    with RecordStore(workdir) as store:
+        with Meter(results, "gather_file_info", mb, "MB/s"):
+            gather_file_info(content, f"{SIP_ID}/content", store)
+        with Meter(results, "configure_sip_premis", files, "files/s"):
+            configure_sip_premis(premis_path, SIP_ID, store)
+        with Meter(results, "configure_sip_mets", files, "files/s"):
+            configure_sip_mets(os.path.join(sip, "mets.xml"), SIP_ID, CREATED, premis_path, store, FIELDS_VALUES)
+    with Meter(results, "pack_sip", mb, "MB/s"):
+        pack_sip(sip, SIP_ID, content)
+    tar_path = f"{sip}.tar"
+    with Meter(results, "configure_sip_info", os.path.getsize(tar_path) / (1024*1024), "MB/s"):
+        configure_sip_info(os.path.join(workdir, "info.xml"), tar_path, SIP_ID, CREATED, FIELDS_VALUES)
+    return results
+
+
+def run_build(workdir: str, content: str, size: int, single_pass: bool) -> dict:
+    results = {}
+    job = Job(content, dict(FIELDS_VALUES), output_root=workdir, single_pass=single_pass)
+    name = "build_package" if single_pass else "build_package two-pass"
+    with Meter(results, name, size / (1024*1024), "MB/s"):
+        build_package(job)
+    return results
+
+
+def _child(conn, func, args):
+    try:
+        conn.send(func(*args))
+    except Exception as e:
+        conn.send(e)
+    conn.close()
+
+
+def isolated(func, *args) -> dict:
+    """Run func in a forked process, so its peak RSS and syscall counts are its own"""
+    context = multiprocessing.get_context("fork")
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(child, func, args))
+    process.start()
+    child.close()
+    result = parent.recv()
+    process.join()
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def run_profile(content: str, files: int, size: int, workdir: str, repeat: int) -> dict:
+    """Median of every metric over repeat runs of the stages and the builds"""
+    runs = []
+    for _ in range(repeat):
+        results = {}
+        for func, args in ((run_stages, (content, files, size)), (run_build, (content, size, True)),
+                           (run_build, (content, size, False))):
+            scratch = tempfile.mkdtemp(dir=workdir)
+            try:
+                results.update(isolated(func, scratch, *args))
+            finally:
+                shutil.rmtree(scratch)
+        runs.append(results)
+    return {stage: {key: value if key == "unit" else statistics.median(run[stage][key] for run in runs)
+                    for key, value in metrics.items()}
+            for stage, metrics in runs[0].items()}
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def print_results(results: dict):
+    print(f"{'profile':<8}{'stage':<24}{'seconds':>9}{'cpu s':>8}{'rate':>16}{'read sc':>10}{'write sc':>10}"
+          f"{'peak MB':>9}")
+    for profile, stages in results["profiles"].items():
+        for stage, metrics in stages.items():
+            print(f"{profile:<8}{stage:<24}{metrics['seconds']:>9.3f}{metrics['cpu_seconds']:>8.2f}"
+                  f"{metrics['rate']:>9.1f} {metrics['unit']:<6}{metrics['read_syscalls']:>10.0f}"
+                  f"{metrics['write_syscalls']:>10.0f}{metrics['peak_rss_mb']:>9.1f}")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> tuple:
+    """Report lines comparing seconds, syscalls and peak RSS per stage, and the regressed stages"""
+    lines = [f"Compared with the baseline from {baseline['environment']['time']} "
+             f"(Python {baseline['environment']['python']}, {baseline['environment']['cpus']} CPUs)",
+             f"{'profile':<8}{'stage':<24}{'seconds':>9}{'was':>9}{'change':>9}{'syscalls':>10}{'peak MB':>9}{'was':>7}"]
+    regressions = []
+    for profile, stages in results["profiles"].items():
+        for stage, metrics in stages.items():
+            old = baseline["profiles"].get(profile, {}).get(stage)
+            if old is None:
+                lines.append(f"{profile:<8}{stage:<24}{metrics['seconds']:>9.3f}{'-':>9}{'new':>9}")
+                continue
+            change = 100 * (metrics["seconds"] - old["seconds"]) / old["seconds"] if old["seconds"] else 0.0
+            calls = metrics["read_syscalls"] + metrics["write_syscalls"]
+            old_calls = old["read_syscalls"] + old["write_syscalls"]
+            flag = ""
+            if change > threshold and metrics["seconds"] - old["seconds"] > NOISE_SECONDS:
+                flag = "  REGRESSION"
+                regressions.append(f"{profile}/{stage}")
+            lines.append(f"{profile:<8}{stage:<24}{metrics['seconds']:>9.3f}{old['seconds']:>9.3f}{change:>+8.1f}%"
+                         f"{calls - old_calls:>+10.0f}{metrics['peak_rss_mb']:>9.1f}{old['peak_rss_mb']:>7.1f}{flag}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="Comma separated deposit profiles")
+    parser.add_argument("--scale", type=float, default=1.0, help="Deposit scale passed to deposit.py")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per profile, the median is reported")
+    parser.add_argument("--deposits", default=None, help="Folder the generated deposits are kept in between runs")
+    parser.add_argument("--workdir", default=None, help="Directory on the file system to benchmark")
+    parser.add_argument("--baseline-dir", default=BASELINE_DIR)
+    parser.add_argument("--save", metavar="NAME", help="Store the results as baseline NAME")
+    parser.add_argument("--compare", metavar="NAME", help="Compare the results with baseline NAME")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Slowdown in percent reported as a regression")
+    parser.add_argument("--report", help="Also write the results, and the comparison if any, to this file")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        # Read first, a missing baseline should not cost a whole run
+        with open(os.path.join(args.baseline_dir, f"{args.compare}.json"), encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {"environment": environment(), "scale": args.scale, "repeat": args.repeat, "profiles": {}}
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        deposits = args.deposits or os.path.join(workdir, "deposits")
+        for profile in args.profiles.split(","):
+            deposit = ensure_deposit(os.path.join(deposits, profile), profile, args.scale)
+            print(f"{profile}: {deposit['files']} files, {deposit['bytes'] / (1024*1024):.1f}MB", file=sys.stderr)
+            results["profiles"][profile] = run_profile(deposit["content"], deposit["files"], deposit["bytes"],
+                                                       workdir, args.repeat)
+    print_results(results)
+
+    lines, regressions = [], []
+    if baseline is not None:
+        lines, regressions = compare(results, baseline, args.threshold)
+        print()
+        for line in lines:
+            print(line)
+    if args.save:
+        os.makedirs(args.baseline_dir, exist_ok=True)
+        with open(os.path.join(args.baseline_dir, f"{args.save}.json"), "w", encoding="utf-8") as fo:
+            json.dump(results, fo, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as fo:
+            json.dump({"results": results, "comparison": lines, "regressions": regressions}, fo, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Generate reproducible synthetic deposits for the benchmarks
+
+Usage: python3 benchmarks/deposit.py OUT_DIR [--profile tiny|huge|deep|mixed] [--scale X] [--seed N]
+
+The content is written to OUT_DIR/content.
+
+Each profile stresses another part of the packer: many tiny files, a few huge
+ones, a deep directory tree, or a mix of MIME types under Norwegian file names
+(including decomposed å, as produced by macOS). The same profile, scale and
+seed always give the same tree and the same bytes. A deposit records how it
+was made in deposit.json next to the content, so ensure_deposit can reuse it
+between runs.
+"""
+import os
+import json
+import random
+import shutil
+import argparse
+import unicodedata
+
+MARKER = "deposit.json"
+BLOCK_SIZE = 1024 * 1024
+
+# files, smallest and largest size in bytes, directory depth, files per directory
+PROFILES = {
+    "tiny": {"files": 20000, "min_size": 64, "max_size": 4096, "depth": 3, "per_dir": 200},
+    "huge": {"files": 4, "min_size": 128 * 1024 * 1024, "max_size": 256 * 1024 * 1024, "depth": 1, "per_dir": 4},
+    "deep": {"files": 3000, "min_size": 1024, "max_size": 64 * 1024, "depth": 40, "per_dir": 10},
+    "mixed": {"files": 4000, "min_size": 1024, "max_size": 2 * 1024 * 1024, "depth": 4, "per_dir": 50},
+}
+
+WORDS = ("arkiv", "journalpost", "saksmappe", "dokument", "kommune", "vedtak", "klage", "søknad", "møte",
+         "utvalg", "referanse", "tittel", "Trondheim", "Steinkjer", "Ørland", "Bærum", "Tromsø", "Ålesund")
+FOLDERS = ("Saksarkiv", "Møtebøker", "Økonomi", "Personal", "Byggesaker", "Tjenester", "Årsmeldinger", "Klagesaker")
+
+
+def _text(rng: random.Random, size: int) -> bytes:
+    line = " ".join(rng.choice(WORDS) for _ in range(12)) + "\n"
+    data = line.encode() * (size // len(line.encode()) + 1)
+    return data[:size]
+
+
+def _xml(rng: random.Random, size: int) -> bytes:
+    row = (f'  <journalpost systemID="{rng.getrandbits(64):x}">\n    <tittel>{" ".join(rng.choice(WORDS) for _ in range(6))}'
+           f'</tittel>\n  </journalpost>\n').encode()
+    body = row * max(1, (size - 40) // len(row))
+    return b'<?xml version="1.0" encoding="UTF-8"?>\n<arkiv>\n' + body + b"</arkiv>\n"
+
+
+def _csv(rng: random.Random, size: int) -> bytes:
+    row = f"{rng.randint(1, 10**6)};{rng.choice(WORDS)};{rng.random():.4f};20{rng.randint(10, 24)}\n".encode()
+    return (row * (size // len(row) + 1))[:size]
+
+
+# Extension, then the signature of a binary format or the generator of a text one
+KINDS = (
+    ("xml", None, _xml),
+    ("csv", None, _csv),
+    ("txt", None, _text),
+    ("pdf", b"%PDF-1.7\n", None),
+    ("png", b"\x89PNG\r\n\x1a\n", None),
+    ("jpg", b"\xff\xd8\xff\xe0\x00\x10JFIF\x00", None),
+    ("tif", b"II*\x00", None),
+    ("sqlite", b"SQLite format 3\x00", None),
+)
+
+
+class _Noise:
+    """Incompressible bytes from one seeded block, so large files cost no random generation per byte"""
+
+    def __init__(self, rng: random.Random):
+        self.block = rng.randbytes(BLOCK_SIZE)
+
+    def write(self, fo, size: int, offset: int):
+        while size > 0:
+            start = offset % BLOCK_SIZE
+            chunk = self.block[start:start + size]
+            fo.write(chunk)
+            size -= len(chunk)
+            offset += len(chunk) * 7 + 1
+
+
+def _name(rng: random.Random, index: int, unicode_names: bool) -> str:
+    if not unicode_names:
+        return f"file{index:06d}"
+    name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{index}"
+    # Every tenth name is decomposed, the way files copied from macOS arrive
+    return unicodedata.normalize("NFD", name) if index % 10 == 0 else name
+
+
+def _folder(rng: random.Random, index: int, unicode_names: bool) -> str:
+    return f"{rng.choice(FOLDERS)} {index}" if unicode_names else f"dir{index:04d}"
+
+
+def generate(base: str, profile: str, scale: float = 1.0, seed: int = 42) -> dict:
+    """Write a deposit to base/content and return its description, content path, file count and byte total"""
+    spec = PROFILES[profile]
+    rng = random.Random(f"{profile}/{seed}")
+    noise = _Noise(rng)
+    # Scaling changes the file sizes of the few-files profile and the file count of the others
+    files = spec["files"] if profile == "huge" else max(1, int(spec["files"] * scale))
+    size_scale = scale if profile == "huge" else 1.0
+    unicode_names = profile in ("mixed", "deep")
+    kinds = KINDS if profile == "mixed" else KINDS[:3] if profile in ("tiny", "deep") else KINDS[3:4]
+
+    content = os.path.join(base, "content")
+    os.makedirs(content, exist_ok=True)
+    total = 0
+    folder = content
+    for index in range(files):
+        if index % spec["per_dir"] == 0:
+            # Walk down to the profile's depth, then start a new branch from the top
+            level = (index // spec["per_dir"]) % spec["depth"]
+            if level == 0:
+                folder = content
+            folder = os.path.join(folder, _folder(rng, index // spec["per_dir"], unicode_names))
+            os.makedirs(folder, exist_ok=True)
+        extension, signature, text = kinds[index % len(kinds)]
+        size = max(1, int(rng.randint(spec["min_size"], spec["max_size"]) * size_scale))
+        path = os.path.join(folder, f"{_name(rng, index, unicode_names)}.{extension}")
+        with open(path, "wb") as fo:
+            if text is not None:
+                data = text(rng, size)
+                fo.write(data)
+                size = len(data)
+            else:
+                fo.write(signature)
+                noise.write(fo, size - len(signature), index * 4099)
+                size = max(size, len(signature))
+        total += size
+
+    description = {"profile": profile, "scale": scale, "seed": seed, "files": files, "bytes": total, "content": content}
+    with open(os.path.join(base, MARKER), "w", encoding="utf-8") as fo:
+        json.dump(description, fo)
+    return description
+
+
+def ensure_deposit(base: str, profile: str, scale: float = 1.0, seed: int = 42) -> dict:
+    """Reuse the deposit in base if it was made with the same settings, generate it otherwise
+
+    Raises ValueError rather than replace a content folder that was not generated here.
+    """
+    content = os.path.join(base, "content")
+    try:
+        with open(os.path.join(base, MARKER), encoding="utf-8") as f:
+            description = json.load(f)
+    except FileNotFoundError:
+        if os.path.exists(content):
+            raise ValueError(f"{content} exists but was not generated by deposit.py")
+    else:
+        if (description["profile"], description["scale"], description["seed"]) == (profile, scale, seed):
+            return dict(description, content=content)
+        shutil.rmtree(content, ignore_errors=True)
+    return generate(base, profile, scale, seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out", help="Folder the deposit is written to")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mixed")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplies the file count, or the file sizes for huge")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    description = ensure_deposit(args.out, args.profile, args.scale, args.seed)
+    print(f"{description['files']} files, {description['bytes'] / (1024*1024):.1f}MB in {description['content']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,14 @@
 # Get the parent directory (go up from program/ to root)
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 
-# Install dependencies if needed
-python3 -c "import customtkinter" 2>/dev/null || pip3 install customtkinter python-magic
-
-# Run application
+# Run application, it exits with status 3 before opening a window when packages are missing
 cd "$SCRIPT_DIR/src"
 python3 ET_Producer.py
+status=$?
+
+# Install dependencies if needed and try once more
+if [ $status -eq 3 ]; then
+    pip3 install customtkinter python-magic && python3 ET_Producer.py
+    status=$?
+fi
+exit $status
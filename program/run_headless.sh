@@ -0,0 +1,7 @@
+#!/bin/bash
+# ET-Producer headless launcher, e.g. for cron on an ingest server
+# Usage: program/run_headless.sh build --job /path/to/job.toml
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+
+PYTHONPATH="$SCRIPT_DIR/src${PYTHONPATH:+:$PYTHONPATH}" exec python3 -m etp "$@"
@@ -0,0 +1 @@
+"""Packaging core for ET-Producer, importable without any GUI code"""
@@ -0,0 +1,5 @@
+import sys
+
+from etp.cli import main
+
+sys.exit(main())
@@ -0,0 +1,218 @@
+"""Single-pass tar writer that streams a SIP straight into its final layout"""
+import os
+import hashlib
+import tarfile
+
+from etp import trace
+from etp.compression import open_compressor
+from etp.sinks import FileSink
+
+CHUNK_SIZE = 4000000
+
+
+class HashingWriter:
+    """File wrapper that computes the SHA-256 of everything written through it"""
+
+    def __init__(self, fo):
+        self._fo = fo
+        self._sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._sha.update(data)
+        self.size += len(data)
+        return self._fo.write(data)
+
+    def tell(self) -> int:
+        return self.size
+
+    def flush(self):
+        self._fo.flush()
+
+    def close(self):
+        self._fo.close()
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+
+class CountingReader:
+    """File wrapper that reports the length of every chunk tarfile reads"""
+
+    def __init__(self, fo, on_bytes):
+        self._fo = fo
+        self._on_bytes = on_bytes
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fo.read(size)
+        self._on_bytes(len(data))
+        return data
+
+
+class DigestReader:
+    """File wrapper that hashes the bytes tarfile reads and keeps the first chunk for MIME sniffing"""
+
+    def __init__(self, fo, on_bytes=None):
+        self._fo = fo
+        self._on_bytes = on_bytes
+        self._sha = hashlib.sha256()
+        # tarfile does not read empty files at all
+        self.head = b""
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fo.read(size)
+        if not self.head:
+            self.head = data
+        self._sha.update(data)
+        if self._on_bytes is not None:
+            self._on_bytes(len(data))
+        return data
+
+    def digest(self) -> bytes:
+        return self._sha.digest()
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+
+class SipArchiveWriter:
+    """Write archive members under rewritten names without staging them on disk"""
+
+    def __init__(self, tar_path: str, hash_output: bool = False, on_bytes=None, output_format: str = "tar", 
+                 level: int = None, links: dict = None, sink=None):
+        self.tar_path = tar_path
+        self.on_bytes = on_bytes
+        self.file_count = 0
+        self.byte_count = 0
+        # member name -> content key of files that may duplicate another, see etp.dedup
+        self.links = links
+        self.linked_count = 0
+        self.linked_bytes = 0
+        # content key -> name of the member that stores those bytes
+        self._stored = {}
+        self.sha256 = None
+        self.size = None
+        # A compressed archive is always hashed, it costs little next to the compression,
+        # and so is one sent elsewhere, it cannot be read back
+        self._sink = FileSink(tar_path) if sink is None else sink
+        self._file = self._sink
+        if hash_output or output_format != "tar" or sink is not None:
+            self._file = HashingWriter(self._file)
+        self._fo = self._file if output_format == "tar" else open_compressor(self._file, output_format, level)
+        self._tar = tarfile.open(fileobj=self._fo, mode="w", format=tarfile.GNU_FORMAT, copybufsize=CHUNK_SIZE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add_file(self, path: str, arcname: str, on_file=None):
+        """Add a single file, directory entry or symlink under the given member name
+
+        If on_file is given, regular files are hashed while they are written
+        and on_file(path, tarinfo, reader) is called once the member is complete.
+        A file listed in links whose bytes are already stored becomes a hard link
+        member to the first copy.
+        """
+        tarinfo = self._tar.gettarinfo(path, arcname)
+        if tarinfo is None:
+            # Sockets, fifos and the like are skipped just as tar does
+            return
+        if on_file is not None and tarinfo.islnk():
+            # A second name of an inode tarfile has seen, on_file needs its bytes to hash
+            tarinfo.type = tarfile.REGTYPE
+            tarinfo.linkname = ""
+            tarinfo.size = os.stat(path).st_size
+        key = self.links.get(arcname) if self.links and tarinfo.isreg() else None
+        if key is not None and key in self._stored:
+            self.linked_count += 1
+            self.linked_bytes += tarinfo.size
+            tarinfo.type = tarfile.LNKTYPE
+            tarinfo.linkname = self._stored[key]
+            tarinfo.size = 0
+            self._tar.addfile(tarinfo)
+            trace.count("tar.links")
+        elif tarinfo.isreg():
+            with trace.span("tar file", "file"), open(path, "rb") as f:
+                if on_file is None:
+                    self._tar.addfile(tarinfo, f if self.on_bytes is None else CountingReader(f, self.on_bytes))
+                else:
+                    reader = DigestReader(f, self.on_bytes)
+                    self._tar.addfile(tarinfo, reader)
+                    on_file(path, tarinfo, reader)
+            self.file_count += 1
+            self.byte_count += tarinfo.size
+            trace.count("tar.files")
+            trace.count("tar.bytes", tarinfo.size)
+            if key is not None:
+                self._stored[key] = arcname
+        else:
+            self._tar.addfile(tarinfo)
+        # Members are never read back, so do not keep millions of TarInfo objects around
+        self._tar.members.clear()
+
+    def add_tree(self, directory: str, arcname: str, exclude: tuple = (), on_file=None, include_root: bool = True):
+        """Add a directory recursively, renaming its root to arcname
+
+        Top-level entries listed in exclude are left out of the archive.
+        on_file is passed on to add_file for every member.
+        """
+        if include_root:
+            self.add_file(directory, arcname)
+        stack = [(directory, arcname, exclude)]
+        while stack:
+            path, name, skip = stack.pop()
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+            subdirs = []
+            for entry in entries:
+                if entry.name in skip:
+                    continue
+                member = f"{name}/{entry.name}"
+                self.add_file(entry.path, member, on_file)
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append((entry.path, member, ()))
+            # Reverse so the stack visits directories in sorted order
+            stack.extend(reversed(subdirs))
+
+    def add_files(self, directory: str, relpaths, arcname: str, on_file=None):
+        """Add selected files below directory under arcname, with the directory entries above them
+
+        relpaths must list files in tree order, so every parent is added before
+        its first file.
+        """
+        added = set()
+        for relpath in relpaths:
+            parts = relpath.split("/")
+            for depth in range(1, len(parts)):
+                parent = "/".join(parts[:depth])
+                if parent not in added:
+                    added.add(parent)
+                    self.add_file(os.path.join(directory, parent), f"{arcname}/{parent}")
+            self.add_file(os.path.join(directory, relpath), f"{arcname}/{relpath}", on_file)
+
+    def close(self):
+        """Finish the archive"""
+        self._tar.close()
+        if self._fo is not self._file:
+            self._fo.close()
+        if isinstance(self._file, HashingWriter):
+            self.sha256 = self._file.hexdigest()
+            self.size = self._file.size
+        self._file.close()
+
+    def abort(self):
+        """Close and remove a partially written archive"""
+        try:
+            self._tar.close()
+            if self._fo is not self._file:
+                self._fo.close()
+        except Exception:
+            # The archive is thrown away, the failure that caused the abort is the one to report
+            pass
+        finally:
+            self._sink.abort()
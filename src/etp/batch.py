@@ -0,0 +1,174 @@
+"""Batch runner that packages many deposits concurrently and can resume"""
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from etp import trace
+from etp.log import log, set_context
+from etp.job import Job, JobError, load_job_file, parse_job_settings, read_settings_file
+from etp.scheduler import StageScheduler
+from etp.progress import Progress
+
+STATE_FILE = "batch_state.json"
+REPORT_FILE = "batch_report.json"
+
+
+def load_jobs(source: str, defaults: dict = None) -> list:
+    """Read jobs from a folder of job files or from a manifest
+
+    A manifest is a JSON list of job tables, or a JSON/TOML table with a jobs
+    list. defaults are applied to every job before its own settings.
+    """
+    defaults = defaults or {}
+    if os.path.isdir(source):
+        entries = []
+        for name in sorted(os.listdir(source)):
+            if name.endswith((".toml", ".json")):
+                entries.append(load_job_file(os.path.join(source, name)))
+    else:
+        data = read_settings_file(source)
+        if isinstance(data, dict):
+            data = data.get("jobs", [])
+        base = os.path.dirname(os.path.abspath(source))
+        entries = [parse_job_settings(item, base, item.get("name", f"job{i + 1}")) for i, item in enumerate(data)]
+
+    jobs = []
+    for settings in entries:
+        merged = dict(defaults)
+        merged.update(settings)
+        merged["fields"] = {**defaults.get("fields", {}), **settings["fields"]}
+        try:
+            job = Job(**merged)
+        except TypeError as e:
+            raise JobError(f"{settings['name']}: {e}")
+        jobs.append(job)
+
+    names = [job.name for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise JobError(f"Job names must be unique: {', '.join(duplicates)}")
+    return jobs
+
+
+class BatchRunner:
+    """Run jobs on a pool while a StageScheduler limits the I/O-heavy stages
+
+    Finished jobs are recorded in a state file, so running the same batch again
+    skips every job whose package still exists.
+    """
+
+    def __init__(self, jobs: list, max_jobs: int = 4, io_slots: int = 2, cpu_slots: int = None, state_path: str = STATE_FILE):
+        self.jobs = jobs
+        self.max_jobs = max(1, max_jobs)
+        self.scheduler = StageScheduler(io_slots, cpu_slots)
+        self.state_path = state_path
+        self.state = self._load_state()
+        self._lock = threading.Lock()
+        # job name -> Progress of the jobs being packaged right now
+        self._running = {}
+
+    def running(self) -> dict:
+        """Progress of every job currently being packaged, by job name"""
+        with self._lock:
+            return dict(self._running)
+
+    def _load_state(self) -> dict:
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self):
+        # Replace atomically so a crash never leaves a half written state file
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fo:
+            json.dump(self.state, fo, indent=2)
+            fo.flush()
+            os.fsync(fo.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    def is_done(self, job: Job) -> bool:
+        entry = self.state.get(job.name)
+        return bool(entry and entry["status"] == "done" and os.path.isdir(entry["aic_folder"]))
+
+    def _run_job(self, job: Job) -> dict:
+        from etp.pipeline import build_package, write_error_log
+
+        set_context(job.name)
+        start = time.perf_counter()
+        progress = Progress()
+        with self._lock:
+            self._running[job.name] = progress
+        try:
+            job.validate()
+            if job.volume_size:
+                from etp.volumes import build_volumes
+                # The volumes report their own progress
+                with self._lock:
+                    del self._running[job.name]
+                with trace.span("job", job=job.name):
+                    result = build_volumes(job, self.scheduler, self._running)
+            else:
+                with trace.span("job", job=job.name):
+                    result = build_package(job, self.scheduler, progress)
+            duration = time.perf_counter() - start
+            entry = {
+                "status": "done",
+                "aic_folder": result["aic_folder"],
+                "duration": duration,
+                "files": result["content_files"],
+                "bytes": result["content_bytes"],
+            }
+        except Exception as e:
+            entry = {"status": "failed", "error": str(e), "duration": time.perf_counter() - start}
+            error_log = os.path.join(job.output_root, f"error_log_{job.name}.txt")
+            try:
+                os.makedirs(job.output_root, exist_ok=True)
+                write_error_log(error_log)
+            except OSError:
+                # The output folder may be what failed, the job is recorded as failed either way
+                error_log = os.path.abspath(f"error_log_{job.name}.txt")
+                try:
+                    write_error_log(error_log)
+                except OSError:
+                    error_log = "no error log could be written"
+            log(f"❌ ERROR: {e} (details in {error_log})")
+        finally:
+            set_context(None)
+        with self._lock:
+            self._running.pop(job.name, None)
+            self.state[job.name] = entry
+            self._save_state()
+        return entry
+
+    def run(self) -> dict:
+        """Package every unfinished job and return the per-job report"""
+        pending = []
+        for job in self.jobs:
+            if self.is_done(job):
+                log(f"Skipping {job.name}: already packaged in {self.state[job.name]['aic_folder']}")
+            else:
+                pending.append(job)
+        log(f"Packaging {len(pending)} of {len(self.jobs)} jobs, {self.max_jobs} at a time")
+
+        with ThreadPoolExecutor(self.max_jobs, thread_name_prefix="job") as executor:
+            list(executor.map(self._run_job, pending))
+
+        ran = {job.name for job in pending}
+        return {job.name: dict(self.state[job.name], skipped=job.name not in ran) for job in self.jobs}
+
+
+def format_report(report: dict) -> list:
+    """Summary table lines with duration and throughput per job"""
+    lines = [f"{'job':<30}{'status':>8}{'files':>10}{'MB':>12}{'seconds':>10}{'MB/s':>10}"]
+    for name, entry in report.items():
+        status = "skipped" if entry.get("skipped") else entry["status"]
+        if entry["status"] == "done":
+            mb = entry["bytes"] / (1024*1024)
+            rate = mb / entry["duration"] if entry["duration"] else 0.0
+            lines.append(f"{name:<30}{status:>8}{entry['files']:>10}{mb:>12.1f}{entry['duration']:>10.1f}{rate:>10.1f}")
+        else:
+            lines.append(f"{name:<30}{status:>8}  {entry.get('error', '')}")
+    return lines
@@ -0,0 +1,91 @@
+"""Persistent checksum cache so re-runs of the same deposit skip unchanged files"""
+import os
+import time
+import sqlite3
+
+CACHE_FILE = ".et_producer_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 5000000
+DEFAULT_MAX_AGE_DAYS = 90
+COMMIT_EVERY = 1000
+
+
+class ChecksumCache:
+    """SQLite store of SHA-256 and MIME type per file
+
+    An entry is only used when path, size, mtime_ns and inode all still match
+    the file on disk. Least recently used entries are evicted past max_entries,
+    and entries not seen for max_age_days are dropped when the cache is closed.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, max_entries: int = DEFAULT_MAX_ENTRIES, max_age_days: int = DEFAULT_MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+        # Batch jobs share one cache file, so wait for the write lock instead of failing
+        self._db = sqlite3.connect(path, timeout=60)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checksums ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, "
+            "sha256 TEXT, mime TEXT, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS checksums_last_used ON checksums (last_used)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def lookup(self, entry) -> tuple:
+        """Return (sha256, mime) for an unchanged ScanEntry, or None"""
+        row = self._db.execute(
+            "SELECT size, mtime_ns, inode, sha256, mime FROM checksums WHERE path = ?",
+            (os.path.abspath(entry.path),)
+        ).fetchone()
+        if row is not None and row[:3] == (entry.size, entry.mtime_ns, entry.inode):
+            self.hits += 1
+            return row[3], row[4]
+        self.misses += 1
+        return None
+
+    def store(self, entry, digest: str, mime: str):
+        """Record the checksum and MIME type of a ScanEntry"""
+        self._db.execute(
+            "INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (os.path.abspath(entry.path), entry.size, entry.mtime_ns, entry.inode, digest, mime, time.time())
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._db.commit()
+            self._pending = 0
+
+    def evict(self) -> int:
+        """Drop expired entries and trim the cache to max_entries, returns the number removed"""
+        removed = self._db.execute(
+            "DELETE FROM checksums WHERE last_used < ?",
+            (time.time() - self.max_age_days * 86400,)
+        ).rowcount
+        count = self._db.execute("SELECT COUNT(*) FROM checksums").fetchone()[0]
+        if count > self.max_entries:
+            removed += self._db.execute(
+                "DELETE FROM checksums WHERE path IN "
+                "(SELECT path FROM checksums ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            ).rowcount
+        self._db.commit()
+        return removed
+
+    def close(self):
+        """Evict, commit and close"""
+        self.evict()
+        self._db.close()
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)"
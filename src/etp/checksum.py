@@ -0,0 +1,125 @@
+"""Parallel checksum engine with deterministic output order and bounded memory"""
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from etp import trace
+from etp import reader
+from etp.mime import MimeDetector, configure_default, default_detector
+
+# Largest read per worker on local disks, reader picks smaller ones for smaller files
+CHUNK_SIZE = reader.LARGE_CHUNK
+MIN_CHUNK_SIZE = 64 * 1024
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+DEFAULT_MAX_BUFFER = 256 * 1024 * 1024
+
+
+def hash_file(path: str, chunk_size: int = CHUNK_SIZE, on_bytes=None, detector: MimeDetector = None, 
+              network_chunk: int = reader.NETWORK_CHUNK) -> tuple:
+    """Return the SHA-256 hex digest, MIME type and size of a file
+
+    on_bytes, if given, is called with the length of every chunk read.
+    """
+    if detector is None:
+        detector = default_detector()
+    digest, head, size = reader.hash_file(path, on_bytes, detector.sniff_size, chunk_size, network_chunk=network_chunk)
+    return digest, detector.detect(head, path), size
+
+
+def _hash_job(path: str, chunk_size: int, network_chunk: int, on_bytes=None, detector: MimeDetector = None) -> tuple:
+    """Worker entry point, also used by the process pool so it must stay top-level"""
+    worker = f"{os.getpid()}/{threading.current_thread().name}"
+    start = time.perf_counter()
+    try:
+        digest, mime, size = hash_file(path, chunk_size, on_bytes, detector, network_chunk)
+        error = None
+    except Exception as e:
+        digest, mime, size, error = None, None, 0, str(e)
+    # perf_counter is system wide on Linux, so a worker process's start lines up with the parent's spans
+    return worker, start, time.perf_counter() - start, digest, mime, size, error
+
+
+class ChecksumEngine:
+    """Hash files on a pool of threads (default) or processes
+
+    Results come back in the order the paths were given, so the METS and PREMIS
+    files stay deterministic. Memory is capped by shrinking the read chunk so that
+    workers * chunk_size never exceeds max_buffer, and by keeping only a small
+    window of paths in flight. Files on network file systems are read
+    network_chunk bytes at a time, within the same cap.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, use_processes: bool = False, max_buffer: int = DEFAULT_MAX_BUFFER, 
+                 on_bytes=None, detector: MimeDetector = None, network_chunk: int = reader.NETWORK_CHUNK):
+        self.workers = max(1, workers)
+        self.use_processes = use_processes
+        # Threads report every chunk, process results are counted when collected
+        self.on_bytes = on_bytes
+        # Worker processes get a detector with the same settings from the pool initializer
+        self.detector = detector or MimeDetector()
+        self.network_chunk = network_chunk
+        self.chunk_size = max(MIN_CHUNK_SIZE, min(max(CHUNK_SIZE, network_chunk), max_buffer // self.workers))
+        # worker -> [files, bytes, seconds busy]
+        self.stats = {}
+
+    def _executor(self):
+        if self.use_processes:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # The caller may already run other threads, whose locks a forked child would inherit half held.
+            # The fork server is a clean process, the workers only need the top-level _hash_job from it
+            return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("forkserver"), 
+                                       initializer=configure_default, 
+                                       initargs=(self.detector.sniff_size, self.detector.use_cache))
+        return ThreadPoolExecutor(self.workers, thread_name_prefix="hash")
+
+    def map(self, items, path_of=None, lookup=None):
+        """Yield (item, digest, mime, size, error) for every item, in input order
+
+        Items are paths, or any object path_of turns into a path. If lookup(item)
+        returns a (digest, mime) pair the file is not read at all.
+        """
+        window = self.workers * 4
+        pending = deque()
+        with self._executor() as executor:
+            for item in items:
+                cached = lookup(item) if lookup is not None else None
+                if cached is not None:
+                    future = Future()
+                    future.set_result((None, 0.0, 0.0, cached[0], cached[1], 0, None))
+                else:
+                    path = item if path_of is None else path_of(item)
+                    if self.use_processes:
+                        future = executor.submit(_hash_job, path, self.chunk_size, self.network_chunk)
+                    else:
+                        future = executor.submit(_hash_job, path, self.chunk_size, self.network_chunk, self.on_bytes, 
+                                                 self.detector)
+                pending.append((item, future))
+                if len(pending) >= window:
+                    yield self._collect(*pending.popleft())
+            while pending:
+                yield self._collect(*pending.popleft())
+
+    def _collect(self, item, future) -> tuple:
+        worker, start, elapsed, digest, mime, size, error = future.result()
+        if worker is not None:
+            stat = self.stats.setdefault(worker, [0, 0, 0.0])
+            stat[0] += 1
+            stat[1] += size
+            stat[2] += elapsed
+            trace.add_span("hash file", "file", start, start + elapsed, worker)
+            trace.count("hash.files")
+            trace.count("hash.bytes", size)
+            if self.use_processes and self.on_bytes is not None:
+                self.on_bytes(size)
+        return item, digest, mime, size, error
+
+    def report(self) -> list:
+        """Per-worker throughput lines for the log"""
+        lines = []
+        for worker, (files, size, seconds) in sorted(self.stats.items()):
+            rate = size / seconds / (1024*1024) if seconds else 0.0
+            lines.append(f"{worker}: {files} files, {size / (1024*1024):.1f}MB, {rate:.1f}MB/s")
+        return lines
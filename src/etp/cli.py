@@ -0,0 +1,278 @@
+"""Headless command line entry point, never imports tkinter
+
+Usage: python3 -m etp build --job job.toml [--content DIR] [--label TEXT] ...
+       python3 -m etp batch JOBS_DIR_OR_MANIFEST [--jobs N] [--io-slots N]
+       python3 -m etp verify AIC_FOLDER_OR_SHELF ... [--jobs N] [--processes]
+"""
+import os
+import sys
+import json
+import argparse
+import threading
+
+from etp.log import log, add_handler, JsonLogFile
+from etp.progress import Progress, format_snapshot
+from etp.job import Job, JobError, FIELDS, load_job_file, parse_size
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+def add_job_arguments(parser: argparse.ArgumentParser):
+    """Options that describe a single packaging job"""
+    parser.add_argument("--job", help="JSON or TOML job file, options given here override it")
+    parser.add_argument("--content", dest="content_path", help="Folder whose content should be packaged")
+    parser.add_argument("--descriptive", dest="descriptive_path", help="Descriptive metadata folder (optional)")
+    parser.add_argument("--administrative", dest="administrative_path", help="Administrative metadata folder (optional)")
+    parser.add_argument("--username", help="Agent recorded in the log.xml files")
+    parser.add_argument("--output", dest="output_root", help="Folder the package is created in (default: current folder)")
+    parser.add_argument("--two-pass", dest="single_pass", action="store_false", default=None,
+                        help="Gather checksums before packing instead of hashing while packing")
+    parser.add_argument("--workers", type=int, help="Checksum worker count")
+    parser.add_argument("--processes", dest="use_processes", action="store_true", default=None,
+                        help="Hash on worker processes instead of threads")
+    parser.add_argument("--network-chunk", type=parse_size, metavar="SIZE", 
+                        help="Read size for content on network file systems such as NFS or CIFS (default: 8M)")
+    parser.add_argument("--mime-sniff-size", type=int, metavar="BYTES", 
+                        help="Bytes from the start of each file used to detect its MIME type")
+    parser.add_argument("--no-mime-cache", dest="mime_cache", action="store_false", default=None, 
+                        help="Run libmagic on every file instead of caching types by extension and signature")
+    parser.add_argument("--baseline", metavar="PACKAGE_OR_INDEX", 
+                        help="Only package files that are new or changed since this AIC folder, tar, mets.xml or record index")
+    parser.add_argument("--write-index", dest="index_path", metavar="FILE", 
+                        help="Write the record index of the package, the baseline of a later delta")
+    parser.add_argument("--format", dest="output_format", choices=("tar", "tar.zst", "tar.gz"), 
+                        help="Archive format of the SIP (default: tar)")
+    parser.add_argument("--compression-level", type=int, metavar="LEVEL", 
+                        help="zstd or gzip level (default: 3 for zstd, 6 for gzip)")
+    parser.add_argument("--volume-size", type=parse_size, metavar="SIZE", 
+                        help="Split the content into packages of at most SIZE, e.g. 50G, tied together by volumes.xml")
+    parser.add_argument("--volume-jobs", type=int, metavar="N", help="Volumes packed at the same time (default: 2)")
+    parser.add_argument("--sink", dest="output_sink", metavar="TARGET", 
+                        help="Send the SIP archive to TARGET instead of the AIC folder: - for stdout, pipe:COMMAND, "
+                             "tcp://HOST:PORT, s3://BUCKET/PREFIX or a directory")
+    parser.add_argument("--no-resume", dest="resume", action="store_false", default=None, 
+                        help="Start over instead of continuing an interrupted build of the same job")
+    parser.add_argument("--dedup", action="store_true", default=None, 
+                        help="Store content files with the same bytes once and the copies as hard links (implies --two-pass)")
+    fields = parser.add_argument_group("metadata fields")
+    for name in FIELDS:
+        fields.add_argument(f"--{name.replace('_', '-')}", dest=f"field_{name}", metavar="TEXT")
+
+
+def job_from_args(args: argparse.Namespace) -> Job:
+    """Merge a job file with command line options"""
+    settings = load_job_file(args.job) if args.job else {"fields": {}}
+    for key in ("content_path", "descriptive_path", "administrative_path", "username", "output_root",
+                "single_pass", "workers", "use_processes", "network_chunk", "mime_sniff_size", "mime_cache", "baseline", 
+                "index_path", "output_format", "compression_level", "volume_size", "volume_jobs", "dedup", "output_sink", 
+                "resume"):
+        value = getattr(args, key)
+        if value is not None:
+            settings[key] = value
+    for name in FIELDS:
+        value = getattr(args, f"field_{name}")
+        if value is not None:
+            settings["fields"][name] = value
+    settings.setdefault("content_path", "")
+    try:
+        job = Job(**settings)
+    except TypeError as e:
+        raise JobError(str(e))
+    job.validate()
+    return job
+
+
+def add_trace_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--trace", metavar="FILE", 
+                        help="Write a Chrome trace of the stages and workers, for chrome://tracing or ui.perfetto.dev")
+    parser.add_argument("--trace-summary", metavar="FILE", 
+                        help="Write the time per stage, the byte and file counters and the peak RSS as JSON")
+    parser.add_argument("--profile", metavar="FILE", 
+                        help="Run under cProfile and write the statistics of all threads to FILE for pstats")
+
+
+def run_traced(args: argparse.Namespace, run):
+    """Call run() under the tracer and profiler the trace arguments ask for, then write their files"""
+    from etp import trace
+    
+    tracer = trace.start() if args.trace or args.trace_summary else None
+    profiler = None
+    if args.profile:
+        profiler = trace.Profiler()
+        profiler.start()
+    try:
+        with trace.span(args.command):
+            return run()
+    finally:
+        if profiler is not None:
+            stats = profiler.stop(args.profile)
+            log(f"Profile written to {args.profile}, {stats.total_tt:.2f}s of function time")
+        if tracer is not None:
+            trace.stop()
+            if args.trace:
+                tracer.write_chrome_trace(args.trace)
+            if args.trace_summary:
+                tracer.write_summary(args.trace_summary)
+            for line in tracer.report():
+                log(line)
+
+
+def log_to_stderr(record):
+    print(record.line, file=sys.stderr, flush=True)
+
+
+def setup_logging(args: argparse.Namespace):
+    if not args.quiet:
+        add_handler(log_to_stderr)
+    if args.log_file:
+        add_handler(JsonLogFile(args.log_file))
+
+
+def start_ticker(interval: float, progress_of) -> threading.Event:
+    """Log a progress line per job every interval seconds until the returned event is set
+
+    progress_of returns a {name: Progress} dict of the jobs to report on.
+    """
+    stop = threading.Event()
+    
+    def run():
+        while not stop.wait(interval):
+            for name, progress in progress_of().items():
+                line = format_snapshot(progress.snapshot())
+                log(f"{name}: {line}" if name else line)
+    
+    threading.Thread(target=run, name="progress", daemon=True).start()
+    return stop
+
+
+def cmd_build(args: argparse.Namespace) -> int:
+    try:
+        job = job_from_args(args)
+    except (JobError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    from etp.pipeline import build_package, write_error_log
+
+    setup_logging(args)
+    progress = Progress()
+    # Progress of the volumes being packed, the single package otherwise
+    running = {} if job.volume_size else {"": progress}
+    if args.progress:
+        ticker = start_ticker(args.progress, lambda: dict(running))
+    try:
+        if job.volume_size:
+            from etp.volumes import build_volumes
+            result = run_traced(args, lambda: build_volumes(job, running=running))
+        else:
+            result = run_traced(args, lambda: build_package(job, progress=progress))
+    except Exception as e:
+        write_error_log()
+        print(f"error: Package creation failed: {e} (details in error_log.txt, run the same command again to resume)", 
+              file=sys.stderr)
+        return EXIT_FAILED
+    finally:
+        if args.progress:
+            ticker.set()
+    # With the archive on stdout the package path must not end up in it
+    print(result["aic_folder"], file=sys.stderr if job.output_sink == "-" else sys.stdout)
+    return EXIT_OK
+
+
+def cmd_batch(args: argparse.Namespace) -> int:
+    from etp.batch import BatchRunner, load_jobs, format_report, STATE_FILE, REPORT_FILE
+
+    defaults = {"fields": {}}
+    if args.output_root:
+        defaults["output_root"] = args.output_root
+    if args.username:
+        defaults["username"] = args.username
+    output_root = args.output_root or "."
+    try:
+        jobs = load_jobs(args.source, defaults)
+    except (JobError, OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    setup_logging(args)
+    runner = BatchRunner(jobs, args.jobs, args.io_slots, args.cpu_slots,
+                         args.state or os.path.join(output_root, STATE_FILE))
+    if args.progress:
+        ticker = start_ticker(args.progress, runner.running)
+    report = run_traced(args, runner.run)
+    if args.progress:
+        ticker.set()
+    with open(os.path.join(output_root, REPORT_FILE), "w", encoding="utf-8") as fo:
+        json.dump(report, fo, indent=2)
+    for line in format_report(report):
+        print(line)
+    return EXIT_OK if all(entry["status"] == "done" for entry in report.values()) else EXIT_FAILED
+
+
+def cmd_verify(args: argparse.Namespace) -> int:
+    from etp.verify import find_packages, verify_packages, format_report
+
+    packages = find_packages(args.paths)
+    if not packages:
+        print("error: no package folders with an info.xml found", file=sys.stderr)
+        return EXIT_USAGE
+
+    setup_logging(args)
+    reports = []
+    for report in verify_packages(packages, args.jobs, args.use_processes):
+        log(f"{report['status'].upper()}: {report['package']} ({report['files']} files)")
+        reports.append(report)
+    reports.sort(key=lambda report: report["package"])
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as fo:
+            json.dump(reports, fo, indent=2)
+    for line in format_report(reports):
+        print(line)
+    return EXIT_OK if all(report["status"] == "ok" for report in reports) else EXIT_FAILED
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="etp", description="Create DIAS archive packages without the GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Package one deposit")
+    add_job_arguments(build)
+    build.add_argument("-q", "--quiet", action="store_true", help="Only print the finished package path")
+    build.add_argument("--log-file", help="Also append the log as JSON lines to this file")
+    build.add_argument("--progress", type=float, metavar="SECONDS", 
+                       help="Log progress, throughput and ETA every SECONDS")
+    add_trace_arguments(build)
+    build.set_defaults(func=cmd_build)
+
+    batch = commands.add_parser("batch", help="Package many deposits concurrently")
+    batch.add_argument("source", help="Folder of job files, or a JSON/TOML manifest with a jobs list")
+    batch.add_argument("--jobs", type=int, default=4, help="Jobs in progress at once (default: 4)")
+    batch.add_argument("--io-slots", type=int, default=2, help="Jobs hashing or writing tar files at once (default: 2)")
+    batch.add_argument("--cpu-slots", type=int, default=None, help="Jobs generating metadata at once (default: no limit)")
+    batch.add_argument("--output", dest="output_root", help="Folder packages are created in unless a job sets output_root")
+    batch.add_argument("--username", help="Agent recorded in the log.xml files unless a job sets username")
+    batch.add_argument("--state", help="Resume state file (default: OUTPUT/batch_state.json)")
+    batch.add_argument("-q", "--quiet", action="store_true", help="Only print the summary")
+    batch.add_argument("--log-file", help="Also append the log as JSON lines to this file")
+    batch.add_argument("--progress", type=float, metavar="SECONDS", 
+                       help="Log progress, throughput and ETA of every running job every SECONDS")
+    add_trace_arguments(batch)
+    batch.set_defaults(func=cmd_batch)
+
+    verify = commands.add_parser("verify", help="Check finished packages against their mets.xml, premis.xml and info.xml")
+    verify.add_argument("paths", nargs="+", help="AIC folders, or folders holding AIC folders")
+    verify.add_argument("--jobs", type=int, default=4, help="Packages verified at once (default: 4)")
+    verify.add_argument("--processes", dest="use_processes", action="store_true", 
+                        help="Verify on worker processes instead of threads")
+    verify.add_argument("--report", help="Also write the reports as JSON to this file")
+    verify.add_argument("-q", "--quiet", action="store_true", help="Only print the summary")
+    verify.add_argument("--log-file", help="Also append the log as JSON lines to this file")
+    verify.set_defaults(func=cmd_verify)
+    return parser
+
+
+def main(argv: list = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
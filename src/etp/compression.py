@@ -0,0 +1,205 @@
+"""Compressed tar output through multi-threaded zstd or pigz, with in-process fallbacks
+
+The tar stream is piped into `zstd -T0` or `pigz`, which compress on every
+core. A thread copies their output into the archive file, so the compressed
+bytes can be hashed on the way to disk. Without the binaries, zstd falls back
+to the optional zstandard module and gzip to the standard library, both in
+this process.
+"""
+import gzip
+import shutil
+import threading
+import subprocess
+from typing import NamedTuple
+
+PIPE_CHUNK = 1024 * 1024
+
+
+class OutputFormat(NamedTuple):
+    """An archive format: file extension, MIME type for info.xml and compressor commands"""
+    extension: str
+    mime: str
+    default_level: int = None
+    # Binary, then its arguments to compress and to decompress to stdout
+    binary: str = None
+    compress_args: tuple = ()
+    decompress_args: tuple = ()
+
+
+FORMATS = {
+    "tar": OutputFormat(".tar", "application/x-tar"),
+    "tar.zst": OutputFormat(".tar.zst", "application/zstd", 3, "zstd", ("-T0", "-q", "-c"), ("-d", "-q", "-c")),
+    "tar.gz": OutputFormat(".tar.gz", "application/gzip", 6, "pigz", ("-c",), ("-d", "-c")),
+}
+
+
+def format_of(path: str) -> str:
+    """Output format name of an archive file name"""
+    for name, output_format in sorted(FORMATS.items(), key=lambda item: -len(item[1].extension)):
+        if path.endswith(output_format.extension):
+            return name
+    raise ValueError(f"Unknown archive format: {path}")
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def implementation(name: str) -> str:
+    """Which compressor open_compressor would use for a format, raises ValueError if there is none"""
+    output_format = FORMATS[name]
+    if output_format.binary is None:
+        return "none"
+    if shutil.which(output_format.binary):
+        return output_format.binary
+    if name == "tar.gz":
+        return "python gzip"
+    if _zstandard() is not None:
+        return "python zstandard"
+    raise ValueError(f"{name} output needs the {output_format.binary} program or the zstandard module")
+
+
+class PipeCompressor:
+    """Writable stream that compresses through a child process into fo"""
+
+    def __init__(self, fo, command: list):
+        self._fo = fo
+        self._in = 0
+        self._error = None
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._thread = threading.Thread(target=self._copy, name="compress", daemon=True)
+        self._thread.start()
+
+    def _copy(self):
+        try:
+            while True:
+                data = self._process.stdout.read(PIPE_CHUNK)
+                if not data:
+                    break
+                self._fo.write(data)
+        except OSError as e:
+            self._error = e
+            self._process.kill()
+
+    def write(self, data) -> int:
+        # The copy thread kills the compressor when it fails, its error is the one to report
+        if self._error is not None:
+            raise self._error
+        try:
+            self._process.stdin.write(data)
+        except BrokenPipeError:
+            self._thread.join()
+            if self._error is not None:
+                raise self._error
+            raise
+        self._in += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._in
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """Finish the compressed stream, raising OSError if the compressor failed"""
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._thread.join()
+        status = self._process.wait()
+        if self._error is not None:
+            raise self._error
+        if status != 0:
+            raise OSError(f"{self._process.args[0]} exited with status {status}")
+
+
+class PipeDecompressor:
+    """Readable stream of what a child process decompresses from fo"""
+
+    def __init__(self, fo, command: list):
+        self._fo = fo
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._thread = threading.Thread(target=self._feed, name="decompress", daemon=True)
+        self._thread.start()
+
+    def _feed(self):
+        try:
+            while True:
+                data = self._fo.read(PIPE_CHUNK)
+                if not data:
+                    break
+                self._process.stdin.write(data)
+        except BrokenPipeError:
+            # The decompressor stopped at an error, close() reports it
+            pass
+        finally:
+            self._process.stdin.close()
+
+    def read(self, size: int = -1) -> bytes:
+        return self._process.stdout.read(size)
+
+    def close(self):
+        """Read to the end and wait for the child, raising OSError if it failed"""
+        while self._process.stdout.read(PIPE_CHUNK):
+            pass
+        self._thread.join()
+        status = self._process.wait()
+        if status != 0:
+            raise OSError(f"{self._process.args[0]} exited with status {status}")
+
+
+class _UncompressedCount:
+    """Adds the tell() tarfile needs to an in-process compressor"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._in = 0
+
+    def write(self, data) -> int:
+        self._in += len(data)
+        return self._stream.write(data)
+
+    def tell(self) -> int:
+        return self._in
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._stream.close()
+
+
+def open_compressor(fo, name: str, level: int = None):
+    """Writable stream that compresses into fo in the given format, fo is not closed"""
+    output_format = FORMATS[name]
+    level = output_format.default_level if level is None else level
+    used = implementation(name)
+    if used == output_format.binary:
+        args = [output_format.binary, *output_format.compress_args, f"-{level}"]
+        if used == "zstd" and level > 19:
+            args.append("--ultra")
+        return PipeCompressor(fo, args)
+    if used == "python gzip":
+        # mtime=0 keeps the output, and its checksum, the same for the same tar
+        return _UncompressedCount(gzip.GzipFile(fileobj=fo, mode="wb", compresslevel=level, mtime=0))
+    compressor = _zstandard().ZstdCompressor(level=level, threads=-1)
+    return _UncompressedCount(compressor.stream_writer(fo, closefd=False))
+
+
+def open_decompressor(fo, name: str):
+    """Readable stream of the tar inside fo, fo itself for an uncompressed tar"""
+    output_format = FORMATS[name]
+    used = implementation(name)
+    if used == "none":
+        return fo
+    if used == output_format.binary:
+        return PipeDecompressor(fo, [output_format.binary, *output_format.decompress_args])
+    if used == "python gzip":
+        return gzip.GzipFile(fileobj=fo, mode="rb")
+    return _zstandard().ZstdDecompressor().stream_reader(fo, closefd=False)
@@ -0,0 +1,64 @@
+"""Find content files with the same bytes, so the tar stores each only once
+
+Candidates are grouped by size first, and only files that share their size
+with another are compared by the SHA-256 gathered in the first pass. The
+first copy the tar writer reaches is stored in full, every later copy becomes
+a hard link member pointing to it. Every copy keeps its own entry in mets.xml
+and premis.xml, and extracting the tar restores all of them.
+"""
+from etp.records import RecordStore
+
+# Duplicate groups listed in the log, largest savings first
+REPORT_GROUPS = 10
+
+
+class Duplicates:
+    """Content files that share their bytes with another, by tar member name"""
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        # member name -> digest, for every file of a group of two or more
+        self.links = {}
+        # digest -> (size, member names) of every group
+        self.groups = {}
+        self.files = 0
+        self.saved_bytes = 0
+
+    def summary(self) -> str:
+        return (f"{self.files} duplicate files in {len(self.groups)} groups stored as hard links, "
+                f"{self.saved_bytes / (1024*1024):.1f}MB saved")
+
+    def report(self, limit: int = REPORT_GROUPS) -> list:
+        """Log lines for the groups that save the most space"""
+        groups = sorted(self.groups.values(), key=lambda group: -group[0] * (len(group[1]) - 1))
+        lines = []
+        for size, names in groups[:limit]:
+            lines.append(f"{len(names)} copies of {names[0][len(self.prefix):]} ({size / (1024*1024):.2f}MB each, "
+                         f"{size * (len(names) - 1) / (1024*1024):.1f}MB saved)")
+        return lines
+
+
+def find_duplicates(store: RecordStore, prefix: str) -> Duplicates:
+    """Group the records below prefix by size, then by checksum
+
+    Empty files are left alone, a hard link member would not be smaller.
+    """
+    sizes = {}
+    for record in store:
+        if record.size and record.path.startswith(prefix):
+            sizes[record.size] = sizes.get(record.size, 0) + 1
+
+    candidates = {}
+    for record in store:
+        if sizes.get(record.size, 0) > 1 and record.path.startswith(prefix):
+            candidates.setdefault(record.digest, (record.size, []))[1].append(record.path)
+
+    duplicates = Duplicates(prefix)
+    for digest, (size, names) in candidates.items():
+        if len(names) > 1:
+            duplicates.groups[digest] = (size, names)
+            duplicates.files += len(names) - 1
+            duplicates.saved_bytes += size * (len(names) - 1)
+            for name in names:
+                duplicates.links[name] = digest
+    return duplicates
@@ -0,0 +1,210 @@
+"""Delta packages: only the content that changed since a baseline package
+
+A baseline is a previous package (AIC folder, its tar or its extracted
+mets.xml) or a record index written with --write-index. Files are compared by
+path, size and the CREATED timestamp first. Only files whose size matches
+but whose timestamp differs are hashed, to tell a touched file from a
+changed one.
+
+The mets.xml of a delta package lists only new and changed files, so it
+cannot be the baseline of the next delta. The record index of a delta build
+holds the full state and chains deltas.
+"""
+import os
+import json
+import tarfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from etp.job import JobError
+from etp.scan import scan_tree
+from etp.checksum import ChecksumEngine, DEFAULT_WORKERS
+from etp.verify import read_info, local_name, XLINK_HREF
+from etp.compression import format_of, open_decompressor
+
+REMOVED_FILE = "removed_files.txt"
+INDEX_VERSION = 1
+
+
+def created(mtime: float) -> str:
+    """mtime in the format METS and PREMIS use, like FileRecord.created"""
+    return datetime.fromtimestamp(int(mtime)).strftime("%Y-%m-%dT%H:%M:%S+02:00")
+
+
+class Baseline:
+    """Content files of a previous package: relpath -> (size, created, checksum, mime)"""
+
+    def __init__(self, id: str, entries: dict, source: str):
+        self.id = id
+        self.entries = entries
+        self.source = source
+
+
+def read_mets(fo, source: str) -> Baseline:
+    """Baseline from a mets.xml stream, refusing the mets.xml of a delta package"""
+    id = None
+    entries = {}
+    for event, elem in ET.iterparse(fo, events=("start", "end")):
+        tag = local_name(elem.tag)
+        if event == "start":
+            if tag == "mets" and id is None:
+                id = elem.get("OBJID", "")
+            continue
+        if tag == "altRecordID" and elem.get("TYPE") in ("BASELINE", "VOLUME"):
+            kind = "a delta package" if elem.get("TYPE") == "BASELINE" else "one volume of a package"
+            raise JobError(f"{source} belongs to {kind}, use the record index of that build as baseline")
+        if tag == "file":
+            href = next((child.get(XLINK_HREF) for child in elem if local_name(child.tag) == "FLocat"), "")
+            if href.startswith("file:content/"):
+                entries[href[len("file:content/"):]] = (int(elem.get("SIZE")), elem.get("CREATED"),
+                                                        elem.get("CHECKSUM").lower(), elem.get("MIMETYPE"))
+            elem.clear()
+    return Baseline(id, entries, source)
+
+
+def read_index(path: str) -> Baseline:
+    """Baseline from a record index written by write_index"""
+    entries = {}
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != INDEX_VERSION:
+            raise JobError(f"Not a record index: {path}")
+        for line in f:
+            record = json.loads(line)
+            entries[record["path"]] = (record["size"], record["created"], record["checksum"], record["mime"])
+    return Baseline(header["package"], entries, path)
+
+
+def read_tar_mets(tar: tarfile.TarFile, source: str) -> Baseline:
+    for member in tar:
+        if member.name.endswith("/mets.xml") and member.name.count("/") == 1:
+            return read_mets(tar.extractfile(member), source)
+    raise JobError(f"No mets.xml in {source}")
+
+
+def load_baseline(path: str) -> Baseline:
+    """Read a baseline from an AIC folder, a package tar, a mets.xml or a record index"""
+    if os.path.isdir(path):
+        tar_name = read_info(os.path.join(path, "info.xml"))[0]
+        path = os.path.join(path, tar_name.split(".", 1)[0], "content", tar_name)
+    if path.endswith(".tar"):
+        # Random access only reads the member headers on the way to mets.xml
+        with tarfile.open(path, "r:") as tar:
+            return read_tar_mets(tar, path)
+    if ".tar." in os.path.basename(path):
+        # A compressed tar has to be decompressed up to mets.xml
+        with open(path, "rb") as f:
+            stream = open_decompressor(f, format_of(path))
+            with tarfile.open(fileobj=stream, mode="r|") as tar:
+                baseline = read_tar_mets(tar, path)
+            stream.close()
+            return baseline
+    if path.endswith(".xml"):
+        with open(path, "rb") as f:
+            return read_mets(f, path)
+    return read_index(path)
+
+
+class Delta:
+    """Content files to package, and what was left out compared with the baseline"""
+
+    def __init__(self, baseline: Baseline):
+        self.baseline = baseline
+        # ScanEntry of every new or changed file, in scan order
+        self.entries = []
+        self.bytes = 0
+        self.new = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.unchanged_bytes = 0
+        self.touched = 0
+        # (relpath, current mtime) of baseline files that are still there unchanged
+        self.kept = []
+        self.removed = []
+
+    def summary(self) -> str:
+        return (f"{self.new} new, {self.changed} changed, {len(self.removed)} removed, "
+                f"{self.unchanged} unchanged ({self.unchanged_bytes / (1024*1024):.1f}MB not packaged, "
+                f"{self.touched} of them hashed because only their timestamp differed)")
+
+
+def compare(content_path: str, baseline: Baseline, workers: int = DEFAULT_WORKERS, on_entry=None) -> Delta:
+    """Sort the content into new, changed, unchanged and removed files
+
+    on_entry(entry) is called for every file found, e.g. to advance progress.
+    """
+    delta = Delta(baseline)
+    entries = baseline.entries
+    # (scan position, entry) of files to package, and of files whose timestamp
+    # changed but whose size did not
+    packaged = []
+    suspects = []
+    seen = set()
+    for position, entry in enumerate(scan_tree(content_path)):
+        seen.add(entry.relpath)
+        if on_entry is not None:
+            on_entry(entry)
+        known = entries.get(entry.relpath)
+        if known is None:
+            delta.new += 1
+            packaged.append((position, entry))
+        elif known[0] != entry.size:
+            delta.changed += 1
+            packaged.append((position, entry))
+        elif known[1] == created(entry.mtime):
+            delta.unchanged += 1
+            delta.unchanged_bytes += entry.size
+            delta.kept.append((entry.relpath, entry.mtime))
+        else:
+            suspects.append((position, entry))
+
+    if suspects:
+        engine = ChecksumEngine(workers)
+        for (position, entry), digest, _, _, error in engine.map(suspects, path_of=lambda item: item[1].path):
+            if error is None and digest == entries[entry.relpath][2]:
+                delta.unchanged += 1
+                delta.unchanged_bytes += entry.size
+                delta.touched += 1
+                delta.kept.append((entry.relpath, entry.mtime))
+            else:
+                delta.changed += 1
+                packaged.append((position, entry))
+        # Keep the tar in the same order as a full package of the content
+        packaged.sort(key=lambda item: item[0])
+
+    delta.entries = [entry for _, entry in packaged]
+    delta.removed = sorted(relpath for relpath in entries if relpath not in seen)
+    delta.bytes = sum(entry.size for entry in delta.entries)
+    return delta
+
+
+def write_removed(path: str, delta: Delta):
+    """List the baseline files that are gone, one content path per line"""
+    with open(path, "w", encoding="utf-8") as fo:
+        fo.write(f"# Removed since {delta.baseline.id}\n")
+        for relpath in delta.removed:
+            fo.write(f"{relpath}\n")
+
+
+def write_index(path: str, package_id: str, records, content_prefix: str, delta: Delta = None):
+    """Write the record index of a package's content, the baseline of a later delta
+
+    records are the FileRecords of the package. For a delta package the
+    unchanged baseline files are added, so the index describes the full content.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", buffering=1024 * 1024) as fo:
+        fo.write(json.dumps({"version": INDEX_VERSION, "package": package_id,
+                             "baseline": delta.baseline.id if delta else None}) + "\n")
+        for record in records:
+            if record.path.startswith(content_prefix):
+                fo.write(json.dumps({"path": record.path[len(content_prefix):], "size": record.size,
+                                     "created": record.created, "checksum": record.hexdigest,
+                                     "mime": record.mime}) + "\n")
+        if delta is not None:
+            for relpath, mtime in delta.kept:
+                size, _, checksum, mime = delta.baseline.entries[relpath]
+                # The current timestamp, so a touched file is not hashed again by the next delta
+                fo.write(json.dumps({"path": relpath, "size": size, "created": created(mtime),
+                                     "checksum": checksum, "mime": mime}) + "\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,162 @@
+"""Packaging job description shared by the GUI form, the CLI and job files"""
+import os
+from dataclasses import dataclass, field
+
+from etp.checksum import DEFAULT_WORKERS
+from etp.mime import SNIFF_SIZE
+from etp.reader import NETWORK_CHUNK
+
+# Form fields in the order of the GUI's TEXT_LIST
+FIELDS = (
+    "system",
+    "system_version",
+    "submission_agreement",
+    "archivist_org",
+    "label",
+    "archivist_system_type",
+    "owner_org",
+    "producer_org",
+    "producer_person",
+    "producer_software",
+    "period_start",
+    "period_end",
+    "submitter_org",
+    "submitter_person",
+    "creator",
+    "preserver",
+)
+# Suffixes parse_size accepts, binary multiples like the MB the logs show
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+class JobError(ValueError):
+    """Raised for job files or arguments that cannot describe a package"""
+
+
+def parse_size(value) -> int:
+    """Bytes from a number or a string like 500M or 4G"""
+    text = str(value).strip().upper().removesuffix("B")
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ""
+    try:
+        return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+    except ValueError:
+        raise JobError(f"Not a size: {value}")
+
+
+@dataclass
+class Job:
+    """Everything main_func used to read from the Tk widgets"""
+    content_path: str
+    fields: dict
+    descriptive_path: str = ""
+    administrative_path: str = ""
+    username: str = "admin"
+    output_root: str = "."
+    single_pass: bool = True
+    workers: int = DEFAULT_WORKERS
+    use_processes: bool = False
+    mime_sniff_size: int = SNIFF_SIZE
+    mime_cache: bool = True
+    # Read size for content on NFS, CIFS and other network file systems
+    network_chunk: int = NETWORK_CHUNK
+    # Previous package or record index to build a delta package against
+    baseline: str = ""
+    # Where to write the record index of the finished package
+    index_path: str = ""
+    # tar, tar.zst or tar.gz, with the compressor's default level unless one is given
+    output_format: str = "tar"
+    compression_level: int = None
+    # Split the content into volumes of at most this many bytes, 0 for one package
+    volume_size: int = 0
+    volume_jobs: int = 2
+    # Store content files with the same bytes once, the copies as hard links
+    dedup: bool = False
+    # Send the SIP archive here instead of the AIC folder, see etp.sinks.open_sink
+    output_sink: str = ""
+    # Continue an interrupted build of the same job from its journal instead of starting over
+    resume: bool = True
+    name: str = field(default="")
+
+    def validate(self):
+        """Raise JobError unless the job can be packaged"""
+        if not self.content_path:
+            raise JobError("No content path specified.")
+        if not os.path.isdir(self.content_path):
+            raise JobError(f"Content path is not a directory: {self.content_path}")
+        for label, path in (("Descriptive", self.descriptive_path), ("Administrative", self.administrative_path)):
+            if path and not os.path.isdir(path):
+                raise JobError(f"{label} metadata path is not a directory: {path}")
+        # Imported here so parsing a job does not load subprocess and gzip
+        from etp.compression import FORMATS, implementation
+        if self.output_format not in FORMATS:
+            raise JobError(f"Unknown output format {self.output_format}, expected one of: {', '.join(FORMATS)}")
+        try:
+            implementation(self.output_format)
+        except ValueError as e:
+            raise JobError(str(e))
+        if self.baseline and not os.path.exists(self.baseline):
+            raise JobError(f"Baseline not found: {self.baseline}")
+        if self.network_chunk <= 0:
+            raise JobError(f"Network chunk size must be positive: {self.network_chunk}")
+        if self.volume_size < 0:
+            raise JobError(f"Volume size must not be negative: {self.volume_size}")
+        if self.volume_size and self.baseline:
+            raise JobError("A delta package cannot be split into volumes")
+        if self.dedup and (self.baseline or self.volume_size):
+            raise JobError("Dedup is not available for delta packages and volumes")
+        if self.output_sink:
+            from etp.sinks import check_target
+            try:
+                check_target(self.output_sink)
+            except ValueError as e:
+                raise JobError(str(e))
+            if self.volume_size:
+                raise JobError("Volumes are always written to the AIC folders, not to an archive output")
+        missing = [name for name in FIELDS if not str(self.fields.get(name, "")).strip()]
+        if missing:
+            raise JobError(f"All input fields require input, missing: {', '.join(missing)}")
+
+
+def load_job_file(path: str) -> dict:
+    """Read a JSON or TOML job file into a plain dict of Job arguments"""
+    data = read_settings_file(path)
+    if not isinstance(data, dict):
+        raise JobError(f"{path}: expected a table of job settings")
+    name = os.path.splitext(os.path.basename(path))[0]
+    return parse_job_settings(data, os.path.dirname(os.path.abspath(path)), name)
+
+
+def read_settings_file(path: str):
+    """Parse a .toml file with tomllib and anything else as JSON"""
+    with open(path, "rb") as f:
+        if path.endswith(".toml"):
+            import tomllib
+            return tomllib.load(f)
+        import json
+        return json.load(f)
+
+
+def parse_job_settings(data: dict, base: str, name: str) -> dict:
+    """Turn one job table into Job arguments
+
+    Form fields may be given at the top level or in a fields table.
+    Relative paths are resolved against base.
+    """
+    data = dict(data)
+    fields = dict(data.pop("fields", {}))
+    for field_name in FIELDS:
+        if field_name in data:
+            fields[field_name] = data.pop(field_name)
+    unknown = set(data) - set(Job.__dataclass_fields__)
+    if unknown:
+        raise JobError(f"{name}: unknown settings: {', '.join(sorted(unknown))}")
+
+    for key in ("content_path", "descriptive_path", "administrative_path", "output_root", "baseline", "index_path"):
+        if data.get(key):
+            data[key] = os.path.join(base, os.path.expanduser(data[key]))
+    for key in ("volume_size", "network_chunk"):
+        if key in data:
+            data[key] = parse_size(data[key])
+    data["fields"] = {field_name: str(value) for field_name, value in fields.items()}
+    data.setdefault("name", name)
+    return data
@@ -0,0 +1,169 @@
+"""Crash-safe journal of the finished stages of a build, so a failed build resumes where it stopped
+
+The journal is a JSON lines file in the build's output folder. The first line
+identifies the job and the SIP; every later line records a finished stage
+with what the following stages need from it. A stage is only recorded once
+its output is synced to disk, and every line is synced before the next stage
+starts, so after a crash, a power loss or a full disk the journal never
+claims more than what is on disk. A torn last line is ignored. The journal is
+removed once the AIC folder has its final name.
+
+A stage recorded again replaces the later stages recorded before it. The
+content is only known by its file count, size and timestamps, see
+content_state. build_volumes keeps a journal of its own in the parent folder,
+with a stage "volume <number>" for every finished volume and "index" once
+their record indexes are merged.
+"""
+import os
+import json
+import hashlib
+import dataclasses
+
+from etp.job import Job
+from etp.scan import scan_tree
+
+JOURNAL_FILE = "journal.jsonl"
+# Stages in the order build_package runs them, scan and hash are one stage
+STAGES = ("stage", "hash", "metadata", "pack", "info", "aic")
+# Job settings that do not change the package, a re-run may use other values
+RUNTIME_SETTINGS = ("workers", "use_processes", "network_chunk", "volume_jobs", "resume")
+PATH_SETTINGS = ("content_path", "descriptive_path", "administrative_path", "baseline", "index_path")
+
+
+def job_key(job: Job) -> str:
+    """Fingerprint of the settings that decide what a job packages"""
+    settings = dataclasses.asdict(job)
+    for name in RUNTIME_SETTINGS:
+        settings.pop(name, None)
+    for name in PATH_SETTINGS:
+        if settings[name]:
+            settings[name] = os.path.abspath(settings[name])
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def content_state(path: str) -> list:
+    """File count, total size and sum of the mtimes in ns of the files below path
+
+    Cheap enough to take on every resume, it misses a file rewritten with the
+    same size and its old timestamp restored.
+    """
+    files = size = mtime_ns = 0
+    for entry in scan_tree(path):
+        files += 1
+        size += entry.size
+        mtime_ns += entry.mtime_ns
+    return [files, size, mtime_ns]
+
+
+def sync_path(path: str):
+    """fsync a file or directory, so what was written to it survives a power loss"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sync_tree(path: str):
+    """fsync every file and directory below path"""
+    for root, _, names in os.walk(path):
+        for name in names:
+            sync_path(os.path.join(root, name))
+        sync_path(root)
+
+
+class Journal:
+    """Stages a build has finished, appended to JOURNAL_FILE in its output folder"""
+
+    def __init__(self, folder: str, entries: list):
+        self.folder = folder
+        self.begin = entries[0]
+        self.stages = {}
+        for entry in entries[1:]:
+            self._set(entry)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.folder, JOURNAL_FILE)
+
+    @classmethod
+    def create(cls, folder: str, key: str, **values) -> "Journal":
+        journal = cls(folder, [dict(values, stage="begin", key=key)])
+        journal._append(journal.begin)
+        sync_path(folder)
+        return journal
+
+    @classmethod
+    def load(cls, folder: str) -> "Journal":
+        """The journal in folder, None if there is none or it has no usable first line"""
+        entries = []
+        try:
+            with open(os.path.join(folder, JOURNAL_FILE), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # A line torn by a crash is the last one, its stage did not count as done
+                        break
+        except OSError:
+            return None
+        if not entries or entries[0].get("stage") != "begin":
+            return None
+        return cls(folder, entries)
+
+    def done(self, stage: str) -> bool:
+        return stage in self.stages
+
+    def last_stage(self) -> str:
+        """The last stage finished, "" before the first"""
+        return max((stage for stage in self.stages if stage in STAGES), key=STAGES.index, default="")
+
+    def record(self, stage: str, **values):
+        """Mark a stage finished, once its output has been synced"""
+        entry = dict(values, stage=stage)
+        self._append(entry)
+        self._set(entry)
+
+    def discard(self, stage: str):
+        """Forget a stage and every later one, until they are recorded again"""
+        for name in STAGES[STAGES.index(stage):]:
+            self.stages.pop(name, None)
+
+    def _set(self, entry: dict):
+        # The later stages were based on the earlier run of this one
+        if entry["stage"] in STAGES:
+            self.discard(entry["stage"])
+        self.stages[entry["stage"]] = entry
+
+    def _append(self, entry: dict):
+        with open(self.path, "a", encoding="utf-8") as fo:
+            fo.write(json.dumps(entry) + "\n")
+            fo.flush()
+            os.fsync(fo.fileno())
+
+    def move(self, folder: str):
+        """Follow the output folder to its new name"""
+        self.folder = folder
+
+    def remove(self):
+        os.remove(self.path)
+        sync_path(self.folder)
+
+
+def find_unfinished(output_root: str, key: str) -> Journal:
+    """The journal of an unfinished build of the job with this key, the furthest one if there are several"""
+    found = None
+    try:
+        with os.scandir(output_root) as it:
+            folders = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return None
+    for folder in folders:
+        if not os.path.exists(os.path.join(folder, JOURNAL_FILE)):
+            continue
+        journal = Journal.load(folder)
+        if journal is None or journal.begin.get("key") != key:
+            continue
+        if found is None or len(journal.stages) > len(found.stages):
+            found = journal
+    return found
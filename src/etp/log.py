@@ -0,0 +1,106 @@
+"""Log channel the packaging core writes to and the GUI or CLI listens on
+
+Handlers are called on the thread that logs, usually a packaging worker, so
+they must never block or touch Tk. The GUI registers a LogChannel and drains
+it from the Tk main loop.
+"""
+import json
+import queue
+import threading
+from datetime import datetime
+from typing import NamedTuple
+
+_handlers = []
+_context = threading.local()
+
+
+class LogRecord(NamedTuple):
+    """One log message as handed to handlers"""
+    time: datetime
+    job: str
+    thread: str
+    message: str
+
+    @property
+    def line(self) -> str:
+        """The message formatted for the log box and stderr"""
+        message = f"[{self.job}] {self.message}" if self.job else self.message
+        return f'[{self.time.strftime("%d/%m/%y - %H:%M:%S")}]: {message}'
+
+
+def add_handler(handler):
+    """Register a callable that receives every LogRecord"""
+    _handlers.append(handler)
+
+
+def remove_handler(handler):
+    if handler in _handlers:
+        _handlers.remove(handler)
+
+
+def set_context(name: str):
+    """Tag messages logged from the current thread, e.g. with a batch job name"""
+    _context.name = name
+
+
+def current_context() -> str:
+    """The tag set_context gave the current thread, None if there is none"""
+    return getattr(_context, "name", None)
+
+
+def log(message: str):
+    """Timestamp a message and pass it to all handlers"""
+    record = LogRecord(datetime.now(), getattr(_context, "name", None), threading.current_thread().name, message)
+    for handler in list(_handlers):
+        handler(record)
+
+
+class LogChannel:
+    """Unbounded thread-safe queue of log records and other events for a GUI
+
+    Workers push without ever blocking, the consumer drains it on a timer.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def __call__(self, record: LogRecord):
+        self._queue.put(("log", record))
+
+    def post(self, kind: str, payload=None):
+        """Queue an event other than a log record, e.g. that the job finished"""
+        self._queue.put((kind, payload))
+
+    def drain(self, limit: int = 5000) -> list:
+        """Return up to limit queued (kind, payload) events without waiting"""
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+
+class JsonLogFile:
+    """Handler appending one JSON object per record to a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fo = open(path, "a", encoding="utf-8")
+
+    def __call__(self, record: LogRecord):
+        entry = {
+            "time": record.time.isoformat(timespec="milliseconds"),
+            "job": record.job,
+            "thread": record.thread,
+            "message": record.message.strip("\n"),
+        }
+        with self._lock:
+            self._fo.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._fo.flush()
+
+    def close(self):
+        with self._lock:
+            self._fo.close()
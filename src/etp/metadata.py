@@ -0,0 +1,292 @@
+"""Streaming premis.xml and mets.xml writers
+
+Both files are written record by record through a large buffer, so memory stays
+flat however many files a deposit has. Values are XML escaped, and the METS file
+IDs are derived from one base UUID plus the record index instead of being kept
+in a list until the structMap is written.
+"""
+import os
+from uuid import UUID, uuid1
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from etp.staging import detach
+from etp.reader import hash_file
+
+WRITE_BUFFER = 1024 * 1024
+# Records written between buffer flushes and progress callbacks
+RECORD_BATCH = 1000
+NODE_MASK = (1 << 48) - 1
+
+_ATTR_ENTITIES = {'"': "&quot;"}
+
+
+def attr(value) -> str:
+    """Escape a value for use inside a double quoted attribute"""
+    return escape(str(value), _ATTR_ENTITIES)
+
+
+def text(value) -> str:
+    """Escape a value for use as element text"""
+    return escape(str(value))
+
+
+def file_ids(base: UUID):
+    """Return a function mapping a record index to its METS ID, unique within one document
+
+    Only the node field of base, the last 12 hex digits, is counted up, so
+    every ID stays a valid version 1 UUID.
+    """
+    prefix = f"ID{str(base)[:24]}"
+    node = base.node
+    return lambda index: f"{prefix}{(node + index) & NODE_MASK:012x}"
+
+
+def sip_records(records, id: str):
+    """Yield every FileRecord except those of mets.xml and premis.xml themselves"""
+    skip = (f'{id}/mets.xml', f'{id}/administrative_metadata/premis.xml')
+    for record in records:
+        if record.path not in skip:
+            yield record
+
+
+def write_batched(fo, parts, on_records=None):
+    """Write an iterable of (record count, text) pairs in batches of RECORD_BATCH records"""
+    batch = []
+    count = 0
+    for records, part in parts:
+        batch.append(part)
+        count += records
+        if count >= RECORD_BATCH:
+            fo.write("".join(batch))
+            batch.clear()
+            if on_records is not None:
+                on_records(count)
+            count = 0
+    fo.write("".join(batch))
+    if on_records is not None and count:
+        on_records(count)
+
+
+PREMIS_START = '''<?xml version='1.0' encoding='UTF-8'?>
+ <premis:premis xmlns:premis="http://arkivverket.no/standarder/PREMIS" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xlink="http://www.w3.org/1999/xlink" xsi:schemaLocation="http://arkivverket.no/standarder/PREMIS http://schema.arkivverket.no/PREMIS/v2.0/DIAS_PREMIS.xsd" version="2.0">
+  <premis:object xsi:type="premis:file">
+    <premis:objectIdentifier>
+      <premis:objectIdentifierType>NO/RA</premis:objectIdentifierType>
+      <premis:objectIdentifierValue>%(id)s</premis:objectIdentifierValue>
+    </premis:objectIdentifier>
+    <premis:preservationLevel>
+      <premis:preservationLevelValue>full</premis:preservationLevelValue>
+    </premis:preservationLevel>
+    <premis:objectCharacteristics>
+      <premis:compositionLevel>0</premis:compositionLevel>
+      <premis:format>
+        <premis:formatDesignation>
+          <premis:formatName>tar</premis:formatName>
+        </premis:formatDesignation>
+      </premis:format>
+    </premis:objectCharacteristics>
+    <premis:storage>
+      <premis:storageMedium>ESSArch Tools</premis:storageMedium>
+    </premis:storage>
+  </premis:object>
+'''
+
+# path, digest, size, format name, then the SIP id twice
+PREMIS_OBJECT = '''  <premis:object xsi:type="premis:file">
+    <premis:objectIdentifier>
+      <premis:objectIdentifierType>NO/RA</premis:objectIdentifierType>
+      <premis:objectIdentifierValue>%s</premis:objectIdentifierValue>
+    </premis:objectIdentifier>
+    <premis:objectCharacteristics>
+      <premis:compositionLevel>0</premis:compositionLevel>
+      <premis:fixity>
+        <premis:messageDigestAlgorithm>SHA-256</premis:messageDigestAlgorithm>
+        <premis:messageDigest>%s</premis:messageDigest>
+        <premis:messageDigestOriginator>ESSArch</premis:messageDigestOriginator>
+      </premis:fixity>
+      <premis:size>%d</premis:size>
+      <premis:format>
+        <premis:formatDesignation>
+          <premis:formatName>%s</premis:formatName>
+        </premis:formatDesignation>
+      </premis:format>
+    </premis:objectCharacteristics>
+    <premis:storage>
+      <premis:contentLocation>
+        <premis:contentLocationType>SIP</premis:contentLocationType>
+        <premis:contentLocationValue>%s</premis:contentLocationValue>
+      </premis:contentLocation>
+    </premis:storage>
+    <premis:relationship>
+      <premis:relationshipType>structural</premis:relationshipType>
+      <premis:relationshipSubType>is part of</premis:relationshipSubType>
+      <premis:relatedObjectIdentification>
+        <premis:relatedObjectIdentifierType>NO/RA</premis:relatedObjectIdentifierType>
+        <premis:relatedObjectIdentifierValue>%s</premis:relatedObjectIdentifierValue>
+      </premis:relatedObjectIdentification>
+    </premis:relationship>
+  </premis:object>
+'''
+
+PREMIS_END = '''  <premis:agent>
+    <premis:agentIdentifier>
+      <premis:agentIdentifierType>NO/RA</premis:agentIdentifierType>
+      <premis:agentIdentifierValue>ESSArch</premis:agentIdentifierValue>
+    </premis:agentIdentifier>
+    <premis:agentName>ESSArch Tools</premis:agentName>
+    <premis:agentType>software</premis:agentType>
+  </premis:agent>
+</premis:premis>'''
+
+
+def configure_sip_premis(premis_path: str, id: str, records, on_records=None):
+    """Configure SIP premis.xml from FileRecords
+
+    on_records, if given, is called with the number of records written after every batch.
+    """
+    sip_id = text(id)
+
+    def objects():
+        for record in sip_records(records, id):
+            path = record.path
+            yield 1, PREMIS_OBJECT % (text(path), record.hexdigest, record.size, text(os.path.splitext(path)[1][1:]), 
+                                      sip_id, sip_id)
+
+    # A premis.xml from the administrative metadata may be hardlinked to its source
+    detach(premis_path)
+    with open(premis_path, "w", encoding="utf-8", buffering=WRITE_BUFFER) as fo:
+        fo.write(PREMIS_START % {"id": sip_id})
+        write_batched(fo, objects(), on_records)
+        fo.write(PREMIS_END)
+
+
+METS_START = '''<?xml version="1.0" encoding="UTF-8"?>
+<mets:mets xmlns:mets="http://www.loc.gov/METS/" xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.loc.gov/METS/ http://schema.arkivverket.no/METS/mets.xsd" PROFILE="http://xml.ra.se/METS/RA_METS_eARD.xml" LABEL="%(label_attr)s" TYPE="SIP" ID="ID%(mets_id)s" OBJID="UUID:%(id)s">
+    <mets:metsHdr CREATEDATE="%(creation_date)s" RECORDSTATUS="NEW">
+        <mets:agent TYPE="ORGANIZATION" ROLE="ARCHIVIST">
+            <mets:name>%(archivist_org)s</mets:name>
+        </mets:agent>
+        <mets:agent TYPE="OTHER" OTHERTYPE="SOFTWARE" ROLE="ARCHIVIST">
+            <mets:name>%(system)s</mets:name>
+        </mets:agent>
+        <mets:agent TYPE="OTHER" OTHERTYPE="SOFTWARE" ROLE="ARCHIVIST">
+            <mets:name>%(system_version)s</mets:name>
+        </mets:agent>
+        <mets:agent TYPE="OTHER" OTHERTYPE="SOFTWARE" ROLE="ARCHIVIST">
+            <mets:name>%(archivist_system_type)s</mets:name>
+        </mets:agent>
+        <mets:agent TYPE="ORGANIZATION" ROLE="CREATOR">
+            <mets:name>%(creator)s</mets:name>
+        </mets:agent>
+        <mets:agent TYPE="ORGANIZATION" ROLE="OTHER" OTHERROLE="PRODUCER">
+            <mets:name>%(producer_org)s</mets:name>
+        </mets:agent>
+        <mets:agent TYPE="INDIVIDUAL" ROLE="OTHER" OTHERROLE="PRODUCER">
+            <mets:name>%(producer_person)s</mets:name>
+        </mets:agent>
+        <mets:agent TYPE="OTHER" OTHERTYPE="SOFTWARE" ROLE="OTHER" OTHERROLE="PRODUCER">
+            <mets:name>%(producer_software)s</mets:name>
+        </mets:agent>
+        <mets:agent TYPE="ORGANIZATION" ROLE="OTHER" OTHERROLE="SUBMITTER">
+            <mets:name>%(submitter_org)s</mets:name>
+        </mets:agent>
+        <mets:agent TYPE="INDIVIDUAL" ROLE="OTHER" OTHERROLE="SUBMITTER">
+            <mets:name>%(submitter_person)s</mets:name>
+        </mets:agent>
+        <mets:agent TYPE="ORGANIZATION" ROLE="IPOWNER">
+            <mets:name>%(owner_org)s</mets:name>
+        </mets:agent>
+        <mets:agent TYPE="ORGANIZATION" ROLE="PRESERVATION">
+            <mets:name>%(preserver)s</mets:name>
+        </mets:agent>
+        <mets:altRecordID TYPE="SUBMISSIONAGREEMENT">%(submission_agreement)s</mets:altRecordID>
+        <mets:altRecordID TYPE="STARTDATE">%(period_start)s</mets:altRecordID>
+        <mets:altRecordID TYPE="ENDDATE">%(period_end)s</mets:altRecordID>
+%(alt_records)s        <mets:metsDocumentID>mets.xml</mets:metsDocumentID>
+    </mets:metsHdr>
+    <mets:amdSec ID="amdSec001">
+        <mets:digiprovMD ID="digiprovMD001">
+            <mets:mdRef MIMETYPE="text/xml" CHECKSUMTYPE="SHA-256" CHECKSUM="%(premis_checksum)s" MDTYPE="PREMIS" xlink:href="file:administrative_metadata/premis.xml" LOCTYPE="URL" CREATED="%(premis_created)s" xlink:type="simple" ID="%(premis_file_id)s" SIZE="%(premis_size)d"/>
+        </mets:digiprovMD>
+    </mets:amdSec>
+    <mets:fileSec>
+        <mets:fileGrp ID="fgrp001" USE="FILES">
+'''
+
+# Extra references such as the baseline of a delta package or the volume number
+METS_ALT_RECORD = '''        <mets:altRecordID TYPE="%s">%s</mets:altRecordID>
+'''
+
+# MIME type, creation date, digest, ID, size, href
+METS_FILE = '''            <mets:file MIMETYPE="%s" CHECKSUMTYPE="SHA-256" CREATED="%s" CHECKSUM="%s" USE="Datafile" ID="%s" SIZE="%d">
+                <mets:FLocat xlink:href="%s" LOCTYPE="URL" xlink:type="simple"/>
+            </mets:file>
+'''
+
+METS_STRUCT_MAP = '''        </mets:fileGrp>
+    </mets:fileSec>
+    <mets:structMap>
+        <mets:div LABEL="Package">
+            <mets:div ADMID="amdSec001" LABEL="Content Description">
+                <mets:fptr FILEID="%s"/>
+            </mets:div>
+            <mets:div ADMID="amdSec001" LABEL="Datafiles">
+'''
+
+METS_FPTR = '''                <mets:fptr FILEID="%s"/>
+'''
+
+METS_END = '''            </mets:div>
+        </mets:div>
+    </mets:structMap>
+</mets:mets>'''
+
+
+def hash_premis(premis_path: str) -> tuple:
+    """SHA-256, creation date and size of premis.xml for the METS amdSec"""
+    digest, _, _ = hash_file(premis_path)
+    stat = os.stat(premis_path)
+    return digest, datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%dT%H:%M:%S+02:00"), stat.st_size
+
+
+def configure_sip_mets(mets_path: str, id: str, creation_date: str, premis_path: str, records, fields: dict,
+                       on_records=None, alt_records: tuple = ()):
+    """Configure SIP mets.xml from FileRecords
+
+    fileSec and structMap come from a single pass over the records: record i
+    gets ID file_id(i + 1), so the structMap only needs the record count.
+    alt_records are (type, value) pairs added as altRecordIDs to the header.
+    """
+    premis_checksum, premis_created, premis_size = hash_premis(premis_path)
+    file_id = file_ids(uuid1())
+    prefix = f'{id}/'
+
+    header = {name: text(value) for name, value in fields.items()}
+    header.update(
+        label_attr=attr(fields["label"]),
+        mets_id=uuid1(),
+        id=attr(id),
+        creation_date=attr(creation_date),
+        premis_checksum=premis_checksum,
+        premis_created=premis_created,
+        premis_file_id=file_id(0),
+        premis_size=premis_size,
+        alt_records="".join(METS_ALT_RECORD % (attr(kind), text(value)) for kind, value in alt_records),
+    )
+    count = 0
+
+    def files():
+        nonlocal count
+        for record in sip_records(records, id):
+            count += 1
+            yield 1, METS_FILE % (attr(record.mime), record.created, record.hexdigest, file_id(count), record.size,
+                                  attr('file:' + record.path.removeprefix(prefix)))
+
+    detach(mets_path)
+    with open(mets_path, "w", encoding="utf-8", buffering=WRITE_BUFFER) as fo:
+        fo.write(METS_START % header)
+        write_batched(fo, files(), on_records)
+        fo.write(METS_STRUCT_MAP % file_id(0))
+        write_batched(fo, ((1, METS_FPTR % file_id(index)) for index in range(1, count + 1)))
+        fo.write(METS_END)
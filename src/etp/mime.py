@@ -0,0 +1,111 @@
+"""MIME type detection with one libmagic handle per thread and a signature cache
+
+magic.from_buffer() shares a single handle behind a global lock, so parallel
+hashing workers queue up on it. MimeDetector gives every thread its own
+magic.Magic, only passes the first sniff_size bytes, and can remember the type
+of formats whose leading bytes decide it, keyed by file extension plus that
+format's signature.
+"""
+import os
+import time
+import threading
+
+from etp import trace
+
+SNIFF_SIZE = 64 * 1024
+# Types libmagic recognises from a fixed signature at the start of the file, and
+# the signature length. Text, XML and ZIP or RIFF based formats depend on content
+# further in and are never cached.
+SIGNATURES = {
+    "application/pdf": 5,
+    "image/tiff": 4,
+    "image/jpeg": 3,
+    "image/png": 8,
+    "image/gif": 6,
+    "image/jp2": 12,
+    "application/gzip": 2,
+    "application/x-sqlite3": 16,
+}
+SIGNATURE_SIZE = max(SIGNATURES.values())
+
+
+class MimeDetector:
+    """Thread-safe MIME detection, reports cache hit rate and time spent in libmagic"""
+
+    def __init__(self, sniff_size: int = SNIFF_SIZE, use_cache: bool = True):
+        self.sniff_size = max(SIGNATURE_SIZE, sniff_size)
+        self.use_cache = use_cache
+        self.lookups = 0
+        self.hits = 0
+        self.seconds = 0.0
+        self._cache = {}
+        self._lengths = ()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _handle(self):
+        handle = getattr(self._local, "handle", None)
+        if handle is None:
+            # Imported here so the GUI and job parsing start without loading libmagic
+            import magic
+            handle = self._local.handle = magic.Magic(mime=True)
+        return handle
+
+    def detect(self, head: bytes, path: str = "") -> str:
+        """MIME type of a file starting with head, path is only used for its extension"""
+        extension = os.path.splitext(path)[1].lower()
+        if self.use_cache:
+            for length in self._lengths:
+                mime = self._cache.get((extension, head[:length]))
+                if mime is not None:
+                    with self._lock:
+                        self.lookups += 1
+                        self.hits += 1
+                    return mime
+
+        start = time.perf_counter()
+        mime = self._handle().from_buffer(head[:self.sniff_size])
+        end = time.perf_counter()
+        elapsed = end - start
+        trace.add_span("libmagic", "mime", start, end, threading.current_thread().name)
+
+        with self._lock:
+            self.lookups += 1
+            self.seconds += elapsed
+            length = SIGNATURES.get(mime)
+            if self.use_cache and length is not None and len(head) >= length:
+                self._cache[(extension, head[:length])] = mime
+                if length not in self._lengths:
+                    self._lengths = tuple(sorted(self._lengths + (length,)))
+        return mime
+
+    def summary(self) -> str:
+        rate = 100 * self.hits / self.lookups if self.lookups else 0.0
+        return (f"{self.lookups} lookups, {self.hits} cache hits ({rate:.0f}% hit rate), "
+                f"{self.seconds:.2f}s in libmagic")
+
+
+_default = None
+
+
+def default_detector() -> MimeDetector:
+    """Process-wide detector, used where no detector is passed, e.g. in worker processes"""
+    global _default
+    if _default is None:
+        _default = MimeDetector()
+    return _default
+
+
+def configure_default(sniff_size: int = SNIFF_SIZE, use_cache: bool = True):
+    """Replace the process-wide detector, used as a process pool initializer"""
+    global _default
+    _default = MimeDetector(sniff_size, use_cache)
+
+
+def _reset_after_fork():
+    # The parent's lock and handles must not be shared with a forked worker
+    global _default
+    _default = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
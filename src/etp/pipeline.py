@@ -0,0 +1,533 @@
+"""Packaging pipeline: builds a SIP/AIC from a Job without any GUI code"""
+import os
+import shutil
+import threading
+import traceback
+from uuid import UUID, uuid1
+from datetime import datetime
+from operator import attrgetter
+from etp import trace
+from etp.log import log
+from etp.job import Job
+from etp.archive import SipArchiveWriter
+from etp.checksum import ChecksumEngine, DEFAULT_WORKERS
+from etp.scan import TreeScanner
+from etp.cache import ChecksumCache, CACHE_FILE
+from etp.scheduler import StageScheduler, UNLIMITED
+from etp.progress import Progress, TWO_PASS_WEIGHTS, SINGLE_PASS_WEIGHTS
+from etp.metadata import attr, text, configure_sip_premis, configure_sip_mets
+from etp.records import RecordStore
+from etp.dedup import find_duplicates
+from etp.sinks import open_sink
+from etp.journal import Journal, content_state, find_unfinished, job_key, sync_path, sync_tree
+from etp.reader import NETWORK_CHUNK, hash_file
+from etp.mime import MimeDetector
+from etp.staging import Stager
+from etp.compression import FORMATS, implementation
+from etp.delta import REMOVED_FILE, load_baseline, compare, write_removed, write_index
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "template_files")
+
+def gather_file_info(directory: str, prefix: str, store: RecordStore, workers: int = DEFAULT_WORKERS, 
+                     use_processes: bool = False, cache: ChecksumCache = None, progress: Progress = None, 
+                     detector: MimeDetector = None, network_chunk: int = NETWORK_CHUNK) -> RecordStore:
+    """Add SHA-256 hash, mimetype, filesize and modification time of all files to store
+
+    Files whose size, mtime and inode match an entry in cache are not re-read.
+    If progress is given, the scan and hash stages are advanced on it.
+    """
+    log(f"Gathering checksums from: {directory}")
+    file_count = 0
+    error_count = 0
+    
+    # Files are hashed while the walk is still running, so the total is a running estimate
+    scanner = TreeScanner(directory)
+    engine = ChecksumEngine(workers, use_processes, on_bytes=progress.callback("hash") if progress else None, 
+                            detector=detector, network_chunk=network_chunk)
+    
+    def lookup(entry):
+        cached = cache.lookup(entry)
+        # Cached files are never read, count their bytes as hashed right away
+        if cached is not None and progress is not None:
+            progress.advance("hash", entry.size)
+        return cached
+    
+    if progress is not None:
+        progress.start("hash")
+    
+    for entry, digest, mime, _, error in engine.map(scanner, path_of=attrgetter("path"), 
+                                                      lookup=lookup if cache is not None else None):
+        file_count += 1
+        
+        if progress is not None:
+            progress.set_total("scan", scanner.discovered)
+            progress.set_total("hash", scanner.discovered_bytes)
+            if scanner.done:
+                progress.finish("scan")
+        
+        # Log progress every 50 files
+        if file_count % 50 == 0:
+            log(f"  Progress: {file_count}/{scanner.estimate()} files")
+        
+        if error is not None:
+            error_count += 1
+            log(f"  ⚠ Error processing {entry.relpath}: {error}")
+            continue
+        
+        if cache is not None:
+            cache.store(entry, digest, mime)
+        
+        store.add(f'{prefix}/{entry.relpath}', bytes.fromhex(digest), mime, entry.size, entry.mtime)
+    
+    for path, message in scanner.errors:
+        error_count += 1
+        log(f"  ⚠ Error scanning {path}: {message}")
+    
+    log(f"  Progress: {file_count}/{scanner.discovered} files")
+    log(f"  ✓ Processed: {file_count - error_count}/{scanner.discovered} files")
+    if error_count > 0:
+        log(f"  ⚠ Skipped: {error_count} files due to errors")
+    for line in engine.report():
+        log(f"  Worker {line}")
+    if progress is not None:
+        progress.finish("scan")
+        progress.finish("hash")
+    
+    return store
+
+def estimate_content(content_path: str, progress: Progress, stage: str) -> threading.Thread:
+    """Walk the content in the background and grow the byte total of stage as files are found"""
+    def run():
+        scanner = TreeScanner(content_path)
+        for count, _ in enumerate(scanner, 1):
+            if count % 1000 == 0:
+                progress.set_total("scan", scanner.discovered)
+                progress.set_total(stage, scanner.discovered_bytes)
+        progress.set_total("scan", scanner.discovered)
+        progress.set_total(stage, scanner.discovered_bytes)
+        progress.finish("scan")
+    
+    thread = threading.Thread(target=run, name="estimate", daemon=True)
+    thread.start()
+    return thread
+
+def pack_sip(sip_tarfile: str, id: str, content_path: str, on_bytes=None, output_format: str = "tar", 
+             level: int = None, links: dict = None, sink=None) -> tuple:
+    """Package the SIP into a tar archive in a single streaming pass
+
+    links maps content member names to a content key, members sharing a key
+    after the first are stored as hard links. The archive goes to sink, an
+    etp.sinks sink, instead of the local file if one is given. Returns the
+    SHA-256 and size of a compressed or sunk archive, which is hashed while
+    written, and (None, None) for a plain local tar.
+    """
+    log("Packaging SIP into tar archive...")
+    
+    tar_file = f"{sip_tarfile}{FORMATS[output_format].extension}"
+    sip_basename = os.path.basename(sip_tarfile)
+    
+    # Stream the SIP skeleton and the content tree into their final member names,
+    # so nothing is extracted, moved or re-archived on disk
+    with SipArchiveWriter(tar_file, on_bytes=on_bytes, output_format=output_format, level=level, 
+                          links=links, sink=sink) as archive:
+        log("  Adding SIP structure to archive...")
+        archive.add_tree(sip_tarfile, sip_basename, exclude=("content",))
+        log("  Adding content to archive...")
+        archive.add_tree(content_path, f"{sip_basename}/content")
+    
+    log(f"  ✓ Packaging complete ({archive.file_count} files, {archive.byte_count / (1024*1024):.1f}MB)")
+    if archive.linked_count:
+        log(f"  Hard links: {archive.linked_count} members, {archive.linked_bytes / (1024*1024):.1f}MB not stored")
+    return archive.sha256, archive.size
+
+def pack_sip_pipelined(sip_tarfile: str, id: str, content_path: str, store: RecordStore, fields: dict, 
+                       progress: Progress = None, detector: MimeDetector = None, entries: list = None, 
+                       alt_records: tuple = (), output_format: str = "tar", level: int = None, sink=None) -> tuple:
+    """Package the SIP while gathering content file info, reading every content byte once
+
+    Content members are written first so their checksums are known when premis.xml
+    and mets.xml are generated and appended behind them. If entries, ScanEntries of
+    the content in tree order, are given only those files are packaged. The archive
+    goes to sink instead of the local file if one is given. Returns the SHA-256 and
+    size of the finished archive.
+    """
+    log("Packaging SIP into tar archive (single pass)...")
+    
+    tar_file = f"{sip_tarfile}{FORMATS[output_format].extension}"
+    sip_basename = os.path.basename(sip_tarfile)
+    content_files = 0
+    if detector is None:
+        detector = MimeDetector()
+    
+    def collect(path, tarinfo, reader):
+        nonlocal content_files
+        # The member name already is the path mets.xml and premis.xml refer to
+        store.add(tarinfo.name, reader.digest(), detector.detect(reader.head, path), tarinfo.size, tarinfo.mtime)
+        content_files += 1
+        if content_files % 50 == 0:
+            log(f"  Progress: {content_files} files")
+    
+    if progress is not None:
+        progress.start("pack")
+        if entries is None:
+            estimate_content(content_path, progress, "pack")
+        else:
+            progress.set_total("pack", sum(entry.size for entry in entries))
+    
+    with SipArchiveWriter(tar_file, hash_output=True, on_bytes=progress.callback("pack") if progress else None, 
+                          output_format=output_format, level=level, sink=sink) as archive:
+        archive.add_file(sip_tarfile, sip_basename)
+        log(f"  Adding and hashing content from: {content_path}")
+        with trace.span("content"):
+            if entries is None:
+                archive.add_tree(content_path, f"{sip_basename}/content", on_file=collect)
+            else:
+                archive.add_file(content_path, f"{sip_basename}/content")
+                archive.add_files(content_path, (entry.relpath for entry in entries), f"{sip_basename}/content", 
+                                  on_file=collect)
+        log(f"  ✓ Processed: {content_files} files")
+        
+        write_sip_metadata(sip_tarfile, id, store, fields, progress, alt_records)
+        
+        log("  Adding SIP structure to archive...")
+        with trace.span("skeleton"):
+            archive.add_tree(sip_tarfile, sip_basename, exclude=("content",), include_root=False)
+    if progress is not None:
+        progress.finish("pack")
+    
+    log(f"  ✓ Packaging complete ({archive.file_count} files, {archive.byte_count / (1024*1024):.1f}MB)")
+    return archive.sha256, archive.size
+
+def write_sip_metadata(sip_tarfile: str, id: str, store: RecordStore, fields: dict, progress: Progress = None, 
+                       alt_records: tuple = ()):
+    """Create premis.xml and then mets.xml, which records the checksum of premis.xml"""
+    on_records = None
+    if progress is not None:
+        # Every record is written twice, once to each file
+        progress.start("metadata", 2 * len(store))
+        on_records = progress.callback("metadata")
+    
+    log("Creating PREMIS metadata...")
+    with trace.span("premis.xml"):
+        configure_sip_premis(f'{sip_tarfile}/administrative_metadata/premis.xml', id, store, on_records)
+    log("  ✓ PREMIS created")
+    
+    log("Creating METS metadata...")
+    with trace.span("mets.xml"):
+        configure_sip_mets(f'{sip_tarfile}/mets.xml', id, 
+                          datetime.now().strftime("%Y-%m-%dT%H:%M:%S+02:00"), 
+                          f'{sip_tarfile}/administrative_metadata/premis.xml', 
+                          store, fields, on_records, alt_records)
+    log("  ✓ METS created")
+    if progress is not None:
+        progress.finish("metadata")
+
+def configure_sip_log(log_path: str, id: str, create_date: str, fields: dict, username: str):
+    """Configure SIP log.xml"""
+    header = {name: text(value) for name, value in fields.items()}
+    with open(log_path, "w", encoding="utf-8") as fo:
+        string_log = f'<?xml version=\'1.0\' encoding=\'UTF-8\'?>\n<premis:premis xmlns:premis="http://arkivverket.no/standarder/PREMIS" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xlink="http://www.w3.org/1999/xlink" xsi:schemaLocation="http://arkivverket.no/standarder/PREMIS http://schema.arkivverket.no/PREMIS/v2.0/DIAS_PREMIS.xsd" version="2.0">\n  <premis:object xsi:type="premis:file">\n    <premis:objectIdentifier>\n      <premis:objectIdentifierType>NO/RA</premis:objectIdentifierType>\n      <premis:objectIdentifierValue>{id}</premis:objectIdentifierValue>\n    </premis:objectIdentifier>\n    <premis:preservationLevel>\n      <premis:preservationLevelValue>full</premis:preservationLevelValue>\n    </premis:preservationLevel>\n    <premis:significantProperties>\n      <premis:significantPropertiesType>aic_object</premis:significantPropertiesType>\n      <premis:significantPropertiesValue></premis:significantPropertiesValue>\n    </premis:significantProperties>\n    <premis:significantProperties>\n      <premis:significantPropertiesType>createdate</premis:significantPropertiesType>\n      <premis:significantPropertiesValue>{create_date}</premis:significantPropertiesValue>\n    </premis:significantProperties>\n    <premis:significantProperties>\n      <premis:significantPropertiesType>archivist_organization</premis:significantPropertiesType>\n      <premis:significantPropertiesValue>{header["archivist_org"]}</premis:significantPropertiesValue>\n    </premis:significantProperties>\n    <premis:significantProperties>\n      <premis:significantPropertiesType>label</premis:significantPropertiesType>\n      <premis:significantPropertiesValue>{header["label"]}</premis:significantPropertiesValue>\n    </premis:significantProperties>\n    <premis:significantProperties>\n      <premis:significantPropertiesType>iptype</premis:significantPropertiesType>\n      <premis:significantPropertiesValue>SIP</premis:significantPropertiesValue>\n    </premis:significantProperties>\n    <premis:objectCharacteristics>\n      <premis:compositionLevel>0</premis:compositionLevel>\n      <premis:format>\n        <premis:formatDesignation>\n          <premis:formatName>tar</premis:formatName>\n        </premis:formatDesignation>\n      </premis:format>\n    </premis:objectCharacteristics>\n    <premis:storage>\n      <premis:storageMedium>Preservation platform ESSArch</premis:storageMedium>\n    </premis:storage>\n    <premis:relationship>\n      <premis:relationshipType>structural</premis:relationshipType>\n      <premis:relationshipSubType>is part of</premis:relationshipSubType>\n      <premis:relatedObjectIdentification>\n        <premis:relatedObjectIdentifierType>NO/RA</premis:relatedObjectIdentifierType>\n        <premis:relatedObjectIdentifierValue></premis:relatedObjectIdentifierValue>\n      </premis:relatedObjectIdentification>\n    </premis:relationship>\n  </premis:object>\n  <premis:event>\n    <premis:eventIdentifier>\n      <premis:eventIdentifierType>NO/RA</premis:eventIdentifierType>\n      <premis:eventIdentifierValue>{uuid1()}</premis:eventIdentifierValue>\n    </premis:eventIdentifier>\n    <premis:eventType>10000</premis:eventType>\n    <premis:eventDateTime>{create_date}</premis:eventDateTime>\n    <premis:eventDetail>Log circular created</premis:eventDetail>\n    <premis:eventOutcomeInformation>\n      <premis:eventOutcome>0</premis:eventOutcome>\n      <premis:eventOutcomeDetail>\n        <premis:eventOutcomeDetailNote>Success to create logfile</premis:eventOutcomeDetailNote>\n      </premis:eventOutcomeDetail>\n    </premis:eventOutcomeInformation>\n    <premis:linkingAgentIdentifier>\n      <premis:linkingAgentIdentifierType>NO/RA</premis:linkingAgentIdentifierType>\n      <premis:linkingAgentIdentifierValue>{text(username)}</premis:linkingAgentIdentifierValue>\n    </premis:linkingAgentIdentifier>\n    <premis:linkingObjectIdentifier>\n      <premis:linkingObjectIdentifierType>NO/RA</premis:linkingObjectIdentifierType>\n      <premis:linkingObjectIdentifierValue>{id}</premis:linkingObjectIdentifierValue>\n    </premis:linkingObjectIdentifier>\n  </premis:event>\n</premis:premis>'
+        fo.write(string_log)
+
+def configure_sip_info(info_path: str, tar_path: str, id: str, creation_date: str, fields: dict, checksum: str = None, 
+                       on_bytes=None, mime: str = "application/x-tar", size: int = None):
+    """Configure SIP info.xml, hashing the tar unless its checksum is already known
+
+    With checksum and size given the tar is not looked at, it may have been sent elsewhere.
+    """
+    extra_id = f'ID{uuid1()}'
+    
+    if checksum is None:
+        # The tar is not read again, so a large one is dropped from the page cache behind the hash
+        checksum, _, size = hash_file(tar_path, on_bytes)
+        trace.count("info.bytes", size)
+    if size is None:
+        size = os.path.getsize(tar_path)
+    created = datetime.now() if not os.path.exists(tar_path) else datetime.fromtimestamp(os.path.getmtime(tar_path))
+    
+    header = {name: text(value) for name, value in fields.items()}
+    with open(info_path, "w", encoding="utf-8") as fo:
+        string_info = f'<?xml version="1.0" encoding="UTF-8"?>\n<mets:mets xmlns:mets="http://www.loc.gov/METS/" xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.loc.gov/METS/ http://schema.arkivverket.no/METS/info.xsd" PROFILE="http://xml.ra.se/METS/RA_METS_eARD.xml" LABEL="{attr(fields["label"])}" TYPE="SIP" ID="ID{uuid1()}" OBJID="UUID:{id}">\n    <mets:metsHdr CREATEDATE="{creation_date}" RECORDSTATUS="NEW">\n        <mets:agent TYPE="ORGANIZATION" ROLE="ARCHIVIST">\n            <mets:name>{header["archivist_org"]}</mets:name>\n        </mets:agent>\n        <mets:agent TYPE="OTHER" OTHERTYPE="SOFTWARE" ROLE="ARCHIVIST">\n            <mets:name>{header["system"]}</mets:name>\n        </mets:agent>\n        <mets:agent TYPE="OTHER" OTHERTYPE="SOFTWARE" ROLE="ARCHIVIST">\n            <mets:name>{header["system_version"]}</mets:name>\n        </mets:agent>\n        <mets:agent TYPE="OTHER" OTHERTYPE="SOFTWARE" ROLE="ARCHIVIST">\n            <mets:name>{header["archivist_system_type"]}</mets:name>\n        </mets:agent>\n        <mets:agent TYPE="ORGANIZATION" ROLE="CREATOR">\n            <mets:name>{header["creator"]}</mets:name>\n        </mets:agent>\n        <mets:agent TYPE="ORGANIZATION" ROLE="OTHER" OTHERROLE="PRODUCER">\n            <mets:name>{header["producer_org"]}</mets:name>\n        </mets:agent>\n        <mets:agent TYPE="INDIVIDUAL" ROLE="OTHER" OTHERROLE="PRODUCER">\n            <mets:name>{header["producer_person"]}</mets:name>\n        </mets:agent>\n        <mets:agent TYPE="OTHER" OTHERTYPE="SOFTWARE" ROLE="OTHER" OTHERROLE="PRODUCER">\n            <mets:name>{header["producer_software"]}</mets:name>\n        </mets:agent>\n        <mets:agent TYPE="ORGANIZATION" ROLE="OTHER" OTHERROLE="SUBMITTER">\n            <mets:name>{header["submitter_org"]}</mets:name>\n        </mets:agent>\n        <mets:agent TYPE="INDIVIDUAL" ROLE="OTHER" OTHERROLE="SUBMITTER">\n            <mets:name>{header["submitter_person"]}</mets:name>\n        </mets:agent>\n        <mets:agent TYPE="ORGANIZATION" ROLE="IPOWNER">\n            <mets:name>{header["owner_org"]}</mets:name>\n        </mets:agent>\n        <mets:agent TYPE="ORGANIZATION" ROLE="PRESERVATION">\n            <mets:name>{header["preserver"]}</mets:name>\n        </mets:agent>\n        <mets:altRecordID TYPE="SUBMISSIONAGREEMENT">{header["submission_agreement"]}</mets:altRecordID>\n        <mets:altRecordID TYPE="STARTDATE">{header["period_start"]}</mets:altRecordID>\n        <mets:altRecordID TYPE="ENDDATE">{header["period_end"]}</mets:altRecordID>\n        <mets:metsDocumentID>info.xml</mets:metsDocumentID>\n    </mets:metsHdr>\n    <mets:fileSec>\n        <mets:fileGrp ID="fgrp001" USE="FILES">\n            <mets:file MIMETYPE="{attr(mime)}" CHECKSUMTYPE="SHA-256" CREATED="{created.strftime("%Y-%m-%dT%H:%M:%S+02:00")}" CHECKSUM="{checksum}" USE="Datafile" ID="{extra_id}" SIZE="{size}">\n                <mets:FLocat xlink:href="{attr("file:" + os.path.basename(tar_path))}" LOCTYPE="URL" xlink:type="simple"/>\n            </mets:file>\n        </mets:fileGrp>\n    </mets:fileSec>\n    <mets:structMap>\n        <mets:div LABEL="Package">\n            <mets:div LABEL="Content Description"/>\n            <mets:div LABEL="Datafiles">\n                <mets:fptr FILEID="{extra_id}"/>\n            </mets:div>\n        </mets:div>\n    </mets:structMap>\n</mets:mets>'
+        fo.write(string_info)
+
+def configure_aic_log(log_path: str, aic_id: str, sip_id: str, create_date: str, fields: dict, username: str):
+    """Configure AIC log.xml"""
+    header = {name: text(value) for name, value in fields.items()}
+    with open(log_path, "w", encoding="utf-8") as fo:
+        string_log = f'<?xml version=\'1.0\' encoding=\'UTF-8\'?>\n<premis:premis xmlns:premis="http://arkivverket.no/standarder/PREMIS" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xlink="http://www.w3.org/1999/xlink" xsi:schemaLocation="http://arkivverket.no/standarder/PREMIS http://schema.arkivverket.no/PREMIS/v2.0/DIAS_PREMIS.xsd" version="2.0">\n  <premis:object xsi:type="premis:file">\n    <premis:objectIdentifier>\n      <premis:objectIdentifierType>NO/RA</premis:objectIdentifierType>\n      <premis:objectIdentifierValue>{sip_id}</premis:objectIdentifierValue>\n    </premis:objectIdentifier>\n    <premis:preservationLevel>\n      <premis:preservationLevelValue>full</premis:preservationLevelValue>\n    </premis:preservationLevel>\n    <premis:significantProperties>\n      <premis:significantPropertiesType>aic_object</premis:significantPropertiesType>\n      <premis:significantPropertiesValue>{aic_id}</premis:significantPropertiesValue>\n    </premis:significantProperties>\n    <premis:significantProperties>\n      <premis:significantPropertiesType>createdate</premis:significantPropertiesType>\n      <premis:significantPropertiesValue>{create_date}</premis:significantPropertiesValue>\n    </premis:significantProperties>\n    <premis:significantProperties>\n      <premis:significantPropertiesType>archivist_organization</premis:significantPropertiesType>\n      <premis:significantPropertiesValue>{header["archivist_org"]}</premis:significantPropertiesValue>\n    </premis:significantProperties>\n    <premis:significantProperties>\n      <premis:significantPropertiesType>label</premis:significantPropertiesType>\n      <premis:significantPropertiesValue>{header["label"]}</premis:significantPropertiesValue>\n    </premis:significantProperties>\n    <premis:significantProperties>\n      <premis:significantPropertiesType>iptype</premis:significantPropertiesType>\n      <premis:significantPropertiesValue>SIP</premis:significantPropertiesValue>\n    </premis:significantProperties>\n    <premis:objectCharacteristics>\n      <premis:compositionLevel>0</premis:compositionLevel>\n      <premis:format>\n        <premis:formatDesignation>\n          <premis:formatName>tar</premis:formatName>\n        </premis:formatDesignation>\n      </premis:format>\n    </premis:objectCharacteristics>\n    <premis:storage>\n      <premis:storageMedium>Preservation platform ESSArch</premis:storageMedium>\n    </premis:storage>\n    <premis:relationship>\n      <premis:relationshipType>structural</premis:relationshipType>\n      <premis:relationshipSubType>is part of</premis:relationshipSubType>\n      <premis:relatedObjectIdentification>\n        <premis:relatedObjectIdentifierType>NO/RA</premis:relatedObjectIdentifierType>\n        <premis:relatedObjectIdentifierValue>{aic_id}</premis:relatedObjectIdentifierValue>\n      </premis:relatedObjectIdentification>\n    </premis:relationship>\n  </premis:object>\n  <premis:event>\n    <premis:eventIdentifier>\n      <premis:eventIdentifierType>NO/RA</premis:eventIdentifierType>\n      <premis:eventIdentifierValue>{uuid1()}</premis:eventIdentifierValue>\n    </premis:eventIdentifier>\n    <premis:eventType>20000</premis:eventType>\n    <premis:eventDateTime>{create_date}</premis:eventDateTime>\n    <premis:eventDetail>Created log circular</premis:eventDetail>\n    <premis:eventOutcomeInformation>\n      <premis:eventOutcome>0</premis:eventOutcome>\n      <premis:eventOutcomeDetail>\n        <premis:eventOutcomeDetailNote>Success to create logfile</premis:eventOutcomeDetailNote>\n      </premis:eventOutcomeDetail>\n    </premis:eventOutcomeInformation>\n    <premis:linkingAgentIdentifier>\n      <premis:linkingAgentIdentifierType>NO/RA</premis:linkingAgentIdentifierType>\n      <premis:linkingAgentIdentifierValue>{text(username)}</premis:linkingAgentIdentifierValue>\n    </premis:linkingAgentIdentifier>\n    <premis:linkingObjectIdentifier>\n      <premis:linkingObjectIdentifierType>NO/RA</premis:linkingObjectIdentifierType>\n      <premis:linkingObjectIdentifierValue>{sip_id}</premis:linkingObjectIdentifierValue>\n    </premis:linkingObjectIdentifier>\n  </premis:event>\n</premis:premis>'
+        fo.write(string_log)
+
+def build_package(job: Job, scheduler: StageScheduler = UNLIMITED, progress: Progress = None, entries: list = None, 
+                  alt_records: tuple = ()) -> dict:
+    """Run the whole packaging pipeline for a job and return the package ids, paths and sizes
+    
+    scheduler decides when the I/O-heavy and the CPU-light stages may run,
+    so a batch of jobs can share the disks fairly. progress, if given, is
+    advanced through every stage and can be polled from another thread.
+    entries limits the content to these ScanEntries, as for one volume, and
+    alt_records are added to the mets.xml header. Finished stages are recorded
+    in a journal in the output folder; with job.resume a build of the same job
+    that stopped half way is continued after its last finished stage.
+    """
+    fields = job.fields
+    if progress is None:
+        progress = Progress()
+    # Delta packages and volumes are always hashed while packing, only their own files are read.
+    # Dedup needs every checksum before the first member is written, so it always takes two passes
+    single_pass = (job.single_pass and not job.dedup) or bool(job.baseline) or entries is not None
+    progress.plan(SINGLE_PASS_WEIGHTS if single_pass else TWO_PASS_WEIGHTS)
+    
+    log("=" * 60)
+    log("Archive Package Creator - Linux Version")
+    log("=" * 60)
+    
+    key = job_key(job)
+    journal = find_unfinished(job.output_root, key) if job.resume else None
+    
+    # Read the baseline before anything is created, it may be unusable
+    baseline = None
+    if job.baseline and not (journal is not None and journal.done("pack")):
+        baseline = load_baseline(job.baseline)
+        log(f"Baseline: {baseline.id}, {len(baseline.entries)} files in {baseline.source}")
+    
+    if journal is not None:
+        sip_id = UUID(journal.begin["sip_id"])
+        output_folder = journal.folder
+        log(f"Resuming {output_folder} after stage: {journal.last_stage() or 'none'}")
+    else:
+        sip_id = uuid1()
+        # Find output folder, claiming it atomically since batch jobs may run side by side
+        output_number = 1
+        while True:
+            output_folder = os.path.join(job.output_root, str(output_number))
+            try:
+                os.makedirs(output_folder)
+                break
+            except FileExistsError:
+                output_number += 1
+        journal = Journal.create(output_folder, key, sip_id=str(sip_id))
+    log(f"SIP ID: {sip_id}")
+    
+    tarfile = f'{output_folder}/{sip_id}/content/{sip_id}'
+    output_format = FORMATS[job.output_format]
+    tar_name = f"{sip_id}{output_format.extension}"
+    if output_format.binary:
+        log(f"Output: {job.output_format}, compressed with {implementation(job.output_format)}")
+    
+    log(f"Output: {output_folder}")
+    
+    if not journal.done("stage"):
+        # Whatever an interrupted attempt staged is started over
+        shutil.rmtree(f'{output_folder}/{sip_id}', ignore_errors=True)
+        log("\n--- Building Directory Structure ---")
+        
+        # Build directory structure
+        os.makedirs(f'{output_folder}/{sip_id}/administrative_metadata/repository_operations')
+        os.makedirs(f'{output_folder}/{sip_id}/descriptive_metadata')
+        os.makedirs(f'{tarfile}/administrative_metadata')
+        os.makedirs(f'{tarfile}/descriptive_metadata')
+        os.makedirs(f'{tarfile}/content')
+        log("  ✓ Directories created")
+        
+        # Copy template files
+        log("Copying template files...")
+        if not os.path.exists(TEMPLATE_DIR):
+            raise FileNotFoundError(f"Template directory not found: {TEMPLATE_DIR}")
+        
+        # Staged files are cloned or hardlinked where the file system allows it
+        stager = Stager()
+        with scheduler.io(), trace.span("staging"):
+            stager.copy_file(os.path.join(TEMPLATE_DIR, "mets.xsd"), f'{tarfile}/mets.xsd')
+            stager.copy_file(os.path.join(TEMPLATE_DIR, "DIAS_PREMIS.xsd"), f'{tarfile}/administrative_metadata/DIAS_PREMIS.xsd')
+            log("  ✓ Templates copied")
+            
+            # Copy optional metadata
+            if job.descriptive_path:
+                log("Copying descriptive metadata...")
+                stager.copy_tree(os.path.abspath(job.descriptive_path), f'{tarfile}/descriptive_metadata')
+                log("  ✓ Descriptive metadata copied")
+            
+            if job.administrative_path:
+                log("Copying administrative metadata...")
+                stager.copy_tree(os.path.abspath(job.administrative_path), f'{tarfile}/administrative_metadata')
+                log("  ✓ Administrative metadata copied")
+            log(f"  Staging: {stager.summary()}")
+        
+        with scheduler.cpu(), trace.span("sip log"):
+            log("Creating SIP log...")
+            configure_sip_log(f'{tarfile}/log.xml', str(sip_id), datetime.now().strftime("%Y-%m-%dT%H:%M:%S+02:00"), 
+                              fields, job.username)
+            log("  ✓ SIP log created")
+        sync_tree(f'{output_folder}/{sip_id}')
+        journal.record("stage")
+    
+    # Zone 1 - ETP Processing
+    log("\n--- Zone 1: ETP Processing ---")
+    
+    packed = journal.stages.get("pack")
+    if packed is None:
+        delta = None
+        if baseline is not None:
+            with scheduler.io(), trace.span("compare"):
+                log("Comparing content with the baseline...")
+                progress.start("scan")
+                delta = compare(job.content_path, baseline, job.workers, lambda entry: progress.advance("scan", 1))
+                progress.finish("scan")
+                write_removed(f'{tarfile}/administrative_metadata/{REMOVED_FILE}', delta)
+                log(f"  ✓ Delta: {delta.summary()}")
+            entries = delta.entries
+            alt_records = (*alt_records, ("BASELINE", baseline.id))
+        
+        # The journal knows the content only by its size and timestamps, if they
+        # changed since the checksums were taken it is hashed again
+        if journal.done("hash") and content_state(job.content_path) != journal.stages["hash"].get("content"):
+            log("  Content changed since it was hashed, hashing it again")
+            journal.discard("hash")
+        
+        # Metadata left by an interrupted attempt must not be taken for skeleton files
+        if not journal.done("metadata"):
+            for stale in (f'{tarfile}/mets.xml', f'{tarfile}/administrative_metadata/premis.xml'):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        
+        # Records spill to a temporary folder next to the packages once they outgrow memory
+        detector = MimeDetector(job.mime_sniff_size, job.mime_cache)
+        with RecordStore(job.output_root) as store:
+            with trace.span("skeleton records"):
+                gather_file_info(tarfile, os.path.basename(tarfile), store, job.workers, job.use_processes, detector=detector)
+            skeleton_files, skeleton_bytes = store.total_files, store.total_bytes
+            saved_bytes = 0
+            
+            if single_pass:
+                # Hashing, tar writing and the metadata in between form one I/O stage
+                with scheduler.io(), trace.span("pack"):
+                    sink = open_sink(job.output_sink, tar_name) if job.output_sink else None
+                    tar_checksum, tar_size = pack_sip_pipelined(tarfile, str(sip_id), job.content_path, store, fields, 
+                                                                progress, detector, entries, alt_records, 
+                                                                job.output_format, job.compression_level, sink)
+                content_files = store.total_files - skeleton_files
+                content_bytes = store.total_bytes - skeleton_bytes
+                if job.index_path:
+                    with trace.span("record index"):
+                        write_index(job.index_path, f"UUID:{sip_id}", store, f"{sip_id}/content/", delta)
+                    log(f"  ✓ Record index written to {job.index_path}")
+            else:
+                hashed = journal.stages.get("hash")
+                # Taken before hashing, so a change while hashing shows on resume
+                state = content_state(job.content_path) if hashed is None else None
+                # The records are gathered again as long as a stage still needs them, the
+                # checksum cache saves reading the content a second time
+                if hashed is None or not journal.done("metadata") or job.dedup:
+                    # Checksums of unchanged files are reused when a failed run is repeated
+                    with scheduler.io(), trace.span("hash"), ChecksumCache(os.path.join(job.output_root, CACHE_FILE)) as cache:
+                        gather_file_info(job.content_path, f'{os.path.basename(tarfile)}/content', store, 
+                                         job.workers, job.use_processes, cache, progress, detector, job.network_chunk)
+                        log(f"  Checksum cache: {cache.summary()}")
+                if hashed is None:
+                    if job.index_path:
+                        with trace.span("record index"):
+                            write_index(job.index_path, f"UUID:{sip_id}", store, f"{sip_id}/content/", delta)
+                        log(f"  ✓ Record index written to {job.index_path}")
+                    hashed = {"files": store.total_files - skeleton_files, "bytes": store.total_bytes - skeleton_bytes, 
+                              "content": state}
+                    journal.record("hash", **hashed)
+                content_files, content_bytes = hashed["files"], hashed["bytes"]
+                
+                if not journal.done("metadata"):
+                    with scheduler.cpu():
+                        write_sip_metadata(tarfile, str(sip_id), store, fields, progress)
+                    sync_path(f'{tarfile}/administrative_metadata/premis.xml')
+                    sync_path(f'{tarfile}/mets.xml')
+                    journal.record("metadata")
+                
+                links = None
+                if job.dedup:
+                    with trace.span("dedup"):
+                        log("Finding duplicate content...")
+                        duplicates = find_duplicates(store, f"{os.path.basename(tarfile)}/content/")
+                        links = duplicates.links
+                        saved_bytes = duplicates.saved_bytes
+                        log(f"  ✓ Dedup: {duplicates.summary()}")
+                        for line in duplicates.report():
+                            log(f"    {line}")
+                
+                with scheduler.io(), trace.span("tar"):
+                    progress.start("tar", skeleton_bytes + content_bytes - saved_bytes)
+                    sink = open_sink(job.output_sink, tar_name) if job.output_sink else None
+                    tar_checksum, tar_size = pack_sip(tarfile, str(sip_id), job.content_path, progress.callback("tar"), 
+                                                      job.output_format, job.compression_level, links, sink)
+                    progress.finish("tar")
+            
+            if job.use_processes and not single_pass:
+                log("  MIME detection: ran in the worker processes")
+            else:
+                log(f"  MIME detection: {detector.summary()}")
+            if store.spilled_runs:
+                log(f"  File records spilled to disk in {store.spilled_runs} runs")
+        
+        if sink is not None:
+            log(f"  ✓ Archive sent to {sink.location} ({tar_size / (1024*1024):.1f}MB)")
+        # The archive was synced by its sink, so the skeleton it was made from can go
+        packed = {"checksum": tar_checksum, "size": tar_size, "location": sink.location if sink is not None else None, 
+                  "files": content_files, "bytes": content_bytes, "saved_bytes": saved_bytes}
+        journal.record("pack", **packed)
+    if os.path.exists(tarfile):
+        shutil.rmtree(tarfile)
+    
+    if not journal.done("info"):
+        # Hashing the finished tar is only needed when it was not hashed while written
+        with scheduler.io() if packed["checksum"] is None else scheduler.cpu(), trace.span("info"):
+            log("Creating info.xml...")
+            progress.start("info", packed["size"] if packed["size"] is not None else
+                           os.path.getsize(f'{tarfile}{output_format.extension}'))
+            configure_sip_info(f'{output_folder}/info.xml', f'{tarfile}{output_format.extension}', str(sip_id), 
+                              datetime.now().strftime("%Y-%m-%dT%H:%M:%S+02:00"), 
+                              fields, packed["checksum"], progress.callback("info"), output_format.mime, 
+                              packed["size"])
+            progress.finish("info")
+            sync_path(f'{output_folder}/info.xml')
+            journal.record("info")
+            log("  ✓ Info.xml created")
+    
+    # Zone 2 - ETA Processing
+    log("\n--- Zone 2: ETA Processing ---")
+    # The AIC id is kept, so an interrupted rename is finished under the same name
+    if not journal.done("aic"):
+        journal.record("aic", aic_id=str(uuid1()))
+    aic_id = UUID(journal.stages["aic"]["aic_id"])
+    log(f"AIC ID: {aic_id}")
+    
+    aic_folder = os.path.join(job.output_root, str(aic_id))
+    if os.path.abspath(output_folder) != os.path.abspath(aic_folder):
+        configure_aic_log(f'{output_folder}/{sip_id}/log.xml', str(aic_id), str(sip_id), 
+                         datetime.now().strftime("%Y-%m-%dT%H:%M:%S+02:00"), fields, job.username)
+        sync_path(f'{output_folder}/{sip_id}/log.xml')
+        log("  ✓ AIC log created")
+        os.rename(output_folder, aic_folder)
+        sync_path(job.output_root)
+        log(f"  ✓ Renamed to: {aic_id}")
+    journal.move(aic_folder)
+    journal.remove()
+    progress.complete()
+    
+    log("\n" + "=" * 60)
+    log("✓ PROCESS COMPLETE!")
+    log(f"Package: {aic_id}")
+    log("=" * 60)
+    
+    return {
+        "sip_id": str(sip_id), 
+        "aic_id": str(aic_id), 
+        "aic_folder": aic_folder, 
+        "tar_path": packed["location"] or f'{aic_folder}/{sip_id}/content/{tar_name}',
+        "content_files": packed["files"],
+        "content_bytes": packed["bytes"],
+        "saved_bytes": packed["saved_bytes"],
+    }
+
+def write_error_log(path: str = "./error_log.txt") -> str:
+    """Save the traceback of the exception being handled and return it"""
+    error_details = traceback.format_exc()
+    with open(path, "w", encoding="utf-8") as fo:
+        fo.write(error_details)
+    return error_details
@@ -0,0 +1,127 @@
+"""Byte-level progress accounting, throughput and ETA across all pipeline stages"""
+import time
+import threading
+from collections import deque
+from typing import NamedTuple
+
+# Share of the total work per stage, roughly by the bytes each one moves
+TWO_PASS_WEIGHTS = {"scan": 2, "hash": 32, "metadata": 4, "tar": 38, "info": 24}
+SINGLE_PASS_WEIGHTS = {"scan": 2, "pack": 90, "metadata": 4, "info": 4}
+
+# Stages whose units are bytes read or written, the others count entries
+BYTE_STAGES = ("hash", "tar", "pack", "info")
+
+RATE_WINDOW = 30.0
+
+
+class ProgressSnapshot(NamedTuple):
+    """Point-in-time view of a Progress, safe to hand to another thread"""
+    fraction: float
+    stage: str
+    stage_done: int
+    stage_total: int
+    bytes_done: int
+    elapsed: float
+    rate: float
+    eta: float
+
+
+class Progress:
+    """Thread-safe progress of one packaging job
+
+    Stages are weighted by plan(). Totals may grow while a stage runs, e.g. while
+    the scanner is still discovering files, so the fraction is a running estimate.
+    """
+
+    def __init__(self, weights: dict = None):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._samples = deque()
+        self._bytes = 0
+        self.stage = ""
+        self.started = time.monotonic()
+        self.plan(weights or TWO_PASS_WEIGHTS)
+
+    def plan(self, weights: dict):
+        """Set the stages and their weights, keeping the work already recorded"""
+        with self._lock:
+            stages = {}
+            for name, weight in weights.items():
+                done, total, finished = self._stages.get(name, (0, 0, 0, False))[1:]
+                stages[name] = [weight, done, total, finished]
+            self._stages = stages
+
+    def start(self, stage: str, total: int = 0):
+        with self._lock:
+            self.stage = stage
+            entry = self._stages.setdefault(stage, [0, 0, 0, False])
+            entry[2] = total
+
+    def set_total(self, stage: str, total: int):
+        with self._lock:
+            self._stages.setdefault(stage, [0, 0, 0, False])[2] = total
+
+    def advance(self, stage: str, amount: int):
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0, 0, False])
+            entry[1] += amount
+            if stage in BYTE_STAGES:
+                self._bytes += amount
+
+    def finish(self, stage: str):
+        with self._lock:
+            self._stages.setdefault(stage, [0, 0, 0, False])[3] = True
+
+    def complete(self):
+        """Mark every stage finished"""
+        with self._lock:
+            for entry in self._stages.values():
+                entry[3] = True
+
+    def callback(self, stage: str):
+        """A function advancing stage, for code that only knows about byte counts"""
+        return lambda amount: self.advance(stage, amount)
+
+    def snapshot(self) -> ProgressSnapshot:
+        now = time.monotonic()
+        with self._lock:
+            weight_total = sum(entry[0] for entry in self._stages.values()) or 1
+            weighted = 0.0
+            for weight, done, total, finished in self._stages.values():
+                if finished:
+                    weighted += weight
+                elif total:
+                    weighted += weight * min(done / total, 1.0)
+            fraction = weighted / weight_total
+            stage_done, stage_total = self._stages.get(self.stage, (0, 0, 0))[1:3]
+            bytes_done = self._bytes
+
+            # Throughput and ETA over a sliding window, so early stages do not skew them
+            self._samples.append((now, fraction, bytes_done))
+            while len(self._samples) > 2 and now - self._samples[0][0] > RATE_WINDOW:
+                self._samples.popleft()
+            first_time, first_fraction, first_bytes = self._samples[0]
+        span = now - first_time
+        rate = (bytes_done - first_bytes) / span if span > 0 else 0.0
+        speed = (fraction - first_fraction) / span if span > 0 else 0.0
+        eta = (1.0 - fraction) / speed if speed > 0 else -1.0
+        return ProgressSnapshot(fraction, self.stage, stage_done, stage_total, bytes_done, now - self.started, rate, eta)
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 0:
+        return "--:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def format_snapshot(snapshot: ProgressSnapshot) -> str:
+    """One line summary, e.g. 42% hash 1.2/3.4GB 85.0MB/s ETA 00:12:03"""
+    if not snapshot.stage:
+        return f"starting, {format_duration(snapshot.elapsed)} elapsed"
+    if snapshot.stage in BYTE_STAGES:
+        detail = f"{snapshot.stage_done / 1024**3:.1f}/{snapshot.stage_total / 1024**3:.1f}GB"
+    else:
+        detail = f"{snapshot.stage_done}/{snapshot.stage_total}"
+    return (f"{snapshot.fraction:.0%} {snapshot.stage} {detail} "
+            f"{snapshot.rate / (1024*1024):.1f}MB/s ETA {format_duration(snapshot.eta)}")
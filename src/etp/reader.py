@@ -0,0 +1,165 @@
+"""Shared read engine for everything that hashes whole files
+
+Chunks are read with readinto() into a buffer each thread reuses, or taken
+from an mmap of the file, instead of allocating a new bytes object per read.
+The kernel is told that files are read sequentially, and the pages behind the
+reader of a very large file are dropped, so hashing a multi-GB tar does not
+evict the rest of the page cache. The chunk size depends on the file size and
+on the file system: network file systems get larger reads to save round trips.
+"""
+import os
+import mmap
+import hashlib
+import threading
+
+SMALL_CHUNK = 256 * 1024
+MEDIUM_CHUNK = 1024 * 1024
+LARGE_CHUNK = 4 * 1024 * 1024
+# Default read size on network file systems, not measured yet: compare the chunk sizes on the mount
+# with benchmarks/bench_read.py and set the job's network_chunk to the best one
+NETWORK_CHUNK = 8 * 1024 * 1024
+# Files from this size on are read in LARGE_CHUNK pieces, or mapped with use_mmap
+LARGE_FILE = 64 * 1024 * 1024
+# Files from this size on are dropped from the page cache behind the reader, in steps of DROP_WINDOW
+DROP_BEHIND = 256 * 1024 * 1024
+DROP_WINDOW = 32 * 1024 * 1024
+NETWORK_FILESYSTEMS = frozenset(("nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "ceph", "glusterfs", "lustre",
+                                 "fuse.sshfs", "fuse.glusterfs", "fuse.rclone", "afs", "beegfs", "gpfs"))
+
+_filesystems = {}
+_local = threading.local()
+
+
+def _mount_types() -> dict:
+    """(major, minor) -> file system type of every mount, from /proc/self/mountinfo"""
+    types = {}
+    try:
+        with open("/proc/self/mountinfo", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                fields = line.split()
+                # The optional fields end with "-", the type follows it
+                separator = fields.index("-")
+                major, minor = fields[2].split(":")
+                types[int(major), int(minor)] = fields[separator + 1]
+    except (OSError, ValueError, IndexError):
+        pass
+    return types
+
+
+def filesystem_type(st_dev: int) -> str:
+    """File system type of the device a file lives on, "" if it cannot be told"""
+    fstype = _filesystems.get(st_dev)
+    if fstype is None:
+        _filesystems.update({os.makedev(*device): name for device, name in _mount_types().items()})
+        # Devices missing from mountinfo, like btrfs subvolumes, stay unknown instead of re-reading it per file
+        fstype = _filesystems.setdefault(st_dev, "")
+    return fstype
+
+
+def chunk_size(size: int, fstype: str = "", max_chunk: int = None, network_chunk: int = NETWORK_CHUNK) -> int:
+    """Read size for a file of size bytes on a file system of type fstype, at most max_chunk"""
+    if size < SMALL_CHUNK:
+        # One read for the data and one that finds the end
+        chunk = SMALL_CHUNK
+    elif fstype in NETWORK_FILESYSTEMS:
+        chunk = network_chunk
+    elif size >= LARGE_FILE:
+        chunk = LARGE_CHUNK
+    else:
+        chunk = MEDIUM_CHUNK
+    return min(chunk, max_chunk) if max_chunk else chunk
+
+
+def _advise(fd: int, offset: int, length: int, advice: int):
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except (AttributeError, OSError):
+        # Not every platform and file system takes advice
+        pass
+
+
+def _take_buffer(size: int) -> bytearray:
+    free = getattr(_local, "free", None)
+    if free is None:
+        free = _local.free = []
+    # A nested read on the same thread gets a buffer of its own
+    for index, buffer in enumerate(free):
+        if len(buffer) >= size:
+            return free.pop(index)
+    return bytearray(size)
+
+
+def _return_buffer(buffer: bytearray):
+    _local.free.append(buffer)
+
+
+def iter_chunks(path: str, max_chunk: int = None, drop_behind: bool = True, use_mmap: bool = False,
+                network_chunk: int = NETWORK_CHUNK):
+    """Yield memoryviews of successive chunks of a file
+
+    A chunk is only valid until the next one is requested. With drop_behind
+    the pages of files larger than DROP_BEHIND are released once read. With
+    use_mmap, local files from LARGE_FILE on are mapped instead of read; a file
+    truncated while mapped kills the process with SIGBUS, so it is off by default.
+    Files on a network file system are read network_chunk bytes at a time.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        stat = os.fstat(fd)
+        size = stat.st_size
+        fstype = filesystem_type(stat.st_dev)
+        chunk = chunk_size(size, fstype, max_chunk, network_chunk)
+        _advise(fd, 0, 0, getattr(os, "POSIX_FADV_SEQUENTIAL", 2))
+        drop = drop_behind and size >= DROP_BEHIND
+        dropped = 0
+
+        if use_mmap and size >= LARGE_FILE and fstype not in NETWORK_FILESYSTEMS:
+            with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, "madvise"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mapped) as view:
+                    for offset in range(0, size, chunk):
+                        with view[offset:offset + chunk] as part:
+                            yield part
+                        if drop and offset + chunk - dropped >= DROP_WINDOW:
+                            _advise(fd, dropped, offset + chunk - dropped, getattr(os, "POSIX_FADV_DONTNEED", 4))
+                            dropped = offset + chunk
+            return
+
+        buffer = _take_buffer(chunk)
+        try:
+            with open(fd, "rb", buffering=0, closefd=False) as f, memoryview(buffer) as view:
+                offset = 0
+                while True:
+                    count = f.readinto(view[:chunk])
+                    if not count:
+                        break
+                    with view[:count] as part:
+                        yield part
+                    offset += count
+                    if drop and offset - dropped >= DROP_WINDOW:
+                        _advise(fd, dropped, offset - dropped, getattr(os, "POSIX_FADV_DONTNEED", 4))
+                        dropped = offset
+        finally:
+            _return_buffer(buffer)
+    finally:
+        os.close(fd)
+
+
+def hash_file(path: str, on_bytes=None, head_size: int = 0, max_chunk: int = None, drop_behind: bool = True,
+              use_mmap: bool = False, network_chunk: int = NETWORK_CHUNK) -> tuple:
+    """SHA-256 hex digest, the first head_size bytes and the size of a file
+
+    on_bytes, if given, is called with the length of every chunk read.
+    """
+    sha = hashlib.sha256()
+    head = b""
+    size = 0
+    for part in iter_chunks(path, max_chunk, drop_behind, use_mmap, network_chunk):
+        if size < head_size:
+            head += bytes(part[:head_size - size])
+        sha.update(part)
+        size += len(part)
+        if on_bytes is not None:
+            on_bytes(len(part))
+    return sha.hexdigest(), head, size
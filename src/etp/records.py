@@ -0,0 +1,149 @@
+"""Compact store of per-file records that spills sorted runs to disk
+
+Replaces a dict of path -> [hex digest, MIME, size, date string] lists. Records
+keep the raw 32-byte digest, an interned MIME type and an integer mtime, and
+past max_memory they are sorted and written to a run file. Iterating merges
+the runs and the records still in memory, so it always yields paths in order.
+"""
+import os
+import sys
+import heapq
+import shutil
+import struct
+import tempfile
+from datetime import datetime
+from operator import attrgetter
+
+from etp import trace
+
+DEFAULT_MAX_MEMORY = 256 * 1024 * 1024
+# Rough bytes per record on top of the path, for the spill threshold
+RECORD_OVERHEAD = 200
+RUN_BUFFER = 1024 * 1024
+
+# digest, MIME table index, size, mtime, length of the UTF-8 path that follows
+_RUN_RECORD = struct.Struct("<32sIqqI")
+
+
+class FileRecord:
+    """Checksum, MIME type, size and mtime of one packaged file"""
+    __slots__ = ("path", "digest", "mime", "size", "mtime")
+
+    def __init__(self, path: str, digest: bytes, mime: str, size: int, mtime: int):
+        self.path = path
+        self.digest = digest
+        self.mime = mime
+        self.size = size
+        self.mtime = mtime
+
+    @property
+    def hexdigest(self) -> str:
+        return self.digest.hex()
+
+    @property
+    def created(self) -> str:
+        """mtime in the format METS and PREMIS use"""
+        return datetime.fromtimestamp(self.mtime).strftime("%Y-%m-%dT%H:%M:%S+02:00")
+
+    def __repr__(self) -> str:
+        return f"FileRecord({self.path!r}, {self.hexdigest}, {self.mime!r}, {self.size}, {self.mtime})"
+
+
+class RecordStore:
+    """Ordered collection of FileRecords with bounded memory use
+
+    Spilled runs live in a temporary folder below spill_dir, which is removed by
+    close(). Records may still be added after the store has been iterated.
+    """
+
+    def __init__(self, spill_dir: str = None, max_memory: int = DEFAULT_MAX_MEMORY):
+        self.spill_dir = spill_dir
+        self.max_memory = max_memory
+        self.total_files = 0
+        self.total_bytes = 0
+        self._records = []
+        self._memory = 0
+        self._sorted = True
+        self._runs = []
+        self._run_dir = None
+        self._mimes = []
+        self._mime_index = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.total_files
+
+    def add(self, path: str, digest: bytes, mime: str, size: int, mtime: float):
+        """Record a file, digest is the raw SHA-256"""
+        if mime not in self._mime_index:
+            self._mime_index[mime] = len(self._mimes)
+            self._mimes.append(sys.intern(mime))
+        mime = self._mimes[self._mime_index[mime]]
+
+        self._records.append(FileRecord(path, digest, mime, size, int(mtime)))
+        self._sorted = False
+        self.total_files += 1
+        self.total_bytes += size
+        self._memory += len(path) + RECORD_OVERHEAD
+        if self._memory >= self.max_memory:
+            self._spill()
+
+    def _sort(self):
+        if not self._sorted:
+            self._records.sort(key=attrgetter("path"))
+            self._sorted = True
+
+    def _spill(self):
+        """Write the in-memory records to a new sorted run file"""
+        if self._run_dir is None:
+            self._run_dir = tempfile.mkdtemp(prefix=".etp-records-", dir=self.spill_dir)
+        self._sort()
+        run_path = os.path.join(self._run_dir, f"run{len(self._runs):05d}")
+        pack = _RUN_RECORD.pack
+        index = self._mime_index
+        with trace.span("spill records"), open(run_path, "wb", buffering=RUN_BUFFER) as fo:
+            for record in self._records:
+                path = record.path.encode("utf-8", "surrogateescape")
+                fo.write(pack(record.digest, index[record.mime], record.size, record.mtime, len(path)))
+                fo.write(path)
+        self._runs.append(run_path)
+        self._records = []
+        self._memory = 0
+
+    def _read_run(self, run_path: str):
+        unpack = _RUN_RECORD.unpack
+        header_size = _RUN_RECORD.size
+        mimes = self._mimes
+        with open(run_path, "rb", buffering=RUN_BUFFER) as f:
+            while True:
+                header = f.read(header_size)
+                if not header:
+                    break
+                digest, mime, size, mtime, path_length = unpack(header)
+                path = f.read(path_length).decode("utf-8", "surrogateescape")
+                yield FileRecord(path, digest, mimes[mime], size, mtime)
+
+    def __iter__(self):
+        """Yield every record ordered by path"""
+        self._sort()
+        if not self._runs:
+            return iter(self._records)
+        runs = [self._read_run(run_path) for run_path in self._runs]
+        return heapq.merge(*runs, self._records, key=attrgetter("path"))
+
+    @property
+    def spilled_runs(self) -> int:
+        return len(self._runs)
+
+    def close(self):
+        """Drop the records and remove the spilled runs"""
+        self._records = []
+        self._runs = []
+        if self._run_dir is not None:
+            shutil.rmtree(self._run_dir, ignore_errors=True)
+            self._run_dir = None
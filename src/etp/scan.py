@@ -0,0 +1,106 @@
+"""Single-walk directory scanner built on os.scandir"""
+import os
+import queue
+import threading
+from typing import NamedTuple
+
+QUEUE_SIZE = 100000
+
+
+class ScanEntry(NamedTuple):
+    """A file found by the scanner, with the stat fields the pipeline needs"""
+    path: str
+    relpath: str
+    size: int
+    mtime: float
+    mtime_ns: int
+    inode: int
+    device: int
+
+
+def scan_tree(directory: str, errors: list = None):
+    """Yield a ScanEntry for every file below directory, one stat call per file
+
+    Entries of each directory are sorted by name and files come before the
+    contents of subdirectories, so the order is stable between runs. Symlinked
+    directories are listed but not followed, like os.walk. Errors are appended
+    to errors as (path, message) when a list is given.
+    """
+    stack = [(directory, "")]
+    while stack:
+        path, rel = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            if errors is not None:
+                errors.append((path, str(e)))
+            continue
+        subdirs = []
+        for entry in entries:
+            relpath = f"{rel}/{entry.name}" if rel else entry.name
+            try:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append((entry.path, relpath))
+                    continue
+                st = entry.stat()
+            except OSError as e:
+                if errors is not None:
+                    errors.append((entry.path, str(e)))
+                continue
+            yield ScanEntry(entry.path, relpath, st.st_size, st.st_mtime, st.st_mtime_ns, st.st_ino, st.st_dev)
+        stack.extend(reversed(subdirs))
+
+
+class TreeScanner:
+    """Run scan_tree in a background thread and stream its entries
+
+    discovered is a running count that keeps growing while the consumer is
+    already hashing; it becomes the exact total once done is set.
+    """
+
+    def __init__(self, directory: str, queue_size: int = QUEUE_SIZE):
+        self.directory = directory
+        self.discovered = 0
+        self.discovered_bytes = 0
+        self.done = False
+        self.errors = []
+        self._queue = queue.Queue(queue_size)
+        self._cancel = threading.Event()
+
+    def _run(self):
+        try:
+            for entry in scan_tree(self.directory, self.errors):
+                if self._cancel.is_set():
+                    return
+                self.discovered += 1
+                self.discovered_bytes += entry.size
+                self._queue.put(entry)
+        except Exception as e:
+            self.errors.append((self.directory, str(e)))
+        finally:
+            self.done = True
+            self._queue.put(None)
+
+    def __iter__(self):
+        thread = threading.Thread(target=self._run, name="scan", daemon=True)
+        thread.start()
+        try:
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    break
+                yield entry
+        finally:
+            # Stop the walk if the consumer gives up early
+            self._cancel.set()
+            while thread.is_alive():
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    thread.join(0.01)
+
+    def estimate(self) -> str:
+        """Total for progress messages, marked with + while the walk is still running"""
+        return f"{self.discovered}" if self.done else f"{self.discovered}+"
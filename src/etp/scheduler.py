@@ -0,0 +1,39 @@
+"""Stage scheduler that limits how many jobs run I/O-heavy and CPU-light stages at once"""
+import threading
+from contextlib import contextmanager
+
+from etp import trace
+
+
+class StageScheduler:
+    """Separate slot pools for I/O-heavy stages (hash, tar) and CPU-light ones (XML)
+
+    A limit of None leaves that kind of stage unrestricted.
+    """
+
+    def __init__(self, io_slots: int = None, cpu_slots: int = None):
+        self._io = threading.BoundedSemaphore(io_slots) if io_slots else None
+        self._cpu = threading.BoundedSemaphore(cpu_slots) if cpu_slots else None
+
+    @contextmanager
+    def _slot(self, semaphore, name: str):
+        if semaphore is None:
+            yield
+            return
+        with trace.span(f"wait {name} slot", "wait"):
+            semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def io(self):
+        """Context for reading or writing deposit-sized data"""
+        return self._slot(self._io, "io")
+
+    def cpu(self):
+        """Context for metadata generation and other small work"""
+        return self._slot(self._cpu, "cpu")
+
+
+UNLIMITED = StageScheduler()
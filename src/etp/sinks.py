@@ -0,0 +1,271 @@
+"""Destinations for the SIP archive stream: a local file, stdout or a pipe, a TCP socket or S3
+
+The archive writer hashes the stream on its way into the sink, so info.xml
+gets its checksum and size without reading the archive back, and a remote
+destination needs no local scratch space for the archive. S3 uploads need the
+optional boto3 module; parts are uploaded on a thread while the next one is
+filled, so the upload overlaps the packaging.
+"""
+import os
+import sys
+import queue
+import socket
+import struct
+import threading
+import subprocess
+from urllib.parse import urlsplit
+
+from etp import trace
+from etp.journal import sync_path
+
+S3_PART_SIZE = 16 * 1024 * 1024
+# Parts waiting for the upload thread, each holds S3_PART_SIZE or more of memory
+S3_QUEUE = 2
+# S3 allows 10000 parts, so the part size doubles after every S3_PART_STEP parts
+S3_PART_STEP = 1000
+TCP_TIMEOUT = 60.0
+# Local archives are written under their name with this suffix until they are complete
+PARTIAL_SUFFIX = ".partial"
+
+
+def _boto3():
+    try:
+        import boto3
+    except ImportError:
+        return None
+    return boto3
+
+
+def check_target(target: str):
+    """Raise ValueError unless open_sink can send an archive to target"""
+    if target == "-" or target.startswith("pipe:"):
+        if target == "pipe:":
+            raise ValueError("pipe: needs a command, e.g. pipe:ssh host 'cat > sip.tar'")
+        return
+    url = urlsplit(target)
+    if url.scheme == "tcp":
+        if not url.hostname or url.port is None:
+            raise ValueError(f"TCP output needs a host and a port, e.g. tcp://host:9000: {target}")
+    elif url.scheme == "s3":
+        if not url.netloc:
+            raise ValueError(f"S3 output needs a bucket, e.g. s3://bucket/prefix: {target}")
+        if _boto3() is None:
+            raise ValueError("S3 output needs the boto3 module")
+    elif not os.path.isdir(target):
+        raise ValueError(f"Archive output is not a directory: {target}")
+
+
+def open_sink(target: str, name: str):
+    """Sink for the archive file called name at target
+
+    target is "-" for stdout, pipe:COMMAND, tcp://HOST:PORT, s3://BUCKET/PREFIX
+    or a local directory.
+    """
+    if target == "-":
+        return StreamSink()
+    if target.startswith("pipe:"):
+        return StreamSink(target[len("pipe:"):])
+    url = urlsplit(target)
+    if url.scheme == "tcp":
+        return TcpSink(url.hostname, url.port)
+    if url.scheme == "s3":
+        return S3Sink(url.netloc, "/".join(part for part in (url.path.strip("/"), name) if part))
+    return FileSink(os.path.join(target, name))
+
+
+class FileSink:
+    """Archive file on a local disk
+
+    The archive is written to a .partial file that is synced and renamed once
+    complete, so a file under the final name is always a whole archive.
+    """
+
+    def __init__(self, path: str):
+        self.location = path
+        self._partial = f"{path}{PARTIAL_SUFFIX}"
+        self._fo = open(self._partial, "wb")
+
+    def write(self, data) -> int:
+        return self._fo.write(data)
+
+    def tell(self) -> int:
+        # tarfile asks for the offset of an unhashed plain tar
+        return self._fo.tell()
+
+    def flush(self):
+        self._fo.flush()
+
+    def close(self):
+        self._fo.flush()
+        os.fsync(self._fo.fileno())
+        self._fo.close()
+        os.replace(self._partial, self.location)
+        # The rename itself only survives a power loss once the directory is synced
+        sync_path(os.path.dirname(os.path.abspath(self.location)))
+
+    def abort(self):
+        """Close and remove the partial file"""
+        self._fo.close()
+        if os.path.exists(self._partial):
+            os.remove(self._partial)
+
+
+class StreamSink:
+    """Standard output, or the standard input of a command run through the shell"""
+
+    def __init__(self, command: str = None):
+        self._process = None
+        if command:
+            self.location = f"pipe:{command}"
+            self._process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE)
+            self._fo = self._process.stdin
+        else:
+            self.location = "-"
+            self._fo = sys.stdout.buffer
+
+    def write(self, data) -> int:
+        try:
+            return self._fo.write(data)
+        except BrokenPipeError:
+            raise OSError(f"{self.location} stopped reading the archive")
+
+    def flush(self):
+        self._fo.flush()
+
+    def close(self):
+        """Flush the stream, raising OSError if the command failed"""
+        self._fo.flush()
+        if self._process is not None:
+            self._fo.close()
+            status = self._process.wait()
+            if status != 0:
+                raise OSError(f"{self.location} exited with status {status}")
+
+    def abort(self):
+        """Stop the command, whatever it received is incomplete"""
+        if self._process is not None:
+            self._process.kill()
+            try:
+                self._fo.close()
+            except BrokenPipeError:
+                pass
+            self._process.wait()
+
+
+class TcpSink:
+    """Raw archive stream to a TCP listener, the end of the archive is the end of the connection"""
+
+    def __init__(self, host: str, port: int, timeout: float = TCP_TIMEOUT):
+        self.location = f"tcp://{host}:{port}"
+        self._socket = socket.create_connection((host, port), timeout)
+
+    def write(self, data) -> int:
+        self._socket.sendall(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        try:
+            self._socket.shutdown(socket.SHUT_WR)
+        finally:
+            self._socket.close()
+
+    def abort(self):
+        """Reset the connection, so the listener does not take a partial archive for a whole one"""
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        self._socket.close()
+
+
+class S3Sink:
+    """Multipart upload to an S3 compatible object store
+
+    The endpoint and credentials come from the usual boto3 configuration, e.g.
+    AWS_ENDPOINT_URL for a MinIO server. An aborted upload is removed again.
+    """
+
+    def __init__(self, bucket: str, key: str, part_size: int = S3_PART_SIZE, client=None):
+        if client is None:
+            boto3 = _boto3()
+            if boto3 is None:
+                raise ValueError("S3 output needs the boto3 module")
+            client = boto3.client("s3")
+        self.location = f"s3://{bucket}/{key}"
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._part_size = part_size
+        self._buffer = bytearray()
+        self._part_count = 0
+        self._parts = []
+        self._error = None
+        self._upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+        self._queue = queue.Queue(S3_QUEUE)
+        self._thread = threading.Thread(target=self._upload, name="s3 upload", daemon=True)
+        self._thread.start()
+
+    def _upload(self):
+        while True:
+            part = self._queue.get()
+            if part is None:
+                return
+            if self._error is not None:
+                # Keep taking parts, so write() never blocks on a dead upload
+                continue
+            number, data = part
+            try:
+                with trace.span("upload part", "io"):
+                    response = self._client.upload_part(Bucket=self._bucket, Key=self._key, UploadId=self._upload_id,
+                                                        PartNumber=number, Body=bytes(data))
+                self._parts.append({"PartNumber": number, "ETag": response["ETag"]})
+                trace.count("upload.bytes", len(data))
+            except Exception as e:
+                self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise OSError(f"Upload to {self.location} failed: {self._error}") from self._error
+
+    def _send(self):
+        self._part_count += 1
+        self._queue.put((self._part_count, self._buffer))
+        self._buffer = bytearray()
+        if self._part_count % S3_PART_STEP == 0:
+            self._part_size *= 2
+
+    def write(self, data) -> int:
+        self._raise_error()
+        self._buffer += data
+        if len(self._buffer) >= self._part_size:
+            self._send()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """Upload the last part and complete the upload, raising OSError if a part failed"""
+        if self._buffer or not self._part_count:
+            self._send()
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            self._abort_upload()
+            self._raise_error()
+        self._parts.sort(key=lambda part: part["PartNumber"])
+        self._client.complete_multipart_upload(Bucket=self._bucket, Key=self._key, UploadId=self._upload_id,
+                                               MultipartUpload={"Parts": self._parts})
+
+    def abort(self):
+        """Drop the parts uploaded so far"""
+        self._queue.put(None)
+        self._thread.join()
+        self._abort_upload()
+
+    def _abort_upload(self):
+        try:
+            self._client.abort_multipart_upload(Bucket=self._bucket, Key=self._key, UploadId=self._upload_id)
+        except Exception:
+            # The store expires incomplete uploads on its own, the original error matters more
+            pass
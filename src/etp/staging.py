@@ -0,0 +1,137 @@
+"""Stage files into the SIP folder with as little data copying as the file system allows
+
+Each file is cloned (FICLONE reflink, btrfs/XFS), else hardlinked, else copied
+in the kernel with copy_file_range or sendfile, else copied through Python.
+A strategy that fails with an error meaning "not supported here" is skipped
+for the rest of the run.
+
+Hardlinked files share their inode with the source, so anything that writes
+into the staged tree must detach() the path first instead of overwriting it.
+"""
+import os
+import stat
+import errno
+import shutil
+
+STRATEGIES = ("reflink", "hardlink", "copy_file_range", "sendfile", "copy")
+# Strategies that share data instead of copying it
+ZERO_COPY = ("reflink", "hardlink")
+# ioctl request number of FICLONE from linux/fs.h
+FICLONE = 0x40049409
+UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS, errno.EPERM, errno.EMLINK}
+
+
+def detach(path: str):
+    """Remove path if it exists, so writing to it creates a new file instead of changing a hardlinked source"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _reflink(src: str, dst: str, size: int):
+    import fcntl
+    with open(src, "rb") as f, open(dst, "wb") as fo:
+        try:
+            fcntl.ioctl(fo.fileno(), FICLONE, f.fileno())
+        except OSError:
+            fo.close()
+            os.unlink(dst)
+            raise
+
+
+def _hardlink(src: str, dst: str, size: int):
+    os.link(src, dst)
+
+
+def _kernel_copy(copy_chunk):
+    def copy(src: str, dst: str, size: int):
+        with open(src, "rb") as f, open(dst, "wb") as fo:
+            try:
+                offset = 0
+                while offset < size:
+                    sent = copy_chunk(f.fileno(), fo.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            except OSError:
+                fo.close()
+                os.unlink(dst)
+                raise
+    return copy
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def _copy(src: str, dst: str, size: int):
+    with open(src, "rb") as f, open(dst, "wb") as fo:
+        shutil.copyfileobj(f, fo, 1024 * 1024)
+
+
+_COPY_FUNCTIONS = {
+    "reflink": _reflink,
+    "hardlink": _hardlink,
+    "copy_file_range": _kernel_copy(_copy_file_range),
+    "sendfile": _kernel_copy(_sendfile),
+    "copy": _copy,
+}
+
+
+class Stager:
+    """Copy files and trees with the cheapest strategy that works, counting what each one did"""
+
+    def __init__(self, strategies: tuple = STRATEGIES):
+        self.strategies = [name for name in strategies if name in _COPY_FUNCTIONS]
+        if not hasattr(os, "copy_file_range") and "copy_file_range" in self.strategies:
+            self.strategies.remove("copy_file_range")
+        if "copy" not in self.strategies:
+            self.strategies.append("copy")
+        # strategy -> [files, bytes]
+        self.stats = {name: [0, 0] for name in self.strategies}
+
+    def copy_file(self, src: str, dst: str) -> str:
+        """Stage src at dst, replacing an existing dst, and return the strategy used"""
+        src_stat = os.stat(src)
+        detach(dst)
+        for name in list(self.strategies):
+            try:
+                _COPY_FUNCTIONS[name](src, dst, src_stat.st_size)
+            except OSError as e:
+                if name == "copy" or e.errno not in UNSUPPORTED:
+                    raise
+                # The file system or the pair of mounts cannot do this, do not try it again
+                self.strategies.remove(name)
+                continue
+            if name != "hardlink":
+                os.chmod(dst, stat.S_IMODE(src_stat.st_mode))
+            self.stats[name][0] += 1
+            self.stats[name][1] += src_stat.st_size
+            return name
+
+    def copy_tree(self, src: str, dst: str):
+        """Stage every file below src into dst, merging with folders that already exist"""
+        os.makedirs(dst, exist_ok=True)
+        with os.scandir(src) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        for entry in entries:
+            target = os.path.join(dst, entry.name)
+            if entry.is_dir():
+                self.copy_tree(entry.path, target)
+            else:
+                self.copy_file(entry.path, target)
+
+    @property
+    def copied_bytes(self) -> int:
+        """Bytes that were really read and written"""
+        return sum(size for name, (_, size) in self.stats.items() if name not in ZERO_COPY)
+
+    def summary(self) -> str:
+        used = [f"{name} {files} files/{size / (1024*1024):.1f}MB"
+                for name, (files, size) in self.stats.items() if files]
+        return f"{', '.join(used) or 'nothing staged'}; {self.copied_bytes / (1024*1024):.1f}MB copied"
@@ -0,0 +1,256 @@
+"""Timed spans, counters and peak memory of a packaging run
+
+Nothing is recorded until start() installs a Tracer; until then span() hands
+out a shared no-op context and count() returns at once, so the calls can stay
+in the hot paths. A Tracer exports a JSON summary with the time per span name,
+the counters and the peak RSS, and a Chrome trace that chrome://tracing and
+ui.perfetto.dev open.
+"""
+import os
+import json
+import time
+import threading
+from contextlib import nullcontext
+
+# Spans kept for the Chrome trace, later ones are only added to the summary
+MAX_EVENTS = 500000
+SAMPLE_INTERVAL = 0.1
+
+_tracer = None
+_NO_SPAN = nullcontext()
+
+
+def peak_rss() -> tuple:
+    """Peak resident set size in bytes of this process and of its waited-for children"""
+    try:
+        import resource
+    except ImportError:
+        return 0, 0
+    # ru_maxrss is in kilobytes on Linux
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024)
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes, 0 where /proc is missing"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "category", "args", "start")
+
+    def __init__(self, tracer, name: str, category: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.add_span(self.name, self.category, self.start, time.perf_counter(),
+                             threading.current_thread().name, self.args)
+
+
+class Tracer:
+    """Collects spans per thread, counters and memory samples while a run is traced"""
+
+    def __init__(self, sample_interval: float = SAMPLE_INTERVAL):
+        self.origin = time.perf_counter()
+        self.end = None
+        # name -> [count, seconds, longest]
+        self.totals = {}
+        self.counters = {}
+        # (name, category, thread, start, duration, args) for the Chrome trace
+        self.events = []
+        self.dropped = 0
+        # (time, rss, counters) sampled every sample_interval seconds
+        self.samples = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        if sample_interval:
+            self._sampler = threading.Thread(target=self._sample, args=(sample_interval,), name="trace", daemon=True)
+            self._sampler.start()
+
+    def _sample(self, interval: float):
+        while not self._stop.wait(interval):
+            rss = current_rss()
+            with self._lock:
+                self.samples.append((time.perf_counter(), rss, dict(self.counters)))
+
+    def add_span(self, name: str, category: str, start: float, end: float, thread: str, args: dict = None):
+        """Record a finished span, start and end being time.perf_counter() values"""
+        duration = end - start
+        with self._lock:
+            total = self.totals.get(name)
+            if total is None:
+                total = self.totals[name] = [0, 0.0, 0.0]
+            total[0] += 1
+            total[1] += duration
+            total[2] = max(total[2], duration)
+            if len(self.events) < MAX_EVENTS:
+                self.events.append((name, category, thread, start, duration, args))
+            else:
+                self.dropped += 1
+
+    def add(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def stop(self):
+        """Stop sampling, the exports cover the time up to here"""
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.end = time.perf_counter()
+
+    def summary(self) -> dict:
+        """Wall time, seconds per span name, counters and peak memory"""
+        end = self.end or time.perf_counter()
+        rss, children_rss = peak_rss()
+        with self._lock:
+            spans = {name: {"count": count, "seconds": round(seconds, 6), "longest": round(longest, 6)}
+                     for name, (count, seconds, longest) in sorted(self.totals.items(), key=lambda item: -item[1][1])}
+            counters = dict(sorted(self.counters.items()))
+            # Busy time per thread, to see how well the workers were used
+            threads = {}
+            for _, category, thread, _, duration, _ in self.events:
+                if category == "file":
+                    threads[thread] = threads.get(thread, 0.0) + duration
+        return {
+            "wall_seconds": round(end - self.origin, 6),
+            "spans": spans,
+            "counters": counters,
+            "worker_busy_seconds": {thread: round(seconds, 6) for thread, seconds in sorted(threads.items())},
+            "peak_rss_bytes": rss,
+            "peak_rss_children_bytes": children_rss,
+            "dropped_events": self.dropped,
+        }
+
+    def chrome_trace(self) -> dict:
+        """Trace Event Format document: complete events per thread plus counter tracks"""
+        pid = os.getpid()
+        tids = {}
+        events = []
+
+        def micros(t: float) -> float:
+            return round((t - self.origin) * 1e6, 3)
+
+        with self._lock:
+            for name, category, thread, start, duration, args in self.events:
+                tid = tids.setdefault(thread, len(tids) + 1)
+                event = {"name": name, "cat": category, "ph": "X", "pid": pid, "tid": tid,
+                         "ts": micros(start), "dur": round(duration * 1e6, 3)}
+                if args:
+                    event["args"] = args
+                events.append(event)
+            for t, rss, counters in self.samples:
+                events.append({"name": "rss", "ph": "C", "pid": pid, "ts": micros(t), "args": {"MB": rss / (1024*1024)}})
+                for name, value in counters.items():
+                    events.append({"name": name, "ph": "C", "pid": pid, "ts": micros(t), "args": {"value": value}})
+        for thread, tid in tids.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_summary(self, path: str):
+        with open(path, "w", encoding="utf-8") as fo:
+            json.dump(self.summary(), fo, indent=2)
+
+    def write_chrome_trace(self, path: str):
+        with open(path, "w", encoding="utf-8") as fo:
+            json.dump(self.chrome_trace(), fo)
+
+    def report(self, limit: int = 15) -> list:
+        """The longest spans, the counters and peak memory as log lines"""
+        summary = self.summary()
+        lines = [f"Trace: {summary['wall_seconds']:.2f}s wall, peak RSS {summary['peak_rss_bytes'] / (1024*1024):.0f}MB "
+                 f"(children {summary['peak_rss_children_bytes'] / (1024*1024):.0f}MB)"]
+        for name, total in list(summary["spans"].items())[:limit]:
+            lines.append(f"  {name:<28}{total['count']:>8}x{total['seconds']:>10.3f}s  longest {total['longest']:.3f}s")
+        for name, value in summary["counters"].items():
+            lines.append(f"  {name:<28}{value:>18}")
+        return lines
+
+
+class Profiler:
+    """cProfile on the calling thread and on every thread started while it runs
+
+    Worker processes are not profiled, the time they take shows up as waiting.
+    """
+
+    def __init__(self):
+        import cProfile
+        self._profile_class = cProfile.Profile
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._main = cProfile.Profile()
+
+    def _start_thread(self, frame, event, arg):
+        # Called on the first profiling event of a new thread, the Profile then replaces this hook
+        profile = self._profile_class()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        threading.setprofile(self._start_thread)
+        self._main.enable()
+
+    def stop(self, path: str):
+        """Stop profiling and write the merged statistics of all threads to path, for pstats or snakeviz"""
+        import pstats
+        self._main.disable()
+        threading.setprofile(None)
+        stats = pstats.Stats(self._main)
+        with self._lock:
+            for profile in self._profiles:
+                # create_stats() disables the profiler on the calling thread only, that is harmless here
+                stats.add(profile)
+        stats.dump_stats(path)
+        return stats
+
+
+def start(sample_interval: float = SAMPLE_INTERVAL) -> Tracer:
+    """Install a new Tracer that span() and count() record into"""
+    global _tracer
+    _tracer = Tracer(sample_interval)
+    return _tracer
+
+
+def stop() -> Tracer:
+    """Stop recording and return the Tracer, None if none was started"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.stop()
+    return tracer
+
+
+def span(name: str, category: str = "stage", **args):
+    """Context that times the enclosed block as a span on the current thread"""
+    if _tracer is None:
+        return _NO_SPAN
+    return _Span(_tracer, name, category, args)
+
+
+def add_span(name: str, category: str, start: float, end: float, thread: str):
+    """Record a span timed elsewhere, e.g. by a worker process"""
+    if _tracer is not None:
+        _tracer.add_span(name, category, start, end, thread)
+
+
+def count(name: str, amount: int = 1):
+    """Add amount to a counter"""
+    if _tracer is not None:
+        _tracer.add(name, amount)
+
+
+def active() -> bool:
+    return _tracer is not None
@@ -0,0 +1,238 @@
+"""Verify finished packages by streaming their tar once, without extracting it
+
+Every regular member is hashed as it passes. mets.xml and premis.xml are
+parsed while they pass, and each member is checked against their checksums
+and sizes. Members that come before the metadata wait in memory until the
+metadata has been read. The whole tar is hashed in the same pass and checked
+against info.xml.
+"""
+import os
+import time
+import tarfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from etp.archive import DigestReader
+from etp.compression import format_of, open_decompressor
+
+CHUNK_SIZE = 1024 * 1024
+# Problems kept per package, the rest are only counted
+MAX_PROBLEMS = 100
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+SOURCES = ("mets.xml", "premis.xml")
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def read_info(info_path: str) -> tuple:
+    """Tar file name, SHA-256 and size recorded in info.xml"""
+    for elem in ET.parse(info_path).iter():
+        if local_name(elem.tag) == "file":
+            for child in elem:
+                if local_name(child.tag) == "FLocat":
+                    return child.get(XLINK_HREF).removeprefix("file:"), elem.get("CHECKSUM"), int(elem.get("SIZE"))
+    raise ValueError(f"No file entry in {info_path}")
+
+
+def mets_entries(fo, prefix: str) -> dict:
+    """member name -> (checksum, size) of every file and mdRef in a mets.xml stream"""
+    entries = {}
+    for _, elem in ET.iterparse(fo):
+        tag = local_name(elem.tag)
+        if tag == "file":
+            href = next((child.get(XLINK_HREF) for child in elem if local_name(child.tag) == "FLocat"), None)
+        elif tag == "mdRef":
+            href = elem.get(XLINK_HREF)
+        else:
+            continue
+        if href and elem.get("CHECKSUM"):
+            entries[prefix + href.removeprefix("file:")] = (elem.get("CHECKSUM").lower(), int(elem.get("SIZE", -1)))
+        elem.clear()
+    return entries
+
+
+def premis_entries(fo) -> dict:
+    """member name -> (checksum, size) of every object with fixity in a premis.xml stream"""
+    entries = {}
+    for _, elem in ET.iterparse(fo):
+        if local_name(elem.tag) != "object":
+            continue
+        values = {local_name(child.tag): child.text for child in elem.iter()}
+        if values.get("messageDigest"):
+            entries[values["objectIdentifierValue"]] = (values["messageDigest"].strip().lower(), int(values.get("size") or -1))
+        elem.clear()
+    return entries
+
+
+class PackageCheck:
+    """Compare hashed tar members with the entries of mets.xml and premis.xml"""
+
+    def __init__(self, sip_id: str):
+        self.prefix = f"{sip_id}/"
+        self.sources = {}
+        # member name -> (checksum, size) of members hashed before all sources were read
+        self.pending = {}
+        # member name -> (checksum, size) of members a hard link may point to
+        self.targets = {}
+        # Checksums listed more than once in mets.xml, None until it is read
+        self.shared = None
+        self.problems = []
+        self.problem_count = 0
+
+    def problem(self, message: str):
+        self.problem_count += 1
+        if len(self.problems) < MAX_PROBLEMS:
+            self.problems.append(message)
+
+    def add_source(self, source: str, entries: dict):
+        self.sources[source] = entries
+        if source == "mets.xml":
+            seen = set()
+            self.shared = set()
+            for checksum, _ in entries.values():
+                (self.shared if checksum in seen else seen).add(checksum)
+        for name, (checksum, size) in self.pending.items():
+            self._compare(source, name, checksum, size)
+        if len(self.sources) == len(SOURCES):
+            self.pending.clear()
+
+    def check(self, name: str, checksum: str, size: int):
+        if self.shared is None or checksum in self.shared:
+            self.targets[name] = (checksum, size)
+        for source in self.sources:
+            self._compare(source, name, checksum, size)
+        if len(self.sources) < len(SOURCES):
+            self.pending[name] = (checksum, size)
+
+    def check_link(self, name: str, linkname: str):
+        """Check a hard link member against the member it points to"""
+        target = self.targets.get(linkname)
+        if target is None:
+            self.problem(f"{name}: hard link to unknown member {linkname}")
+        else:
+            self.check(name, *target)
+
+    def _compare(self, source: str, name: str, checksum: str, size: int):
+        expected = self.sources[source].pop(name, None)
+        if expected is None:
+            if source == "mets.xml" and name != self.prefix + "mets.xml":
+                self.problem(f"{name}: not listed in mets.xml")
+        elif expected[0] != checksum:
+            self.problem(f"{name}: checksum {checksum} does not match {expected[0]} in {source}")
+        elif expected[1] >= 0 and expected[1] != size:
+            self.problem(f"{name}: size {size} does not match {expected[1]} in {source}")
+
+    def finish(self):
+        """Report sources that never appeared and entries without a member"""
+        for source in SOURCES:
+            if source not in self.sources:
+                self.problem(f"{source} not found in the tar")
+        for source, entries in self.sources.items():
+            for name in entries:
+                self.problem(f"{name}: listed in {source} but missing from the tar")
+
+
+def drain(fo, chunk_size: int) -> int:
+    size = 0
+    while True:
+        data = fo.read(chunk_size)
+        if not data:
+            return size
+        size += len(data)
+
+
+def verify_package(aic_folder: str, chunk_size: int = CHUNK_SIZE) -> dict:
+    """Verify one AIC folder and return a report with status "ok" or "failed" and the problems found"""
+    start = time.monotonic()
+    report = {"package": aic_folder, "status": "failed", "files": 0, "bytes": 0, "problems": []}
+    try:
+        tar_name, info_checksum, info_size = read_info(os.path.join(aic_folder, "info.xml"))
+        sip_id = tar_name.split(".", 1)[0]
+        tar_path = os.path.join(aic_folder, sip_id, "content", tar_name)
+        check = PackageCheck(sip_id)
+        metadata = {check.prefix + "mets.xml": "mets.xml", check.prefix + "administrative_metadata/premis.xml": "premis.xml"}
+
+        with open(tar_path, "rb") as f:
+            # The checksum in info.xml is the one of the file, compressed or not
+            whole = DigestReader(f)
+            stream = open_decompressor(whole, format_of(tar_name))
+            with tarfile.open(fileobj=stream, mode="r|", bufsize=chunk_size) as tar:
+                for member in tar:
+                    if member.islnk():
+                        check.check_link(member.name, member.linkname)
+                        report["files"] += 1
+                        continue
+                    if not member.isfile():
+                        continue
+                    reader = DigestReader(tar.extractfile(member))
+                    source = metadata.get(member.name)
+                    if source == "mets.xml":
+                        check.add_source(source, mets_entries(reader, check.prefix))
+                    elif source == "premis.xml":
+                        check.add_source(source, premis_entries(reader))
+                    drain(reader, chunk_size)
+                    check.check(member.name, reader.hexdigest(), member.size)
+                    report["files"] += 1
+                    report["bytes"] += member.size
+            # tarfile stops at the end-of-archive blocks, the padding after them is part of the checksum
+            drain(stream, chunk_size)
+            if stream is not whole:
+                stream.close()
+                drain(whole, chunk_size)
+            tar_size = f.tell()
+
+        check.finish()
+        if whole.hexdigest() != info_checksum.lower():
+            check.problem(f"{tar_name}: checksum {whole.hexdigest()} does not match {info_checksum} in info.xml")
+        if tar_size != info_size:
+            check.problem(f"{tar_name}: size {tar_size} does not match {info_size} in info.xml")
+        report["problems"] = check.problems
+        if check.problem_count > len(check.problems):
+            report["problems"].append(f"... and {check.problem_count - len(check.problems)} more")
+        report["status"] = "failed" if check.problem_count else "ok"
+    except (OSError, ValueError, tarfile.TarError, ET.ParseError) as e:
+        report["problems"].append(f"{type(e).__name__}: {e}")
+    report["duration"] = time.monotonic() - start
+    return report
+
+
+def find_packages(paths: list) -> list:
+    """AIC folders among paths, a path without info.xml is searched one level down"""
+    packages = []
+    for path in paths:
+        if os.path.isfile(os.path.join(path, "info.xml")):
+            packages.append(path)
+        elif os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.isfile(os.path.join(path, name, "info.xml")):
+                    packages.append(os.path.join(path, name))
+    return packages
+
+
+def verify_packages(packages: list, jobs: int = 4, use_processes: bool = False):
+    """Verify packages in parallel, yielding each report as soon as it is done
+
+    Threads overlap the reads of different packages. Processes also spread the
+    tar parsing over CPU cores, which pays off for tars of many small files.
+    """
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max(1, min(jobs, len(packages) or 1))) as executor:
+        futures = [executor.submit(verify_package, package) for package in packages]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def format_report(reports: list) -> list:
+    """Summary table lines followed by the problems of failed packages"""
+    lines = [f"{'package':<50}{'status':>8}{'files':>10}{'MB':>12}{'seconds':>10}{'MB/s':>10}"]
+    for report in reports:
+        mb = report["bytes"] / (1024*1024)
+        rate = mb / report["duration"] if report["duration"] else 0.0
+        lines.append(f"{report['package']:<50}{report['status']:>8}{report['files']:>10}{mb:>12.1f}"
+                     f"{report['duration']:>10.1f}{rate:>10.1f}")
+    for report in reports:
+        for problem in report["problems"]:
+            lines.append(f"{report['package']}: {problem}")
+    return lines
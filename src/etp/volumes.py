@@ -0,0 +1,252 @@
+"""Split a deposit into size-capped SIP volumes that are packed in parallel
+
+The content is cut at directory boundaries where possible: a directory that
+fits into one volume is never split, a larger one is split between its files
+and subdirectories. Every volume is a complete package with its own
+mets.xml, premis.xml, info.xml and AIC folder. The volumes are created in a
+parent folder whose volumes.xml ties them together.
+"""
+import os
+import json
+import shutil
+import threading
+import dataclasses
+from uuid import UUID, uuid1
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+
+from etp import trace
+from etp.log import log, set_context, current_context
+from etp.job import Job
+from etp.journal import Journal, content_state, find_unfinished, job_key, sync_path
+from etp.scan import scan_tree
+from etp.scheduler import StageScheduler, UNLIMITED
+from etp.progress import Progress
+from etp.metadata import attr, text
+from etp.verify import read_info
+from etp.compression import FORMATS
+
+MANIFEST_FILE = "volumes.xml"
+
+
+class _Node:
+    """A directory of the content: its files, subdirectories and total size"""
+    __slots__ = ("files", "dirs", "size")
+
+    def __init__(self):
+        self.files = []
+        self.dirs = []
+        self.size = 0
+
+
+def content_tree(content_path: str) -> _Node:
+    """Directory tree of ScanEntries with subtree sizes, in scan_tree order"""
+    root = _Node()
+    nodes = {"": root}
+    for entry in scan_tree(content_path):
+        parent, _, _ = entry.relpath.rpartition("/")
+        node = nodes.get(parent)
+        if node is None:
+            # scan_tree yields a directory's files before any deeper entries, so create the chain here
+            node = root
+            path = ""
+            for name in parent.split("/"):
+                path = f"{path}/{name}" if path else name
+                child = nodes.get(path)
+                if child is None:
+                    child = nodes[path] = _Node()
+                    node.dirs.append(child)
+                node = child
+        node.files.append(entry)
+    # Sizes bottom up, children were always created after their parents
+    for node in reversed(list(nodes.values())):
+        node.size = sum(entry.size for entry in node.files) + sum(child.size for child in node.dirs)
+    return root
+
+
+def _entries(node: _Node):
+    yield from node.files
+    for child in node.dirs:
+        yield from _entries(child)
+
+
+def plan_volumes(content_path: str, max_bytes: int) -> list:
+    """Lists of ScanEntries in tree order, each adding up to at most max_bytes
+
+    A single file larger than max_bytes gets a volume of its own.
+    """
+    volumes = [[]]
+    sizes = [0]
+
+    def place(entries: list, size: int):
+        if sizes[-1] and sizes[-1] + size > max_bytes:
+            volumes.append([])
+            sizes.append(0)
+        volumes[-1].extend(entries)
+        sizes[-1] += size
+
+    def visit(node: _Node):
+        if node.size <= max_bytes:
+            place(list(_entries(node)), node.size)
+            return
+        for entry in node.files:
+            place([entry], entry.size)
+        for child in node.dirs:
+            visit(child)
+
+    visit(content_tree(content_path))
+    return [volume for volume in volumes if volume]
+
+
+def write_manifest(path: str, parent_id: str, job: Job, volumes: list):
+    """Write volumes.xml, listing the archive of every volume with its checksum in volume order"""
+    folder = os.path.dirname(path)
+    files = []
+    divs = []
+    for number, result in enumerate(volumes, 1):
+        tar_name, checksum, size = read_info(os.path.join(result["aic_folder"], "info.xml"))
+        href = os.path.relpath(result["tar_path"], folder)
+        file_id = f"IDvolume{number:04d}"
+        files.append(f'            <mets:file MIMETYPE="{FORMATS[job.output_format].mime}" CHECKSUMTYPE="SHA-256" '
+                     f'CHECKSUM="{checksum}" USE="Datafile" ID="{file_id}" SIZE="{size}">\n'
+                     f'                <mets:FLocat xlink:href="file:{attr(href)}" LOCTYPE="URL" xlink:type="simple"/>\n'
+                     f'            </mets:file>\n')
+        divs.append(f'            <mets:div ORDER="{number}" LABEL="Volume {number} of {len(volumes)}" '
+                    f'CONTENTIDS="UUID:{result["sip_id"]}">\n'
+                    f'                <mets:fptr FILEID="{file_id}"/>\n'
+                    f'            </mets:div>\n')
+    with open(path, "w", encoding="utf-8") as fo:
+        fo.write(f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                 f'<mets:mets xmlns:mets="http://www.loc.gov/METS/" xmlns:xlink="http://www.w3.org/1999/xlink" '
+                 f'LABEL="{attr(job.fields["label"])}" TYPE="AIC" OBJID="UUID:{parent_id}">\n'
+                 f'    <mets:metsHdr CREATEDATE="{datetime.now().strftime("%Y-%m-%dT%H:%M:%S+02:00")}" RECORDSTATUS="NEW">\n'
+                 f'        <mets:agent TYPE="ORGANIZATION" ROLE="ARCHIVIST">\n'
+                 f'            <mets:name>{text(job.fields["archivist_org"])}</mets:name>\n'
+                 f'        </mets:agent>\n'
+                 f'        <mets:metsDocumentID>{MANIFEST_FILE}</mets:metsDocumentID>\n'
+                 f'    </mets:metsHdr>\n'
+                 f'    <mets:fileSec>\n'
+                 f'        <mets:fileGrp ID="fgrp001" USE="VOLUMES">\n'
+                 f'{"".join(files)}'
+                 f'        </mets:fileGrp>\n'
+                 f'    </mets:fileSec>\n'
+                 f'    <mets:structMap>\n'
+                 f'        <mets:div LABEL="Package">\n'
+                 f'{"".join(divs)}'
+                 f'        </mets:div>\n'
+                 f'    </mets:structMap>\n'
+                 f'</mets:mets>\n')
+
+
+def merge_indexes(path: str, parent_id: str, parts: list):
+    """Join the record indexes of the volumes into one index of the whole deposit"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", buffering=1024 * 1024) as fo:
+        header = None
+        for part in parts:
+            with open(part, encoding="utf-8") as f:
+                first = json.loads(f.readline())
+                if header is None:
+                    header = dict(first, package=f"UUID:{parent_id}")
+                    fo.write(json.dumps(header) + "\n")
+                for line in f:
+                    fo.write(line)
+            os.remove(part)
+    os.replace(tmp_path, path)
+
+
+def build_volumes(job: Job, scheduler: StageScheduler = UNLIMITED, running: dict = None) -> dict:
+    """Package the content as volumes of at most job.volume_size bytes, job.volume_jobs at a time
+
+    running, if given, holds a Progress per volume name while it is being
+    packed. Single dict operations are atomic, so it may be shared with a
+    thread that copies it for a progress ticker.
+    Finished volumes are recorded in a journal in the parent folder; with
+    job.resume a run of the same job continues in that folder, skips the
+    finished volumes and resumes the unfinished ones. The plan is only kept
+    while the content looks unchanged, see content_state.
+    Returns the parent folder, the result of every volume and the totals.
+    """
+    from etp.pipeline import build_package
+
+    key = job_key(job)
+    state = content_state(job.content_path)
+    journal = find_unfinished(job.output_root, key) if job.resume else None
+    if journal is not None and journal.begin.get("content") != state:
+        # Another plan may cut the content differently, none of the volumes can be kept
+        log(f"Content changed since the volumes in {journal.folder} were planned, starting over")
+        shutil.rmtree(journal.folder)
+        journal = None
+
+    log(f"Planning volumes of at most {job.volume_size / (1024*1024):.0f}MB...")
+    volumes = plan_volumes(job.content_path, job.volume_size)
+    if journal is not None:
+        parent_id = UUID(journal.begin["parent_id"])
+        parent_folder = journal.folder
+        log(f"Resuming {parent_folder}, {sum(stage.startswith('volume ') for stage in journal.stages)} volumes finished")
+    else:
+        parent_id = uuid1()
+        parent_folder = os.path.join(job.output_root, str(parent_id))
+        os.makedirs(parent_folder)
+        journal = Journal.create(parent_folder, key, parent_id=str(parent_id), content=state)
+    for number, entries in enumerate(volumes, 1):
+        size = sum(entry.size for entry in entries)
+        log(f"  Volume {number}: {len(entries)} files, {size / (1024*1024):.1f}MB")
+    log(f"  ✓ {len(volumes)} volumes in {parent_folder}")
+
+    context = current_context()
+    results = [None] * len(volumes)
+    for number in range(1, len(volumes) + 1):
+        finished = journal.stages.get(f"volume {number}")
+        if finished is not None:
+            results[number - 1] = {name: value for name, value in finished.items() if name != "stage"}
+    journal_lock = threading.Lock()
+
+    def pack(number: int, entries: list):
+        name = f"volume {number}"
+        set_context(f"{context}/{name}" if context else name)
+        volume_job = dataclasses.replace(
+            job, output_root=parent_folder, volume_size=0, name=f"{job.name} {name}".strip(),
+            index_path=f"{job.index_path}.{number}" if job.index_path else "",
+        )
+        progress = Progress()
+        if running is not None:
+            running[volume_job.name] = progress
+        try:
+            with trace.span("volume", volume=number):
+                results[number - 1] = build_package(
+                    volume_job, scheduler, progress, entries,
+                    (("VOLUME", f"{number}/{len(volumes)}"), ("PARENT", f"UUID:{parent_id}")),
+                )
+            with journal_lock:
+                journal.record(f"volume {number}", **results[number - 1])
+        finally:
+            set_context(context)
+            if running is not None:
+                running.pop(volume_job.name, None)
+
+    with ThreadPoolExecutor(max(1, job.volume_jobs)) as executor:
+        futures = [executor.submit(pack, number, entries) for number, entries in enumerate(volumes, 1)
+                   if results[number - 1] is None]
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = [future for future in done if future.exception() is not None]
+        if failed:
+            for future in futures:
+                future.cancel()
+            raise failed[0].exception()
+
+    write_manifest(os.path.join(parent_folder, MANIFEST_FILE), str(parent_id), job, results)
+    sync_path(os.path.join(parent_folder, MANIFEST_FILE))
+    if job.index_path and not journal.done("index"):
+        merge_indexes(job.index_path, str(parent_id), [f"{job.index_path}.{number}" for number in range(1, len(volumes) + 1)])
+        sync_path(job.index_path)
+        journal.record("index")
+    journal.remove()
+    log(f"✓ {len(volumes)} volumes packaged, manifest: {os.path.join(parent_folder, MANIFEST_FILE)}")
+    return {
+        "aic_id": str(parent_id),
+        "aic_folder": parent_folder,
+        "volumes": results,
+        "content_files": sum(result["content_files"] for result in results),
+        "content_bytes": sum(result["content_bytes"] for result in results),
+    }
@@ -0,0 +1,40 @@
+"""Shared fixtures: a small deposit, the form fields and a job builder"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from etp.job import Job, FIELDS
+
+
+@pytest.fixture
+def fields() -> dict:
+    return {name: f"Test {name}" for name in FIELDS}
+
+
+@pytest.fixture
+def deposit(tmp_path) -> str:
+    """Content folder with a subfolder, an empty file, two copies of one file and a hard link to another"""
+    root = tmp_path / "deposit"
+    (root / "docs" / "sub").mkdir(parents=True)
+    (root / "readme.txt").write_text("Arkivuttrekk for test\n", encoding="utf-8")
+    (root / "docs" / "report.csv").write_text("id;name\n" + "".join(f"{i};rad {i}\n" for i in range(2000)), encoding="utf-8")
+    (root / "docs" / "sub" / "data.bin").write_bytes(os.urandom(200000))
+    (root / "docs" / "sub" / "copy.bin").write_bytes((root / "docs" / "sub" / "data.bin").read_bytes())
+    (root / "empty.txt").write_bytes(b"")
+    os.link(root / "readme.txt", root / "docs" / "readme-link.txt")
+    return str(root)
+
+
+@pytest.fixture
+def make_job(tmp_path, deposit, fields):
+    """Build a Job for the deposit with output in tmp_path/out, keyword arguments override its settings"""
+    def make(**settings) -> Job:
+        settings.setdefault("content_path", deposit)
+        settings.setdefault("fields", dict(fields))
+        settings.setdefault("output_root", str(tmp_path / "out"))
+        settings.setdefault("workers", 2)
+        return Job(**settings)
+    return make
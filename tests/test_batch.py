@@ -0,0 +1,38 @@
+import os
+
+from etp.batch import BatchRunner
+from etp.verify import verify_package
+
+
+def test_jobs_are_packaged_and_skipped_when_run_again(tmp_path, make_job):
+    jobs = [make_job(name="first"), make_job(name="second")]
+    state_path = str(tmp_path / "state.json")
+    report = BatchRunner(jobs, max_jobs=2, state_path=state_path).run()
+
+    assert [entry["status"] for entry in report.values()] == ["done", "done"]
+    for entry in report.values():
+        assert verify_package(entry["aic_folder"])["status"] == "ok"
+
+    again = BatchRunner(jobs, state_path=state_path).run()
+    assert all(entry["skipped"] for entry in again.values())
+
+
+def test_failed_job_creates_missing_output_root(tmp_path, make_job):
+    output_root = tmp_path / "missing" / "out"
+    job = make_job(name="broken", content_path=str(tmp_path / "no such folder"), output_root=str(output_root))
+    report = BatchRunner([job], state_path=str(tmp_path / "state.json")).run()
+
+    assert report["broken"]["status"] == "failed"
+    assert os.path.exists(output_root / "error_log_broken.txt")
+
+
+def test_failed_job_with_unusable_output_root(tmp_path, make_job, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "file").write_text("not a folder")
+    good = make_job(name="good")
+    broken = make_job(name="broken", output_root=str(tmp_path / "file" / "out"))
+    report = BatchRunner([broken, good], max_jobs=1, state_path=str(tmp_path / "state.json")).run()
+
+    assert report["broken"]["status"] == "failed"
+    assert report["good"]["status"] == "done"
+    assert os.path.exists(tmp_path / "error_log_broken.txt")
@@ -0,0 +1,62 @@
+import os
+import hashlib
+
+import pytest
+
+from etp import reader
+from etp.cache import CACHE_FILE, ChecksumCache
+from etp.pipeline import build_package
+from etp.scan import scan_tree
+from etp.verify import verify_package
+
+
+@pytest.fixture
+def content_reads(monkeypatch, deposit) -> list:
+    """Relative paths of the content files hashed from now on"""
+    reads = []
+    hash_file = reader.hash_file
+
+    def counting_hash_file(path, *args, **kwargs):
+        if path.startswith(deposit + os.sep):
+            reads.append(os.path.relpath(path, deposit).replace(os.sep, "/"))
+        return hash_file(path, *args, **kwargs)
+    monkeypatch.setattr(reader, "hash_file", counting_hash_file)
+    return reads
+
+
+def build_and_verify(job) -> dict:
+    result = build_package(job)
+    report = verify_package(result["aic_folder"])
+    assert report["status"] == "ok", report["problems"]
+    return result
+
+
+def test_second_build_reads_no_content(make_job, deposit, content_reads):
+    build_and_verify(make_job(single_pass=False))
+    assert sorted(content_reads) == sorted(entry.relpath for entry in scan_tree(deposit))
+
+    content_reads.clear()
+    build_and_verify(make_job(single_pass=False))
+    assert content_reads == []
+
+
+def test_changed_size_or_mtime_is_hashed_again(make_job, deposit, content_reads):
+    build_and_verify(make_job(single_pass=False))
+    content_reads.clear()
+
+    report = os.path.join(deposit, "docs", "report.csv")
+    with open(report, "a", encoding="utf-8") as fo:
+        fo.write("2000;rad 2000\n")
+    readme = os.path.join(deposit, "readme.txt")
+    stat = os.stat(readme)
+    os.utime(readme, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    job = make_job(single_pass=False)
+    build_and_verify(job)
+    # The hard link shares the touched inode
+    assert sorted(content_reads) == ["docs/readme-link.txt", "docs/report.csv", "readme.txt"]
+    with open(report, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    with ChecksumCache(os.path.join(job.output_root, CACHE_FILE)) as cache:
+        entry = next(entry for entry in scan_tree(deposit) if entry.relpath == "docs/report.csv")
+        assert cache.lookup(entry)[0] == digest
@@ -0,0 +1,71 @@
+import io
+import os
+import shutil
+import tarfile
+
+import pytest
+
+from etp.archive import SipArchiveWriter
+from etp.compression import PipeCompressor, open_decompressor
+
+
+class FailingSink:
+    """Sink whose disk is full"""
+    location = "full disk"
+
+    def __init__(self):
+        self.aborted = False
+
+    def write(self, data) -> int:
+        raise OSError("No space left on device")
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def abort(self):
+        self.aborted = True
+
+
+def test_pipe_compressor_round_trip():
+    out = io.BytesIO()
+    data = os.urandom(3 * 1024 * 1024)
+    compressor = PipeCompressor(out, ["cat"])
+    compressor.write(data)
+    compressor.close()
+    assert out.getvalue() == data
+    assert compressor.tell() == len(data)
+
+
+def test_pipe_compressor_raises_the_copy_error():
+    compressor = PipeCompressor(FailingSink(), ["cat"])
+    with pytest.raises(OSError, match="No space left"):
+        for _ in range(64):
+            compressor.write(bytes(1024 * 1024))
+    with pytest.raises(OSError, match="No space left"):
+        compressor.close()
+
+
+@pytest.mark.skipif(shutil.which("zstd") is None, reason="needs the zstd program")
+def test_zst_archive_round_trip(tmp_path, deposit):
+    path = str(tmp_path / "sip.tar.zst")
+    with SipArchiveWriter(path, output_format="tar.zst") as archive:
+        archive.add_tree(deposit, "sip")
+    with open(path, "rb") as f, tarfile.open(fileobj=open_decompressor(f, "tar.zst"), mode="r|") as tar:
+        names = [member.name for member in tar]
+    assert "sip/docs/sub/data.bin" in names
+    assert not os.path.exists(path + ".partial")
+
+
+@pytest.mark.skipif(shutil.which("zstd") is None, reason="needs the zstd program")
+def test_abort_keeps_the_original_error(tmp_path, deposit):
+    sink = FailingSink()
+    # zstd writes nothing for a small input until its stdin is closed, so closing
+    # the compressor in abort() is the first write to fail
+    with pytest.raises(ValueError, match="content changed"):
+        with SipArchiveWriter(str(tmp_path / "sip.tar.zst"), output_format="tar.zst", sink=sink) as archive:
+            archive.add_file(os.path.join(deposit, "readme.txt"), "sip/readme.txt")
+            raise ValueError("content changed")
+    assert sink.aborted
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tarfile
+
+import pytest
+
+from etp.job import JobError
+from etp.dedup import find_duplicates
+from etp.records import RecordStore
+from etp.pipeline import build_package
+from etp.verify import verify_package
+
+PREFIX = "sip/content/"
+
+
+def digest(value: int) -> bytes:
+    return bytes([value]) * 32
+
+
+def test_groups_need_the_same_size_and_checksum():
+    with RecordStore() as store:
+        store.add(PREFIX + "a", digest(1), "text/plain", 100, 0)
+        store.add(PREFIX + "b/a", digest(1), "text/plain", 100, 0)
+        store.add(PREFIX + "c", digest(1), "text/plain", 100, 0)
+        # Same size, other bytes
+        store.add(PREFIX + "d", digest(2), "text/plain", 100, 0)
+        store.add(PREFIX + "big1", digest(3), "text/plain", 5000, 0)
+        store.add(PREFIX + "big2", digest(3), "text/plain", 5000, 0)
+        store.add(PREFIX + "empty1", digest(4), "text/plain", 0, 0)
+        store.add(PREFIX + "empty2", digest(4), "text/plain", 0, 0)
+        # Outside the content, e.g. the schemas
+        store.add("sip/mets.xsd", digest(3), "text/xml", 5000, 0)
+        duplicates = find_duplicates(store, PREFIX)
+
+    assert sorted(duplicates.links) == [PREFIX + name for name in ("a", "b/a", "big1", "big2", "c")]
+    assert duplicates.files == 3
+    assert duplicates.saved_bytes == 2 * 100 + 5000
+    assert duplicates.report() == ["2 copies of big1 (0.00MB each, 0.0MB saved)",
+                                   "3 copies of a (0.00MB each, 0.0MB saved)"]
+    assert duplicates.report(1) == duplicates.report()[:1]
+
+
+def test_dedup_package_stores_copies_once(tmp_path, make_job, deposit):
+    for folder in ("x", "y/z"):
+        os.makedirs(os.path.join(deposit, folder))
+        shutil.copy2(os.path.join(deposit, "docs", "report.csv"), os.path.join(deposit, folder, "report.csv"))
+    open(os.path.join(deposit, "y", "empty.txt"), "wb").close()
+
+    plain = build_package(make_job(single_pass=False))
+    result = build_package(make_job(dedup=True))
+    report = verify_package(result["aic_folder"])
+    assert report["status"] == "ok", report["problems"]
+
+    sip = result["sip_id"]
+    with tarfile.open(result["tar_path"]) as tar:
+        links = {member.name[len(f"{sip}/content/"):]: member.linkname for member in tar if member.islnk()}
+        extract = tmp_path / "extract"
+        tar.extractall(extract, filter="tar")
+    assert links == {
+        "docs/readme-link.txt": f"{sip}/content/readme.txt",
+        "docs/sub/data.bin": f"{sip}/content/docs/sub/copy.bin",
+        "x/report.csv": f"{sip}/content/docs/report.csv",
+        "y/z/report.csv": f"{sip}/content/docs/report.csv",
+    }
+    report_size = os.path.getsize(os.path.join(deposit, "docs", "report.csv"))
+    readme_size = os.path.getsize(os.path.join(deposit, "readme.txt"))
+    assert result["saved_bytes"] == 200000 + 2 * report_size + readme_size
+    assert os.path.getsize(plain["tar_path"]) - os.path.getsize(result["tar_path"]) >= result["saved_bytes"] - 2048
+
+    # Extracting restores every copy, empty files stay ordinary members
+    for root, _, names in os.walk(deposit):
+        for name in names:
+            path = os.path.join(root, name)
+            copy = extract / sip / "content" / os.path.relpath(path, deposit)
+            assert copy.read_bytes() == open(path, "rb").read()
+
+
+def test_dedup_cannot_be_combined(tmp_path, make_job):
+    baseline = tmp_path / "previous.jsonl"
+    baseline.write_text("{}\n")
+    with pytest.raises(JobError, match="Dedup"):
+        make_job(dedup=True, baseline=str(baseline)).validate()
+    with pytest.raises(JobError, match="Dedup"):
+        make_job(dedup=True, volume_size=1024 * 1024).validate()
@@ -0,0 +1,90 @@
+import os
+import tarfile
+
+import pytest
+
+from etp.job import JobError
+from etp.delta import load_baseline, compare, REMOVED_FILE
+from etp.pipeline import build_package
+from etp.verify import verify_package
+
+
+def content_members(tar_path: str, sip_id: str) -> dict:
+    prefix = f"{sip_id}/content/"
+    with tarfile.open(tar_path) as tar:
+        return {member.name[len(prefix):]: tar.extractfile(member).read()
+                for member in tar if member.isfile() and member.name.startswith(prefix)}
+
+
+def read_member(tar_path: str, name: str) -> bytes:
+    with tarfile.open(tar_path) as tar:
+        return tar.extractfile(name).read()
+
+
+def change_deposit(deposit: str):
+    """One new, three changed, one touched and one removed file"""
+    with open(os.path.join(deposit, "new.txt"), "w", encoding="utf-8") as fo:
+        fo.write("ny fil\n")
+    with open(os.path.join(deposit, "readme.txt"), "a", encoding="utf-8") as fo:
+        fo.write("endret\n")
+    # Same size, other bytes, newer timestamp
+    data_path = os.path.join(deposit, "docs", "sub", "data.bin")
+    with open(data_path, "r+b") as fo:
+        fo.write(b"\0" * 16)
+    stat = os.stat(data_path)
+    os.utime(data_path, (stat.st_atime, stat.st_mtime + 100))
+    # Same bytes, newer timestamp
+    report_path = os.path.join(deposit, "docs", "report.csv")
+    stat = os.stat(report_path)
+    os.utime(report_path, (stat.st_atime, stat.st_mtime + 100))
+    os.remove(os.path.join(deposit, "docs", "sub", "copy.bin"))
+
+
+def test_baseline_sources_agree(tmp_path, make_job):
+    index_path = str(tmp_path / "full.jsonl")
+    result = build_package(make_job(index_path=index_path))
+    mets_path = tmp_path / "mets.xml"
+    mets_path.write_bytes(read_member(result["tar_path"], f"{result['sip_id']}/mets.xml"))
+
+    baselines = [load_baseline(path) for path in (result["aic_folder"], result["tar_path"], str(mets_path), index_path)]
+    assert {baseline.id for baseline in baselines} == {f"UUID:{result['sip_id']}"}
+    assert len(baselines[0].entries) == 6
+    for baseline in baselines[1:]:
+        assert baseline.entries == baselines[0].entries
+
+
+def test_delta_package_holds_only_changes(tmp_path, make_job, deposit):
+    first_index = str(tmp_path / "full.jsonl")
+    full = build_package(make_job(index_path=first_index))
+    change_deposit(deposit)
+
+    delta = compare(deposit, load_baseline(full["aic_folder"]))
+    # readme.txt and its hard link changed together
+    assert (delta.new, delta.changed, delta.unchanged, delta.touched) == (1, 3, 2, 1)
+    assert delta.removed == ["docs/sub/copy.bin"]
+
+    second_index = str(tmp_path / "delta.jsonl")
+    result = build_package(make_job(baseline=full["aic_folder"], index_path=second_index))
+    report = verify_package(result["aic_folder"])
+    assert report["status"] == "ok", report["problems"]
+
+    members = content_members(result["tar_path"], result["sip_id"])
+    assert sorted(members) == ["docs/readme-link.txt", "docs/sub/data.bin", "new.txt", "readme.txt"]
+    assert members["new.txt"] == b"ny fil\n"
+    removed = read_member(result["tar_path"], f"{result['sip_id']}/administrative_metadata/{REMOVED_FILE}").decode()
+    assert removed.splitlines()[1:] == ["docs/sub/copy.bin"]
+    mets = read_member(result["tar_path"], f"{result['sip_id']}/mets.xml").decode()
+    assert f'TYPE="BASELINE">UUID:{full["sip_id"]}<' in mets
+
+    # The index of the delta build describes the whole content, so the next delta finds nothing to package
+    chained = compare(deposit, load_baseline(second_index))
+    assert (chained.new, chained.changed, chained.touched, chained.removed) == (0, 0, 0, [])
+    assert chained.unchanged == 6
+
+
+def test_delta_mets_is_not_a_baseline(tmp_path, make_job, deposit):
+    full = build_package(make_job())
+    change_deposit(deposit)
+    result = build_package(make_job(baseline=full["aic_folder"]))
+    with pytest.raises(JobError, match="delta package"):
+        load_baseline(result["aic_folder"])
@@ -0,0 +1,75 @@
+import os
+import gzip
+import zlib
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import magic
+import pytest
+
+from etp.checksum import ChecksumEngine
+from etp.mime import SNIFF_SIZE, MimeDetector
+from etp.scan import scan_tree
+
+
+def png(width: int) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    pixels = zlib.compress(b"".join(b"\0" + b"\0" * width for _ in range(2)))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, 2, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", pixels) + chunk(b"IEND", b""))
+
+
+@pytest.fixture
+def files(deposit) -> list:
+    """The deposit's files and a few whose type the detector caches by signature"""
+    extra = os.path.join(deposit, "signatures")
+    os.mkdir(extra)
+    for number in range(3):
+        with open(os.path.join(extra, f"image{number}.png"), "wb") as fo:
+            fo.write(png(number + 1))
+        with open(os.path.join(extra, f"document{number}.pdf"), "wb") as fo:
+            fo.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n" + b"1 0 obj\n<< >>\nendobj\n" * (number + 1) + b"%%EOF\n")
+        with open(os.path.join(extra, f"archive{number}.gz"), "wb") as fo:
+            fo.write(gzip.compress(b"rad\n" * (number + 1)))
+    # A PNG signature behind another extension must not be taken from the cache for .png
+    with open(os.path.join(extra, "image.txt"), "wb") as fo:
+        fo.write(png(1))
+    return [entry.path for entry in scan_tree(deposit)]
+
+
+def expected_mime(path: str) -> str:
+    with open(path, "rb") as f:
+        return magic.from_buffer(f.read(SNIFF_SIZE), mime=True)
+
+
+def detect(detector: MimeDetector, path: str) -> str:
+    with open(path, "rb") as f:
+        return detector.detect(f.read(detector.sniff_size), path)
+
+
+@pytest.mark.parametrize("use_cache", [True, False])
+def test_detect_matches_libmagic(files, use_cache):
+    detector = MimeDetector(use_cache=use_cache)
+    expected = {path: expected_mime(path) for path in files}
+    # The second round is served from the signature cache where it can be
+    for _ in range(2):
+        assert {path: detect(detector, path) for path in files} == expected
+    assert detector.lookups == 2 * len(files)
+    assert (detector.hits > 0) == use_cache
+
+
+def test_detect_matches_libmagic_on_many_threads(files):
+    detector = MimeDetector()
+    paths = files * 8
+    with ThreadPoolExecutor(4) as executor:
+        found = list(executor.map(lambda path: detect(detector, path), paths))
+    assert found == [expected_mime(path) for path in paths]
+    assert detector.lookups == len(paths)
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_checksum_workers_detect_like_libmagic(files, use_processes):
+    engine = ChecksumEngine(4, use_processes, detector=MimeDetector())
+    found = {path: mime for path, _, mime, _, error in engine.map(files) if error is None}
+    assert found == {path: expected_mime(path) for path in files}
@@ -0,0 +1,82 @@
+import os
+import tarfile
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from etp.pipeline import build_package
+from etp.verify import verify_package
+
+LABEL = 'Uttrekk "A&B" <2024>'
+
+
+def read_members(tar_path: str) -> dict:
+    with tarfile.open(tar_path) as tar:
+        return {member.name: tar.extractfile(member).read() for member in tar if member.isfile()}
+
+
+@pytest.mark.parametrize("single_pass", [True, False])
+def test_field_values_are_escaped(make_job, fields, single_pass):
+    fields["label"] = LABEL
+    fields["archivist_org"] = "Arkiv & Co <AS>"
+    result = build_package(make_job(fields=fields, single_pass=single_pass, username='a"b&c'))
+
+    report = verify_package(result["aic_folder"])
+    assert report["status"] == "ok", report["problems"]
+
+    info = ET.parse(os.path.join(result["aic_folder"], "info.xml")).getroot()
+    assert info.get("LABEL") == LABEL
+    assert "Arkiv & Co <AS>" in [element.text for element in info.iter("{http://www.loc.gov/METS/}name")]
+
+    aic_log = ET.parse(os.path.join(result["aic_folder"], result["sip_id"], "log.xml")).getroot()
+    sip_log = ET.fromstring(read_members(result["tar_path"])[f"{result['sip_id']}/log.xml"])
+    for log_root in (aic_log, sip_log):
+        values = [element.text for element in log_root.iter("{http://arkivverket.no/standarder/PREMIS}significantPropertiesValue")]
+        assert LABEL in values
+        assert 'a"b&c' in [element.text for element in log_root.iter("{http://arkivverket.no/standarder/PREMIS}linkingAgentIdentifierValue")]
+
+
+@pytest.mark.parametrize("single_pass", [True, False])
+def test_empty_files_are_packed(make_job, single_pass):
+    result = build_package(make_job(single_pass=single_pass))
+
+    report = verify_package(result["aic_folder"])
+    assert report["status"] == "ok", report["problems"]
+    assert read_members(result["tar_path"])[f"{result['sip_id']}/content/empty.txt"] == b""
+    mets = read_members(result["tar_path"])[f"{result['sip_id']}/mets.xml"].decode()
+    assert 'SIZE="0"' in mets
+
+
+def mets_files(result: dict) -> list:
+    """(href, checksum, size, MIME type, created) of every content file in the package's mets.xml"""
+    mets = ET.fromstring(read_members(result["tar_path"])[f"{result['sip_id']}/mets.xml"])
+    files = []
+    for element in mets.iter("{http://www.loc.gov/METS/}file"):
+        href = element.find("{http://www.loc.gov/METS/}FLocat").get("{http://www.w3.org/1999/xlink}href")
+        if href.startswith("file:content/"):
+            files.append((href, element.get("CHECKSUM"), element.get("SIZE"), element.get("MIMETYPE"),
+                          element.get("CREATED")))
+    return sorted(files)
+
+
+def test_single_and_two_pass_list_the_same_files(make_job, deposit):
+    single = build_package(make_job(single_pass=True))
+    double = build_package(make_job(single_pass=False))
+    for result in (single, double):
+        report = verify_package(result["aic_folder"])
+        assert report["status"] == "ok", report["problems"]
+
+    files = mets_files(single)
+    assert files == mets_files(double)
+    hrefs = [href for href, *_ in files]
+    assert "file:content/docs/readme-link.txt" in hrefs
+    assert "file:content/readme.txt" in hrefs
+
+
+def test_worker_processes_hash_like_threads(make_job, tmp_path):
+    # Separate output folders, so neither build is served from the other's checksum cache
+    threads = build_package(make_job(single_pass=False, output_root=str(tmp_path / "threads")))
+    processes = build_package(make_job(single_pass=False, use_processes=True, output_root=str(tmp_path / "processes")))
+    report = verify_package(processes["aic_folder"])
+    assert report["status"] == "ok", report["problems"]
+    assert mets_files(processes) == mets_files(threads)
@@ -0,0 +1,45 @@
+import os
+import hashlib
+
+import pytest
+
+from etp import reader
+
+
+def test_chunk_size_follows_the_file_size_and_system():
+    assert reader.chunk_size(0) == reader.SMALL_CHUNK
+    assert reader.chunk_size(reader.SMALL_CHUNK) == reader.MEDIUM_CHUNK
+    assert reader.chunk_size(reader.LARGE_FILE) == reader.LARGE_CHUNK
+    assert reader.chunk_size(reader.LARGE_FILE, max_chunk=64 * 1024) == 64 * 1024
+    assert reader.chunk_size(reader.SMALL_CHUNK, "nfs4") == reader.NETWORK_CHUNK
+    assert reader.chunk_size(reader.SMALL_CHUNK, "cifs", network_chunk=16 * 1024 * 1024) == 16 * 1024 * 1024
+    assert reader.chunk_size(reader.LARGE_FILE, "nfs", reader.LARGE_CHUNK) == reader.LARGE_CHUNK
+    # Small files take one read wherever they are
+    assert reader.chunk_size(1000, "nfs") == reader.SMALL_CHUNK
+
+
+def test_network_files_are_read_in_network_chunks(monkeypatch, tmp_path):
+    monkeypatch.setattr(reader, "_filesystems", {})
+    monkeypatch.setattr(reader, "_mount_types", lambda: {(0, 4242): "nfs4"})
+    assert reader.filesystem_type(os.makedev(0, 4242)) == "nfs4"
+
+    path = tmp_path / "file.bin"
+    path.write_bytes(os.urandom(3 * reader.MEDIUM_CHUNK))
+    monkeypatch.setattr(reader, "filesystem_type", lambda st_dev: "nfs4")
+    counted = []
+    reader.hash_file(str(path), counted.append, network_chunk=2 * reader.MEDIUM_CHUNK)
+    assert counted == [2 * reader.MEDIUM_CHUNK, reader.MEDIUM_CHUNK]
+
+
+@pytest.mark.parametrize("size", [0, 1, reader.SMALL_CHUNK - 1, reader.SMALL_CHUNK, 3 * reader.MEDIUM_CHUNK + 17,
+                                  reader.LARGE_FILE + 5])
+@pytest.mark.parametrize("options", [{}, {"drop_behind": False}, {"use_mmap": True}, {"max_chunk": 4096}])
+def test_hash_file_matches_hashlib(tmp_path, size, options):
+    data = os.urandom(size)
+    path = tmp_path / "file.bin"
+    path.write_bytes(data)
+    counted = []
+    digest, head, read = reader.hash_file(str(path), counted.append, 100, **options)
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert head == data[:100]
+    assert read == sum(counted) == size
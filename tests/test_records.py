@@ -0,0 +1,62 @@
+import os
+import random
+import hashlib
+
+from etp.records import RecordStore
+from etp.pipeline import build_package
+from etp.verify import verify_package
+
+MIMES = ("text/plain", "application/pdf", "image/tiff")
+
+
+def make_records(count: int) -> list:
+    rng = random.Random(7)
+    names = ["a", "b", "Ørland", "æøå", "é", "z", "bad\udcff"]
+    records = []
+    for i in range(count):
+        path = "/".join(rng.choice(names) for _ in range(rng.randint(1, 4))) + f"/{i}.txt"
+        records.append((path, hashlib.sha256(path.encode("utf-8", "surrogateescape")).digest(), rng.choice(MIMES),
+                        rng.randint(0, 10 ** 9), rng.randint(0, 2 ** 31)))
+    return records
+
+
+def as_tuples(store) -> list:
+    return [(record.path, record.digest, record.mime, record.size, record.mtime) for record in store]
+
+
+def test_spilled_runs_merge_in_path_order(tmp_path):
+    records = make_records(3000)
+    with RecordStore(str(tmp_path), max_memory=20000) as store:
+        for record in records:
+            store.add(*record)
+        assert store.spilled_runs > 10
+        assert len(os.listdir(tmp_path)) == 1
+
+        assert as_tuples(store) == sorted(records)
+        assert len(store) == len(records)
+        assert store.total_bytes == sum(record[3] for record in records)
+
+        # Records added after iterating are merged in as well
+        late = ("0/late.txt", bytes(32), "text/csv", 5, 0)
+        store.add(*late)
+        assert as_tuples(store) == sorted(records + [late])
+    assert os.listdir(tmp_path) == []
+
+
+def test_in_memory_store_matches_spilled_store(tmp_path):
+    records = make_records(500)
+    with RecordStore(str(tmp_path)) as memory, RecordStore(str(tmp_path), max_memory=1000) as spilled:
+        for record in records:
+            memory.add(*record)
+            spilled.add(*record)
+        assert memory.spilled_runs == 0
+        assert spilled.spilled_runs > 0
+        assert as_tuples(memory) == as_tuples(spilled)
+
+
+def test_build_with_spilled_records(make_job, monkeypatch):
+    monkeypatch.setattr(RecordStore.__init__, "__defaults__", (None, 1000))
+    result = build_package(make_job(single_pass=False))
+    report = verify_package(result["aic_folder"])
+    assert report["status"] == "ok", report["problems"]
+    assert not [name for name in os.listdir(os.path.dirname(result["aic_folder"])) if name.startswith(".etp-records-")]
@@ -0,0 +1,152 @@
+import os
+import json
+import tarfile
+import hashlib
+
+import pytest
+
+from etp.cli import main
+from etp.journal import Journal, JOURNAL_FILE, find_unfinished, job_key
+from etp.pipeline import build_package
+from etp.volumes import MANIFEST_FILE, build_volumes
+
+SINGLE_PASS_STAGES = ("stage", "pack", "info", "aic")
+TWO_PASS_STAGES = ("stage", "hash", "metadata", "pack", "info", "aic")
+
+
+class Crash(Exception):
+    """Stands in for a kill right after a stage was journaled"""
+
+
+def crash_after(monkeypatch, stage: str, times: int = 1):
+    record = Journal.record
+    seen = []
+
+    def record_and_crash(self, name, **values):
+        record(self, name, **values)
+        if name == stage:
+            seen.append(name)
+            if len(seen) == times:
+                raise Crash(stage)
+    monkeypatch.setattr(Journal, "record", record_and_crash)
+
+
+def crash_and_resume(monkeypatch, job, stage: str) -> dict:
+    crash_after(monkeypatch, stage)
+    with pytest.raises(Crash):
+        build_package(job)
+    monkeypatch.undo()
+    journal = find_unfinished(job.output_root, job_key(job))
+    assert journal.last_stage() == stage
+    result = build_package(job)
+    assert result["sip_id"] == journal.begin["sip_id"]
+    return result
+
+
+def assert_single_finished_package(output_root: str, result: dict):
+    folders = [name for name in os.listdir(output_root) if os.path.isdir(os.path.join(output_root, name))]
+    assert folders == [result["aic_id"]]
+    assert not os.path.exists(os.path.join(result["aic_folder"], JOURNAL_FILE))
+    assert main(["verify", "-q", result["aic_folder"]]) == 0
+
+
+@pytest.mark.parametrize("settings, stage", [
+    *((dict(single_pass=True), stage) for stage in SINGLE_PASS_STAGES),
+    *((dict(single_pass=False), stage) for stage in TWO_PASS_STAGES),
+    *((dict(dedup=True), stage) for stage in TWO_PASS_STAGES),
+])
+def test_resume_after_each_stage(monkeypatch, make_job, settings, stage):
+    job = make_job(**settings)
+    result = crash_and_resume(monkeypatch, job, stage)
+    assert_single_finished_package(job.output_root, result)
+
+
+def test_no_resume_starts_a_new_package(monkeypatch, make_job):
+    crash_after(monkeypatch, "metadata")
+    with pytest.raises(Crash):
+        build_package(make_job(single_pass=False))
+    monkeypatch.undo()
+    result = build_package(make_job(single_pass=False, resume=False))
+    assert os.path.basename(result["aic_folder"]) == result["aic_id"]
+    assert os.path.exists(os.path.join(os.path.dirname(result["aic_folder"]), "1", JOURNAL_FILE))
+
+
+@pytest.mark.parametrize("stage", ["hash", "metadata"])
+def test_content_changed_before_resume_is_hashed_again(monkeypatch, make_job, deposit, stage):
+    job = make_job(single_pass=False)
+    crash_after(monkeypatch, stage)
+    with pytest.raises(Crash):
+        build_package(job)
+    monkeypatch.undo()
+
+    readme = os.path.join(deposit, "readme.txt")
+    with open(readme, "a", encoding="utf-8") as fo:
+        fo.write("Lagt til etter avbruddet\n")
+    result = build_package(job)
+    assert_single_finished_package(job.output_root, result)
+
+    with open(readme, "rb") as f:
+        expected = hashlib.sha256(f.read()).hexdigest()
+    with tarfile.open(result["tar_path"]) as tar:
+        mets = tar.extractfile(f"{result['sip_id']}/mets.xml").read().decode()
+    assert expected in mets
+
+
+def test_stage_recorded_again_replaces_later_stages(tmp_path):
+    journal = Journal.create(str(tmp_path), "key", sip_id="id")
+    journal.record("stage")
+    journal.record("hash", content=[1, 2, 3])
+    journal.record("metadata")
+    journal.record("hash", content=[1, 2, 4])
+    assert not journal.done("metadata")
+
+    loaded = Journal.load(str(tmp_path))
+    assert sorted(loaded.stages) == ["hash", "stage"]
+    assert loaded.stages["hash"]["content"] == [1, 2, 4]
+
+    # A line torn by a crash does not count
+    with open(loaded.path, "a", encoding="utf-8") as fo:
+        fo.write(json.dumps({"stage": "metadata"})[:10])
+    assert Journal.load(str(tmp_path)).last_stage() == "hash"
+
+
+def assert_single_finished_volume_build(output_root: str, result: dict):
+    folders = [name for name in os.listdir(output_root) if os.path.isdir(os.path.join(output_root, name))]
+    assert folders == [result["aic_id"]]
+    volumes = sorted(volume["aic_id"] for volume in result["volumes"])
+    assert sorted(os.listdir(result["aic_folder"])) == sorted([*volumes, MANIFEST_FILE])
+    assert main(["verify", "-q", result["aic_folder"]]) == 0
+
+
+@pytest.mark.parametrize("stage, times", [
+    ("volume 1", 1),  # Between two volumes
+    ("pack", 2),  # Half way through the second volume
+    ("volume 2", 1),  # After the last volume, before volumes.xml
+])
+def test_resume_volumes(monkeypatch, make_job, stage, times):
+    job = make_job(volume_size=250000, volume_jobs=1)
+    crash_after(monkeypatch, stage, times)
+    with pytest.raises(Crash):
+        build_volumes(job)
+    monkeypatch.undo()
+    journal = find_unfinished(job.output_root, job_key(job))
+    result = build_volumes(job)
+    assert result["aic_id"] == journal.begin["parent_id"]
+    assert len(result["volumes"]) == 2
+    assert_single_finished_volume_build(job.output_root, result)
+
+
+def test_volumes_planned_again_when_content_changed(monkeypatch, make_job, deposit):
+    job = make_job(volume_size=250000, volume_jobs=1)
+    crash_after(monkeypatch, "volume 1")
+    with pytest.raises(Crash):
+        build_volumes(job)
+    monkeypatch.undo()
+    first = find_unfinished(job.output_root, job_key(job)).begin["parent_id"]
+
+    with open(os.path.join(deposit, "docs", "sub", "more.bin"), "wb") as fo:
+        fo.write(os.urandom(100000))
+    result = build_volumes(job)
+    assert result["aic_id"] != first
+    assert result["content_files"] == 7
+    assert_single_finished_volume_build(job.output_root, result)
@@ -0,0 +1,202 @@
+import os
+import socket
+import hashlib
+import threading
+
+import pytest
+
+from etp import sinks
+from etp.cli import main
+from etp.sinks import S3Sink, TcpSink, open_sink
+from etp.pipeline import build_package
+from etp.verify import read_info
+
+
+class FakeS3:
+    """In-memory stand-in for a boto3 S3 client, keeps the parts of every upload"""
+
+    def __init__(self, fail_at: int = None):
+        self.fail_at = fail_at
+        self.parts = {}
+        self.objects = {}
+        self.aborted = []
+
+    def create_multipart_upload(self, Bucket, Key):
+        return {"UploadId": f"upload{len(self.aborted) + len(self.objects)}"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.fail_at:
+            raise ConnectionError("connection reset by the store")
+        self.parts[UploadId, PartNumber] = Body
+        return {"ETag": hashlib.md5(Body).hexdigest()}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        assert numbers == list(range(1, len(numbers) + 1))
+        for part in MultipartUpload["Parts"]:
+            assert part["ETag"] == hashlib.md5(self.parts[UploadId, part["PartNumber"]]).hexdigest()
+        self.objects[Bucket, Key] = b"".join(self.parts[UploadId, number] for number in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted.append(Key)
+
+
+@pytest.fixture
+def fake_s3(monkeypatch) -> FakeS3:
+    client = FakeS3()
+
+    class FakeBoto3:
+        @staticmethod
+        def client(name):
+            return client
+
+    monkeypatch.setattr(sinks, "_boto3", lambda: FakeBoto3)
+    return client
+
+
+def cli_args(deposit: str, output_root: str, fields: dict) -> list:
+    args = ["build", "-q", "--content", deposit, "--output", output_root]
+    for name, value in fields.items():
+        args += [f"--{name.replace('_', '-')}", value]
+    return args
+
+
+def test_s3_multipart_upload(monkeypatch):
+    monkeypatch.setattr(sinks, "S3_PART_STEP", 3)
+    client = FakeS3()
+    data = os.urandom(20000)
+    sink = S3Sink("bucket", "sip.tar", part_size=1000, client=client)
+    for start in range(0, len(data), 300):
+        sink.write(data[start:start + 300])
+    sink.close()
+
+    assert client.objects["bucket", "sip.tar"] == data
+    sizes = [len(client.parts["upload0", number]) for number in range(1, len(client.parts) + 1)]
+    # Parts double in size every S3_PART_STEP parts
+    assert sizes[:3] == [1200] * 3 and sizes[3:6] == [2100] * 3 and sizes[6] == 4200
+    assert not client.aborted
+
+
+def test_s3_empty_upload_has_one_part():
+    client = FakeS3()
+    sink = S3Sink("bucket", "empty.tar", client=client)
+    sink.close()
+    assert client.objects["bucket", "empty.tar"] == b""
+
+
+def test_s3_failed_part_stops_writes():
+    client = FakeS3(fail_at=1)
+    sink = S3Sink("bucket", "sip.tar", part_size=1000, client=client)
+    with pytest.raises(OSError, match="connection reset"):
+        for _ in range(100):
+            sink.write(bytes(500))
+    sink.abort()
+    assert client.aborted == ["sip.tar"]
+    assert not client.objects
+
+
+def test_s3_failed_last_part_aborts_the_upload():
+    client = FakeS3(fail_at=2)
+    sink = S3Sink("bucket", "sip.tar", part_size=1000, client=client)
+    for _ in range(3):
+        sink.write(bytes(500))
+    with pytest.raises(OSError, match="Upload to s3://bucket/sip.tar failed"):
+        sink.close()
+    assert client.aborted == ["sip.tar"]
+    assert not client.objects
+
+
+def test_build_to_s3_records_the_uploaded_hash(make_job, fake_s3):
+    result = build_package(make_job(output_sink="s3://bucket/deposits/2024", single_pass=False))
+    key = f"deposits/2024/{result['sip_id']}.tar"
+    assert result["tar_path"] == f"s3://bucket/{key}"
+    uploaded = fake_s3.objects["bucket", key]
+    tar_name, checksum, size = read_info(os.path.join(result["aic_folder"], "info.xml"))
+    assert tar_name == f"{result['sip_id']}.tar"
+    assert checksum == hashlib.sha256(uploaded).hexdigest()
+    assert size == len(uploaded)
+    assert not os.path.exists(os.path.join(result["aic_folder"], result["sip_id"], "content", tar_name))
+
+
+def test_failed_build_aborts_the_s3_upload(make_job, fake_s3):
+    # The deposit fits one part, which is sent when the archive is closed
+    fake_s3.fail_at = 1
+    with pytest.raises(OSError, match="Upload to s3://bucket/"):
+        build_package(make_job(output_sink="s3://bucket"))
+    assert len(fake_s3.aborted) == 1
+    assert not fake_s3.objects
+
+
+class Listener:
+    """Loopback TCP server that keeps what one connection sends"""
+
+    def __init__(self):
+        self._server = socket.create_server(("127.0.0.1", 0))
+        self.port = self._server.getsockname()[1]
+        self.data = b""
+        self.error = None
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    def _accept(self):
+        connection, _ = self._server.accept()
+        with connection:
+            try:
+                while True:
+                    chunk = connection.recv(65536)
+                    if not chunk:
+                        break
+                    self.data += chunk
+            except OSError as e:
+                self.error = e
+
+    def join(self):
+        self._thread.join(10)
+        self._server.close()
+
+
+def test_build_to_tcp_listener(make_job):
+    listener = Listener()
+    result = build_package(make_job(output_sink=f"tcp://127.0.0.1:{listener.port}"))
+    listener.join()
+    _, checksum, size = read_info(os.path.join(result["aic_folder"], "info.xml"))
+    assert checksum == hashlib.sha256(listener.data).hexdigest()
+    assert size == len(listener.data)
+
+
+def test_tcp_abort_resets_the_connection():
+    listener = Listener()
+    sink = TcpSink("127.0.0.1", listener.port)
+    sink.write(b"half an archive")
+    sink.abort()
+    listener.join()
+    assert isinstance(listener.error, ConnectionResetError)
+
+
+def test_build_through_a_pipe(tmp_path, deposit, fields, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    output_root = str(tmp_path / "out")
+    received = tmp_path / "received.tar"
+    assert main(cli_args(deposit, output_root, fields) + ["--sink", f"pipe:cat > {received}"]) == 0
+    aic_folder = capsys.readouterr().out.strip()
+    _, checksum, size = read_info(os.path.join(aic_folder, "info.xml"))
+    data = received.read_bytes()
+    assert checksum == hashlib.sha256(data).hexdigest()
+    assert size == len(data)
+
+
+def test_failing_pipe_fails_the_build(tmp_path, deposit, fields, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    assert main(cli_args(deposit, str(tmp_path / "out"), fields) + ["--sink", "pipe:cat > /dev/null; exit 3"]) == 1
+    assert "exited with status 3" in capsys.readouterr().err
+
+
+def test_directory_sink_leaves_no_partial_file(tmp_path):
+    sink = open_sink(str(tmp_path), "sip.tar")
+    sink.write(b"data")
+    sink.abort()
+    assert os.listdir(tmp_path) == []
+    sink = open_sink(str(tmp_path), "sip.tar")
+    sink.write(b"data")
+    sink.close()
+    assert os.listdir(tmp_path) == ["sip.tar"]
@@ -0,0 +1,122 @@
+import io
+import os
+import re
+import shutil
+import tarfile
+import hashlib
+
+import pytest
+
+from etp.cli import main
+from etp.pipeline import build_package
+from etp.verify import verify_package, find_packages, verify_packages
+
+
+@pytest.fixture
+def package(make_job) -> dict:
+    return build_package(make_job())
+
+
+def rewrite_tar(result: dict, drop: str = None, replace: dict = None, extra: dict = None):
+    """Rewrite the package tar and fix info.xml to match, so only the members are wrong"""
+    tar_path = result["tar_path"]
+    replace = replace or {}
+    buffer = io.BytesIO()
+    with tarfile.open(tar_path) as tar, tarfile.open(fileobj=buffer, mode="w", format=tarfile.GNU_FORMAT) as out:
+        for member in tar:
+            if member.name == drop:
+                continue
+            data = tar.extractfile(member).read() if member.isfile() else None
+            if member.name in replace:
+                data = replace[member.name]
+                member.size = len(data)
+            out.addfile(member, io.BytesIO(data) if data is not None else None)
+        for name, data in (extra or {}).items():
+            out.addfile(tarinfo(name, data), io.BytesIO(data))
+    with open(tar_path, "wb") as fo:
+        fo.write(buffer.getvalue())
+    info_path = os.path.join(result["aic_folder"], "info.xml")
+    with open(info_path, encoding="utf-8") as f:
+        info = f.read()
+    info = re.sub(r'CHECKSUM="[0-9a-f]+"', f'CHECKSUM="{hashlib.sha256(buffer.getvalue()).hexdigest()}"', info)
+    info = re.sub(r'SIZE="\d+"', f'SIZE="{len(buffer.getvalue())}"', info)
+    with open(info_path, "w", encoding="utf-8") as fo:
+        fo.write(info)
+
+
+def tarinfo(name: str, data: bytes) -> tarfile.TarInfo:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    return info
+
+
+def test_intact_package_verifies(package):
+    report = verify_package(package["aic_folder"])
+    assert report["status"] == "ok", report["problems"]
+    # Six content files, mets.xml, premis.xml, log.xml and the two schemas
+    assert report["files"] == 11
+    assert report["bytes"] > 400000
+
+
+def test_changed_content_is_found(package):
+    name = f"{package['sip_id']}/content/docs/sub/data.bin"
+    rewrite_tar(package, replace={name: os.urandom(200000)})
+    report = verify_package(package["aic_folder"])
+    assert report["status"] == "failed"
+    assert sorted(problem.split(" in ")[-1] for problem in report["problems"]) == ["mets.xml", "premis.xml"]
+    assert all(problem.startswith(f"{name}: checksum") for problem in report["problems"])
+
+
+def test_missing_and_unlisted_members_are_found(package):
+    sip = package["sip_id"]
+    rewrite_tar(package, drop=f"{sip}/content/readme.txt", extra={f"{sip}/content/extra.txt": b"extra\n"})
+    problems = verify_package(package["aic_folder"])["problems"]
+    assert f"{sip}/content/extra.txt: not listed in mets.xml" in problems
+    assert f"{sip}/content/readme.txt: listed in mets.xml but missing from the tar" in problems
+    assert f"{sip}/content/readme.txt: listed in premis.xml but missing from the tar" in problems
+
+
+def test_missing_mets_is_found(package):
+    rewrite_tar(package, drop=f"{package['sip_id']}/mets.xml")
+    assert "mets.xml not found in the tar" in verify_package(package["aic_folder"])["problems"]
+
+
+def test_info_checksum_and_size_are_checked(package):
+    with open(package["tar_path"], "ab") as fo:
+        fo.write(bytes(512))
+    problems = verify_package(package["aic_folder"])["problems"]
+    assert len(problems) == 2
+    assert "does not match" in problems[0] and "info.xml" in problems[0]
+    assert problems[1].startswith(f"{os.path.basename(package['tar_path'])}: size")
+
+
+def test_truncated_or_missing_tar_fails(package):
+    with open(package["tar_path"], "r+b") as fo:
+        fo.truncate(os.path.getsize(package["tar_path"]) // 2)
+    report = verify_package(package["aic_folder"])
+    assert report["status"] == "failed"
+    assert report["problems"][0].startswith(("ReadError", "EOFError", "OSError"))
+
+    os.remove(package["tar_path"])
+    assert verify_package(package["aic_folder"])["problems"][0].startswith("FileNotFoundError")
+
+
+@pytest.mark.skipif(shutil.which("zstd") is None, reason="needs the zstd program")
+def test_compressed_package_verifies(make_job):
+    result = build_package(make_job(output_format="tar.zst"))
+    assert result["tar_path"].endswith(".tar.zst")
+    report = verify_package(result["aic_folder"])
+    assert report["status"] == "ok", report["problems"]
+
+
+def test_many_packages_and_the_command(tmp_path, make_job, package, capsys):
+    second = build_package(make_job(single_pass=False))
+    output_root = os.path.dirname(package["aic_folder"])
+    assert sorted(find_packages([output_root])) == sorted([package["aic_folder"], second["aic_folder"]])
+    assert {report["status"] for report in verify_packages(find_packages([output_root]), jobs=2)} == {"ok"}
+
+    assert main(["verify", "-q", output_root]) == 0
+    with open(second["tar_path"], "ab") as fo:
+        fo.write(b"x")
+    assert main(["verify", "-q", "--report", str(tmp_path / "report.json"), output_root]) == 1
+    assert second["aic_folder"] in capsys.readouterr().out
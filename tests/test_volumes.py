@@ -0,0 +1,63 @@
+import os
+import tarfile
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from etp.cli import main
+from etp.scan import scan_tree
+from etp.verify import verify_package
+from etp.volumes import MANIFEST_FILE, build_volumes, plan_volumes
+
+
+def content_members(result: dict) -> dict:
+    """relpath -> size of the content files in a volume's tar"""
+    prefix = f"{result['sip_id']}/content/"
+    with tarfile.open(result["tar_path"]) as tar:
+        return {member.name[len(prefix):]: member.size for member in tar
+                if member.name.startswith(prefix) and not member.isdir()}
+
+
+@pytest.mark.parametrize("volume_size", [1000, 150000, 250000])
+def test_every_file_lands_in_exactly_one_volume(make_job, deposit, volume_size):
+    result = build_volumes(make_job(volume_size=volume_size))
+
+    expected = {entry.relpath: entry.size for entry in scan_tree(deposit)}
+    seen = {}
+    for volume in result["volumes"]:
+        members = content_members(volume)
+        assert not set(members) & set(seen)
+        seen.update(members)
+        # Only a file larger than the limit may make a volume exceed it
+        assert volume["content_bytes"] == sum(members.values())
+        assert volume["content_bytes"] <= volume_size or len(members) == 1
+        report = verify_package(volume["aic_folder"])
+        assert report["status"] == "ok", report["problems"]
+    assert seen == expected
+    assert result["content_files"] == len(expected)
+    assert main(["verify", "-q", result["aic_folder"]]) == 0
+
+
+def test_manifest_lists_the_volumes_in_order(make_job):
+    result = build_volumes(make_job(volume_size=250000))
+    assert len(result["volumes"]) > 1
+
+    manifest = ET.parse(os.path.join(result["aic_folder"], MANIFEST_FILE)).getroot()
+    assert manifest.get("OBJID") == f"UUID:{result['aic_id']}"
+    divs = list(manifest.iter("{http://www.loc.gov/METS/}div"))[1:]
+    assert [div.get("CONTENTIDS") for div in divs] == [f"UUID:{volume['sip_id']}" for volume in result["volumes"]]
+    hrefs = [element.get("{http://www.w3.org/1999/xlink}href") for element in manifest.iter("{http://www.loc.gov/METS/}FLocat")]
+    for href, volume in zip(hrefs, result["volumes"]):
+        assert os.path.join(result["aic_folder"], href.removeprefix("file:")) == volume["tar_path"]
+
+
+@pytest.mark.parametrize("volume_size, expected", [
+    # docs/sub is the only folder too large, the rest of the deposit stays together
+    (250000, [["empty.txt", "readme.txt", "docs/readme-link.txt", "docs/report.csv", "docs/sub/copy.bin"],
+              ["docs/sub/data.bin"]]),
+    # Files larger than the limit get a volume of their own
+    (1000, [["empty.txt", "readme.txt", "docs/readme-link.txt"], ["docs/report.csv"], ["docs/sub/copy.bin"],
+            ["docs/sub/data.bin"]]),
+])
+def test_plan_splits_only_folders_that_do_not_fit(deposit, volume_size, expected):
+    assert [[entry.relpath for entry in volume] for volume in plan_volumes(deposit, volume_size)] == expected